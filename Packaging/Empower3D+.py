@@ -3,8 +3,15 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import os
-from py3dbp import Packer, Bin, Item
-from binpacking3d import Packer
+import sys
+
+try:
+    from Packaging.mixed_load import BoxType, pack_mixed
+    from Packaging.shipment import FLOW_CONTAINERS, SHIPPING_CONTAINERS, main_ports_rate_40ft, plan_shipment
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from Packaging.mixed_load import BoxType, pack_mixed
+    from Packaging.shipment import FLOW_CONTAINERS, SHIPPING_CONTAINERS, main_ports_rate_40ft, plan_shipment
 
 # --- Container configuration ---
 CONTAINERS = {
@@ -204,128 +211,80 @@ def main():
         total_volume = sum((p['Length']*p['Width']*p['Height']/1e9)*p['Quantity'] for p in st.session_state['packaging_list'])
         st.info(f"Total weight: {total_weight:.2f} kg, Total volume: {total_volume:.2f} m³")
         if st.button('Calculate'):
-            # --- Packing con 3dbinpacking (stacking real) ---
+            # --- Packing mixto (mixed_load): bloques de UC iguales, apilado y soporte reales ---
             pkgs = st.session_state['packaging_list']
-            # Crear el contenedor
             container_dims = [container['length'], container['width'], container['height']]
             container_max_weight = container['max_weight']
-            # Preparar lista de cajas para 3dbinpacking
-            boxes = []
-            for idx, p in enumerate(pkgs):
-                l = int(p['Length'])
-                w = int(p['Width'])
-                h = int(p['Height'])
-                stacking = int(p['Stacking'])
-                weight = float(p['Weight EMPTY'])+float(p['Part Weight'])
-                for i in range(int(p['Quantity'])):
-                    boxes.append({
-                        'id': f"{p['Packaging Code']}_{i}",
-                        'length': l,
-                        'width': w,
-                        'height': h,
-                        'weight': weight,
-                        'stacking': stacking,
-                        'type': p['Packaging Code']
-                    })
-            # Packing
+            box_types = [
+                BoxType(float(p['Length']), float(p['Width']), float(p['Height']),
+                        float(p['Weight EMPTY']) + float(p['Part Weight']), int(p['Quantity']),
+                        int(p['Stacking']), p['Packaging Code'])
+                for p in pkgs
+            ]
             try:
-                packer = Packer(
-                    container_dims,
-                    max_weight=container_max_weight,
-                    support_surface_ratio=1.0, # solo apilar si hay soporte total
-                    vertical_stacking=True
-                )
-                for box in boxes:
-                    packer.add_box(box)
-                packer.pack()
-                # Obtener resultados
-                placed_boxes = packer.bins[0]['items'] if packer.bins else []
-                used_weight = sum(b['weight'] for b in placed_boxes)
-                used_volume = sum(b['length']*b['width']*b['height']/1e9 for b in placed_boxes)
-                st.success(f"Packed {len(placed_boxes)} boxes.")
-                st.info(f"Weight saturation: {100*used_weight/container_max_weight:.1f}% | Volume saturation: {100*used_volume/(container['length']*container['width']*container['height']/1e9):.1f}%")
+                load = pack_mixed(container_dims, box_types, max_weight=container_max_weight,
+                                  support_ratio=1.0)  # solo apilar si hay soporte total
+                used_weight = load.weight
+                used_volume = load.volume_m3
+                st.success(f"Packed {load.boxes} boxes.")
+                st.info(f"Weight saturation: {100*used_weight/container_max_weight:.1f}% | Volume saturation: {100*load.volume_saturation:.1f}%")
                 st.info(f"Total packed weight: {used_weight:.2f} kg | Total packed volume: {used_volume:.2f} m³")
-                if not placed_boxes:
+                left = [f"{t.label}: {n}" for t, n in zip(load.box_types, load.unpacked) if n > 0]
+                if left:
+                    st.warning("Not packed: " + ", ".join(left))
+                if not load.boxes:
                     st.warning("No boxes could be packed. Check dimensions and container size.")
                 else:
-                    plot_3d_boxes_3dbinpacking(pkgs, placed_boxes, container)
+                    plot_3d_load(load, container)
             except Exception as e:
                 st.error(f"Packing failed: {e}")
-
-def plot_3d_boxes_py3dbp(pkgs, placed_positions, container):
-    import plotly.graph_objects as go
-    fig = go.Figure()
-    l, w, h = int(container['length']), int(container['width']), int(container['height'])
-    # Transparent faces
-    fig.add_trace(go.Mesh3d(
-        x=[0, l, l, 0, 0, l, l, 0],
-        y=[0, 0, w, w, 0, 0, w, w],
-        z=[0, 0, 0, 0, h, h, h, h],
-        i=[0,0,0,4,4,2], j=[1,2,3,5,6,3], k=[2,3,1,6,7,7],
-        color='lightblue', opacity=0.08, name='Container', showscale=False
-    ))
-    # Borde del contenedor
-    fig.add_trace(go.Scatter3d(
-        x=[0,l,l,0,0,0,l,l,l,0,0,0,l,l],
-        y=[0,0,w,w,0,0,0,0,w,w,w,0,0],
-        z=[0,0,0,0,0,h,h,0,0,0,h,h,h,h],
-        mode='lines', line=dict(color='black', width=5), showlegend=False
-    ))
-    # Colores para cada tipo
-    colors = ['orange','green','red','blue','purple','yellow','brown','pink']
-    for idx, items in enumerate(placed_positions):
-        color = colors[idx%len(colors)]
-        for item in items:
-            # Now: x=width, y=length, z=height
-            x0 = float(item.position[0])  # width (X) -> x
-            y0 = float(item.position[2])  # depth (Z) -> y
-            z0 = float(item.position[1])  # height (Y) -> z
-            wx = float(item.width)        # Width
-            ly = float(item.depth)        # Length
-            hz = float(item.height)       # Height
-            # Check if box is out of bounds
-            out_of_bounds = (x0+wx > l) or (y0+ly > w) or (z0+hz > h) or (x0 < 0) or (y0 < 0) or (z0 < 0)
-            box_color = 'red' if out_of_bounds else color
-            # 8 vertices
-            X = [x0, x0+wx, x0+wx, x0, x0, x0+wx, x0+wx, x0]
-            Y = [y0, y0, y0+ly, y0+ly, y0, y0, y0+ly, y0+ly]
-            Z = [z0, z0, z0, z0, z0+hz, z0+hz, z0+hz, z0+hz]
-            faces = [
-                [0,1,2,3], [4,5,6,7], [0,1,5,4], [2,3,7,6], [1,2,6,5], [0,3,7,4],
+        # --- Plan multi-contenedor (shipment): cuántos 20ft / 40HC / mega trailers hacen falta para toda la lista ---
+        st.markdown('### Shipment plan')
+        col_flow, col_pol, col_pod, col_rate = st.columns(4)
+        with col_flow:
+            flow = st.selectbox('Flow', list(FLOW_CONTAINERS), help='OVERSEAS: 20ft / 40HC, INLAND: Mega Trailer 90m3')
+        with col_pol:
+            pol = st.text_input('POL (MAIN PORTS)', value='')
+        with col_pod:
+            pod = st.text_input('POD (MAIN PORTS)', value='')
+        with col_rate:
+            rate = st.number_input('Rate 40ft / trailer (€)', min_value=0.0, value=0.0,
+                                   help='0 = MAIN PORTS 40ft rate for POL/POD (OVERSEAS)')
+        if st.button('Plan shipment'):
+            rate_40ft = rate or None
+            if rate_40ft is None and flow == 'OVERSEAS' and pol.strip() and pod.strip():
+                rate_40ft = main_ports_rate_40ft(pol.strip(), pod.strip())
+                if rate_40ft is None:
+                    st.warning(f"No 40ft rate in MAIN PORTS for {pol.strip().upper()} - {pod.strip().upper()}")
+            box_types = [
+                BoxType(float(p['Length']), float(p['Width']), float(p['Height']),
+                        float(p['Weight EMPTY']) + float(p['Part Weight']), int(p['Quantity']),
+                        int(p['Stacking']), p['Packaging Code'])
+                for p in st.session_state['packaging_list']
             ]
-            for f in faces:
-                fig.add_trace(go.Mesh3d(
-                    x=[X[f[0]], X[f[1]], X[f[2]], X[f[3]]],
-                    y=[Y[f[0]], Y[f[1]], Y[f[2]], Y[f[3]]],
-                    z=[Z[f[0]], Z[f[1]], Z[f[2]], Z[f[3]]],
-                    i=[0], j=[1], k=[2],
-                    color=box_color, opacity=0.85, showscale=False, name=pkgs[idx]['Packaging Code'],
-                ))
-            fig.add_trace(go.Scatter3d(
-                x=[X[0],X[1],X[2],X[3],X[0],X[4],X[5],X[1],X[5],X[6],X[2],X[6],X[7],X[3],X[7],X[4]],
-                y=[Y[0],Y[1],Y[2],Y[3],Y[0],Y[4],Y[5],Y[1],Y[5],Y[6],Y[2],Y[6],Y[7],Y[3],Y[7],Y[4]],
-                z=[Z[0],Z[1],Z[2],Z[3],Z[0],Z[4],Z[5],Z[1],Z[5],Z[6],Z[2],Z[6],Z[7],Z[3],Z[7],Z[4]],
-                mode='lines', line=dict(color='red' if out_of_bounds else 'black', width=3), showlegend=False
-            ))
-    fig.update_layout(
-        scene=dict(
-            xaxis_title='Width (mm)',
-            yaxis_title='Length (mm)',
-            zaxis_title='Height (mm)',
-            yaxis=dict(autorange='reversed'),
-            aspectmode='data',
-        ),
-        margin=dict(l=0, r=0, b=0, t=30),
-        height=700,
-        title={
-            'text': '3D Container Loading Visualization (Door at y=0)',
-            'x': 0.5,
-            'xanchor': 'center'
-        }
-    )
-    st.plotly_chart(fig, use_container_width=True)
+            st.session_state['shipment_plan'] = plan_shipment(box_types, rate_40ft=rate_40ft, flow=flow)
+        plan = st.session_state.get('shipment_plan')
+        if plan is not None and plan.loads:
+            mix = ", ".join(f"{n} × {name}" for name, n in plan.mix.items())
+            cost = f" | Total cost: {plan.total_cost:,.2f} €" if plan.total_cost is not None else ""
+            st.success(f"{plan.boxes} boxes in {len(plan.loads)} containers: {mix}{cost}")
+            left = [f"{t.label}: {n}" for t, n in zip(plan.box_types, plan.unplaced) if n > 0]
+            if left:
+                st.warning("Do not fit in any container: " + ", ".join(left))
+            st.dataframe(plan.summary(), hide_index=True, use_container_width=True)
+            k = st.selectbox('Container', list(range(len(plan.loads))),
+                             format_func=lambda i: f"#{i + 1} {plan.loads[i].container}")
+            plot_3d_load(plan.loads[k].load, SHIPPING_CONTAINERS[plan.loads[k].container])
 
-def plot_3d_boxes_3dbinpacking(pkgs, placed_boxes, container):
+# Vértices y caras (12 triángulos) de una caja unitaria
+_CUBE = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]])
+_CUBE_TRIANGLES = np.array([
+    [0, 1, 2], [0, 2, 3], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+    [2, 3, 7], [2, 7, 6], [1, 2, 6], [1, 6, 5], [0, 3, 7], [0, 7, 4],
+])
+_CUBE_EDGES = [0, 1, 2, 3, 0, 4, 5, 1, 5, 6, 2, 6, 7, 3, 7, 4]
+
+def plot_3d_load(load, container):
     import plotly.graph_objects as go
     fig = go.Figure()
     l, w, h = int(container['length']), int(container['width']), int(container['height'])
@@ -344,41 +303,23 @@ def plot_3d_boxes_3dbinpacking(pkgs, placed_boxes, container):
         z=[0,0,0,0,0,h,h,0,0,0,h,h,h,h],
         mode='lines', line=dict(color='black', width=5), showlegend=False
     ))
-    # Colores para cada tipo
+    # Una malla y un trazo de aristas por tipo de packaging (todas sus cajas a la vez)
     colors = ['orange','green','red','blue','purple','yellow','brown','pink']
-    type_to_color = {}
-    color_idx = 0
-    for box in placed_boxes:
-        t = box['type']
-        if t not in type_to_color:
-            type_to_color[t] = colors[color_idx%len(colors)]
-            color_idx += 1
-        color = type_to_color[t]
-        x0 = box['position'][0]
-        y0 = box['position'][1]
-        z0 = box['position'][2]
-        lx = box['length']
-        wx = box['width']
-        hx = box['height']
-        # 8 vertices
-        X = [x0, x0+lx, x0+lx, x0, x0, x0+lx, x0+lx, x0]
-        Y = [y0, y0, y0+wx, y0+wx, y0, y0, y0+wx, y0+wx]
-        Z = [z0, z0, z0, z0, z0+hx, z0+hx, z0+hx, z0+hx]
-        faces = [
-            [0,1,2,3], [4,5,6,7], [0,1,5,4], [2,3,7,6], [1,2,6,5], [0,3,7,4],
-        ]
-        for f in faces:
-            fig.add_trace(go.Mesh3d(
-                x=[X[f[0]], X[f[1]], X[f[2]], X[f[3]]],
-                y=[Y[f[0]], Y[f[1]], Y[f[2]], Y[f[3]]],
-                z=[Z[f[0]], Z[f[1]], Z[f[2]], Z[f[3]]],
-                i=[0], j=[1], k=[2],
-                color=color, opacity=0.85, showscale=False, name=t,
-            ))
+    pos, size, kind = load.placements()
+    for color_idx, t in enumerate(np.unique(kind)):
+        sel = kind == t
+        corners = pos[sel][:, None, :] + _CUBE[None, :, :] * size[sel][:, None, :]   # (n, 8, 3)
+        base = (np.arange(sel.sum()) * 8)[:, None, None]
+        tri = (base + _CUBE_TRIANGLES[None, :, :]).reshape(-1, 3)
+        pts = corners.reshape(-1, 3)
+        name = load.box_types[t].label
+        fig.add_trace(go.Mesh3d(
+            x=pts[:, 0], y=pts[:, 1], z=pts[:, 2], i=tri[:, 0], j=tri[:, 1], k=tri[:, 2],
+            color=colors[color_idx % len(colors)], opacity=0.85, showscale=False, name=name,
+        ))
+        edges = np.concatenate([corners[:, _CUBE_EDGES, :], np.full((len(corners), 1, 3), np.nan)], axis=1).reshape(-1, 3)
         fig.add_trace(go.Scatter3d(
-            x=[X[0],X[1],X[2],X[3],X[0],X[4],X[5],X[1],X[5],X[6],X[2],X[6],X[7],X[3],X[7],X[4]],
-            y=[Y[0],Y[1],Y[2],Y[3],Y[0],Y[4],Y[5],Y[1],Y[5],Y[6],Y[2],Y[6],Y[7],Y[3],Y[7],Y[4]],
-            z=[Z[0],Z[1],Z[2],Z[3],Z[0],Z[4],Z[5],Z[1],Z[5],Z[6],Z[2],Z[6],Z[7],Z[3],Z[7],Z[4]],
+            x=edges[:, 0], y=edges[:, 1], z=edges[:, 2],
             mode='lines', line=dict(color='black', width=3), showlegend=False
         ))
     fig.update_layout(
@@ -1,32 +1,19 @@
+import os
+import sys
+
 import streamlit as st 
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
-# Dimensiones internas (volumen bruto)
-DIMENSIONES_INTERNAS = {
-    "Container 40 HC": (12032, 2352, 2700),
-    "Container 20 Ft Std": (5898, 2352, 2393),
-    "Trailer 40m3": (7000, 2400, 2400),
-    "Mega Trailer 90m3": (13620, 2480, 2900)
-}
-
-# Dimensiones operativas reales para cálculo de UCM
-DIMENSIONES_OPERATIVAS = {
-    "Container 20 Ft Std": (5898, 2352, 2243),
-    "Container 40 HC": (12032, 2352, 2550),
-    "Trailer 40m3": (7000, 2400, 2300),
-    "Mega Trailer 90m3": (13620, 2480, 2900)
-}
-
-# Peso máximo por contenedor
-PESOS_MAXIMOS = {
-    "Container 20 Ft Std": 25200,
-    "Container 40 HC": 24750,
-    "Trailer 40m3": 12000,
-    "Mega Trailer 90m3": 25000
-}
+try:
+    from Packaging.container_fill import DIMENSIONES_INTERNAS, DIMENSIONES_OPERATIVAS, PESOS_MAXIMOS, fill
+    from Packaging.guillotine import DEFAULT_TIME_BUDGET_S, fill_guillotine
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from Packaging.container_fill import DIMENSIONES_INTERNAS, DIMENSIONES_OPERATIVAS, PESOS_MAXIMOS, fill
+    from Packaging.guillotine import DEFAULT_TIME_BUDGET_S, fill_guillotine
 
 # Solo rotaciones permitidas en eje X e Y (altura fija)
 def rotaciones_caja(l, w, h):
@@ -35,72 +22,18 @@ def rotaciones_caja(l, w, h):
         (w, l, h),
     ]
 
-# Cálculo de cajas con límite de apilamiento (stockage)
-
-# Cálculo mixto de cajas: llena con orientación principal y usa el espacio sobrante para rotar cajas en planta
-def calcula_cajas(contenedor, caja, stacking):
-    Lc, Wc, Hc = contenedor
-    l1, w1, h = caja
-    l2, w2 = w1, l1  # Rotación en planta
-    nh = min(Hc // h, stacking)
-
-    # Opción 1: principal (l1, w1)
-    nl1 = Lc // l1
-    nw1 = Wc // w1
-    sobrante_w = Wc - (nw1 * w1)
-    sobrante_l = Lc - (nl1 * l1)
-
-    # 1. Cajas rotadas en el espacio sobrante del ancho (a lo largo de todo el largo principal)
-    nl2 = nl1
-    nw2 = sobrante_w // w2 if sobrante_w >= w2 else 0
-
-    # 2. Cajas rotadas en el espacio sobrante del largo (usando ancho de la caja rotada w2)
-    nl3 = sobrante_l // l2 if sobrante_l >= l2 else 0
-    nw3 = Wc // w2 if sobrante_l >= l2 else 0
-
-    # 3. Cajas rotadas en la esquina sobrante (si cabe)
-    nl4 = sobrante_l // l2 if sobrante_l >= l2 else 0
-    nw4 = sobrante_w // w2 if sobrante_w >= w2 else 0
-
-    total1 = (nl1 * nw1 + nl2 * nw2 + nl3 * nw3 + nl4 * nw4) * nh
-    distribucion1 = ((nl1, nw1, nh), (nl2, nw2, nh), (nl3, nw3, nh), (nl4, nw4, nh))
-
-    # Opción 2: principal (w1, l1)
-    nl1b = Lc // w1
-    nw1b = Wc // l1
-    sobrante_wb = Wc - (nw1b * l1)
-    sobrante_lb = Lc - (nl1b * w1)
-
-    # Opción 2: el complemento es (l1 a lo largo de L, w1 a lo largo de W)
-    nl2b = Lc // l1  # cajas del complemento que caben en L (no nl1b que usa w1)
-    nw2b = sobrante_wb // w1 if sobrante_wb >= w1 else 0
-    nl3b = sobrante_lb // l1 if sobrante_lb >= l1 else 0
-    nw3b = Wc // w1 if sobrante_lb >= l1 else 0
-    nl4b = sobrante_lb // l1 if sobrante_lb >= l1 else 0
-    nw4b = sobrante_wb // w1 if sobrante_wb >= w1 else 0
-
-    total2 = (nl1b * nw1b + nl2b * nw2b + nl3b * nw3b + nl4b * nw4b) * nh
-    distribucion2 = ((nl1b, nw1b, nh), (nl2b, nw2b, nh), (nl3b, nw3b, nh), (nl4b, nw4b, nh))
-
-    if total1 >= total2:
-        mejor_cantidad = total1
-        mejor_rotacion = (l1, w1, h)
-        mejor_distribucion = distribucion1
-    else:
-        mejor_cantidad = total2
-        mejor_rotacion = (w1, l1, h)
-        mejor_distribucion = distribucion2
-
-    return mejor_cantidad, mejor_rotacion, mejor_distribucion
+# Cálculo de cajas: layout en guillotina (guillotine) o, si se agota el tiempo, bloque principal + franjas rotadas
+def calcula_cajas(contenedor, caja, stacking, time_budget=DEFAULT_TIME_BUDGET_S):
+    resultado = fill_guillotine(contenedor, caja, stacking, time_budget=time_budget)
+    return resultado.by_volume, resultado.rotation, resultado.blocks
 
 # Dibujo de contenedor con cajas
 
-# Dibuja ambas orientaciones de cajas (principal y rotada) con diferentes colores
-def dibuja_cajas_3d(contenedor, caja_dim, distribuciones, max_cajas=None, titulo=""):
-    (nl1, nw1, nh1) = distribuciones[0]
+# Dibuja los bloques del layout con un color por etiqueta (orientación / franja)
+BLOCK_COLORS = ['#C9956C', '#4A90D9', '#5BAD6F', '#D4546A']  # principal – warm tan, luego blue, green, red
+
+def dibuja_cajas_3d(contenedor, h, bloques, capas, max_cajas=None, titulo=""):
     Lc, Wc, Hc = contenedor
-    l, w, h = caja_dim
-    l_rot, w_rot = w, l
 
     fig = plt.figure(figsize=(12, 8), facecolor='#F8FAFB')
     ax = fig.add_subplot(111, projection='3d')
@@ -115,38 +48,21 @@ def dibuja_cajas_3d(contenedor, caja_dim, distribuciones, max_cajas=None, titulo
     ax.grid(True, alpha=0.2, linestyle='--', linewidth=0.5)
     draw_box(ax, (0, 0, 0), Lc, Wc, Hc, '#B8D4F0', alpha=0.07)
 
+    total_cajas = max_cajas if max_cajas is not None else sum(b.count for b in bloques) * capas
     cajas_dibujadas = 0
-    bloques = [
-        (distribuciones[0], (l, w),         '#C9956C'),  # principal  – warm tan
-        (distribuciones[1], (l_rot, w_rot), '#4A90D9'),  # rotated W  – blue
-        (distribuciones[2], (l_rot, w_rot), '#5BAD6F'),  # rotated L  – green
-        (distribuciones[3], (l_rot, w_rot), '#D4546A'),  # corner     – red
-    ]
-    total_cajas = max_cajas if max_cajas is not None else sum(nl * nw * nh for (nl, nw, nh), _, _ in bloques)
-    all_nh = distribuciones[0][2]  # todas las distribuciones comparten el mismo nh
+    colores = {}
+    for bloque in bloques:
+        colores.setdefault(bloque.label, BLOCK_COLORS[len(colores) % len(BLOCK_COLORS)])
     # Iterar z primero: llenar toda la planta antes de apilar
-    for z in range(all_nh):
-        for idx, (dist, (lx, wx), color) in enumerate(bloques):
-            nl, nw, _ = dist
-            for x in range(nl):
-                for y in range(nw):
+    for z in range(capas):
+        for bloque in bloques:
+            color = colores[bloque.label]
+            for x in range(bloque.nl):
+                for y in range(bloque.nw):
                     if cajas_dibujadas >= total_cajas:
                         break
-                    if idx == 0:
-                        x_offset = x * lx
-                        y_offset = y * wx
-                    elif idx == 1:
-                        x_offset = x * lx
-                        y_offset = nw1 * w + y * wx
-                    elif idx == 2:
-                        x_offset = nl1 * l + x * lx
-                        y_offset = y * wx
-                    else:
-                        x_offset = nl1 * l + x * lx
-                        y_offset = nw1 * w + y * wx
-                    if (x_offset + lx > Lc) or (y_offset + wx > Wc) or (z * h + h > Hc):
-                        continue
-                    draw_box(ax, (x_offset, y_offset, z * h), lx, wx, h, color, alpha=0.88)
+                    draw_box(ax, (bloque.x + x * bloque.l, bloque.y + y * bloque.w, z * h),
+                             bloque.l, bloque.w, h, color, alpha=0.88)
                     cajas_dibujadas += 1
 
     ax.set_xlabel('Length (mm)', fontsize=8, color='#718096', labelpad=8)
@@ -345,9 +261,7 @@ def main():
         # Stackability
         operative_dim = DIMENSIONES_OPERATIVAS[container_sel]
         box_dim = (box_length, box_width, box_height)
-        _, _, (dist1, dist2, dist3, dist4) = calcula_cajas(operative_dim, box_dim, 9999)
-        nl, nw, nh = dist1
-        max_stacking_possible = nh
+        max_stacking_possible = fill(operative_dim, box_dim).layers
 
         st.markdown('<div class="e3d-sec">📚 Stackability</div>', unsafe_allow_html=True)
         col_stack1, col_stack2, col_stack3 = st.columns([1, 2, 1])
@@ -381,16 +295,14 @@ def main():
             external_dim  = DIMENSIONES_INTERNAS[container_sel]
             max_container_weight = PESOS_MAXIMOS[container_sel]
             box_dim = (box_length, box_width, box_height)
-            _, _, (dist1, dist2, dist3, dist4) = calcula_cajas(operative_dim, box_dim, 9999)
-            nl, nw, nh = dist1
-            max_stacking_possible = nh
-            total_by_volume, rotation, distribuciones = calcula_cajas(
-                operative_dim, box_dim, min(max_stacking, max_stacking_possible)
-            )
+            resultado = fill_guillotine(operative_dim, box_dim, max_stacking,
+                                        max_weight=max_container_weight, box_weight=box_weight)
+            total_by_volume = resultado.by_volume
+            rotation = resultado.rotation
             box_volume           = (box_dim[0]/1000) * (box_dim[1]/1000) * (box_dim[2]/1000)
             total_external_volume = (external_dim[0]/1000) * (external_dim[1]/1000) * (external_dim[2]/1000)
-            max_ucm_by_weight    = int(max_container_weight // box_weight)
-            realistic_ucm        = min(total_by_volume, max_ucm_by_weight)
+            max_ucm_by_weight    = resultado.by_weight
+            realistic_ucm        = resultado.count
             realistic_volume     = box_volume * realistic_ucm
             realistic_volume_sat = realistic_volume / total_external_volume * 100
             realistic_weight     = box_weight * realistic_ucm
@@ -398,14 +310,17 @@ def main():
             densidad             = realistic_weight / realistic_volume if realistic_volume > 0 else 0
             w_pct                = (realistic_weight / max_container_weight) * 100
 
-            (nl1, nw1, nh_d), (nl2, nw2, nh2), (nl3, nw3, nh3), (nl4, nw4, nh4) = distribuciones
-            texto_dist = f"Main: {nl1} × {nw1} × {nh_d}"
-            if nl2 > 0 and nw2 > 0:
-                texto_dist += f"  +  Rot.W: {nl2} × {nw2} × {nh2}"
-            if nl3 > 0 and nw3 > 0:
-                texto_dist += f"  +  Rot.L: {nl3} × {nw3} × {nh3}"
-            if nl4 > 0 and nw4 > 0:
-                texto_dist += f"  +  Corner: {nl4} × {nw4} × {nh4}"
+            if len(resultado.blocks) <= 3:
+                texto_dist = "  +  ".join(
+                    f"{b.label or f'Block {i + 1}'}: {b.nl} × {b.nw} × {resultado.layers}"
+                    for i, b in enumerate(resultado.blocks)
+                ) or "—"
+            else:
+                # Layout en guillotina: UC por capa de cada orientación
+                por_etiqueta = {}
+                for b in resultado.blocks:
+                    por_etiqueta[b.label] = por_etiqueta.get(b.label, 0) + b.count
+                texto_dist = "  +  ".join(f"{lbl}: {n} × {resultado.layers}" for lbl, n in por_etiqueta.items())
 
             limited_by = "Weight" if realistic_ucm == max_ucm_by_weight else "Volume"
 
@@ -475,7 +390,7 @@ def main():
                 <div class="e3d-ch-sub">Optimized packing · Limited by volume &amp; weight</div>
             </div>
             """, unsafe_allow_html=True)
-            dibuja_cajas_3d(operative_dim, rotation, distribuciones, max_cajas=realistic_ucm)
+            dibuja_cajas_3d(operative_dim, rotation[2], resultado.blocks, resultado.layers, max_cajas=realistic_ucm)
         else:
             st.markdown("""
             <div class="e3d-ph-box">
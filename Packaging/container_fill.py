@@ -0,0 +1,237 @@
+"""Cuántos UC caben en un contenedor: motor común de Empower3D y del Quote (pack/cont 40ft).
+
+Layout por bloques: un bloque principal en una orientación en planta y el sobrante
+rellenado con cajas rotadas 90° en dos franjas, apilado hasta min(Hc // h, stacking).
+Para cada orientación principal se prueban los dos cortes en guillotina:
+
+    A: corte a lo largo (x = nl·a): franja W rotada sobre el bloque principal, franja L a todo el ancho
+    B: corte a lo ancho (y = nw·b): franja L rotada junto al bloque principal, franja W a todo el largo
+
+Las franjas nunca se solapan ni desbordan el contenedor (las versiones anteriores de
+Empower3D y generate_quote contaban la franja W con el nº de cajas del bloque principal
+y la esquina dos veces). fill() está memoizado: mil PNs con el mismo packaging se
+calculan una sola vez por proceso.
+
+fill_arrays() es la misma heurística en NumPy sobre arrays de UC (catálogo completo de
+PACKAGING / Base_EMB en una pasada) y fill_table() la tabla UC × contenedor:
+
+    python -m Packaging.container_fill [Base_EMB.xlsx] [--out fills.csv]
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Dimensiones internas (volumen bruto)
+DIMENSIONES_INTERNAS = {
+    "Container 40 HC": (12032, 2352, 2700),
+    "Container 20 Ft Std": (5898, 2352, 2393),
+    "Trailer 40m3": (7000, 2400, 2400),
+    "Mega Trailer 90m3": (13620, 2480, 2900)
+}
+
+# Dimensiones operativas reales para cálculo de UCM
+DIMENSIONES_OPERATIVAS = {
+    "Container 20 Ft Std": (5898, 2352, 2243),
+    "Container 40 HC": (12032, 2352, 2550),
+    "Trailer 40m3": (7000, 2400, 2300),
+    "Mega Trailer 90m3": (13620, 2480, 2900)
+}
+
+# Peso máximo por contenedor
+PESOS_MAXIMOS = {
+    "Container 20 Ft Std": 25200,
+    "Container 40 HC": 24750,
+    "Trailer 40m3": 12000,
+    "Mega Trailer 90m3": 25000
+}
+
+FILL_CACHE_SIZE = 65536
+
+
+@dataclass(frozen=True)
+class Block:
+    """nl × nw cajas de planta l × w (mm) con origen (x, y); cada capa del apilado repite los bloques."""
+    x: float
+    y: float
+    nl: int
+    nw: int
+    l: float
+    w: float
+    label: str = ""
+
+    @property
+    def count(self) -> int:
+        return self.nl * self.nw
+
+
+@dataclass(frozen=True)
+class Fill:
+    count: int                      # UC en el contenedor (volumen y peso)
+    by_volume: int                  # UC por volumen (layout × capas)
+    by_weight: int | None           # UC por peso (None sin peso de UC o de contenedor)
+    rotation: tuple                 # (l, w, h) del bloque principal
+    layers: int                     # capas apiladas
+    blocks: tuple[Block, ...]       # bloque principal, franja W, franja L (solo los no vacíos)
+
+    @property
+    def per_layer(self) -> int:
+        return sum(b.count for b in self.blocks)
+
+    @property
+    def limited_by(self) -> str:
+        return "Weight" if self.by_weight is not None and self.by_weight < self.by_volume else "Volume"
+
+
+def _mm(v) -> float | int:
+    f = float(v)
+    return int(f) if f.is_integer() else f
+
+
+def _n(space: float, size: float) -> int:
+    return int(space // size) if size > 0 and space >= size else 0
+
+
+def _layouts(Lc: float, Wc: float, a: float, b: float):
+    """Los dos cortes en guillotina con bloque principal a × b (a a lo largo) y franjas rotadas b × a."""
+    nl, nw = _n(Lc, a), _n(Wc, b)
+    used_l, used_w = nl * a, nw * b
+    main = Block(0, 0, nl, nw, a, b, "Main")
+    # A: franja W encima del bloque principal (largo used_l), franja L a todo el ancho
+    yield (main,
+           Block(0, used_w, _n(used_l, b), _n(Wc - used_w, a), b, a, "Rot.W"),
+           Block(used_l, 0, _n(Lc - used_l, b), _n(Wc, a), b, a, "Rot.L"))
+    # B: franja L junto al bloque principal (ancho used_w), franja W a todo el largo
+    yield (main,
+           Block(0, used_w, _n(Lc, b), _n(Wc - used_w, a), b, a, "Rot.W"),
+           Block(used_l, 0, _n(Lc - used_l, b), _n(used_w, a), b, a, "Rot.L"))
+
+
+@lru_cache(maxsize=FILL_CACHE_SIZE)
+def _fill_by_volume(Lc: float, Wc: float, Hc: float, l: float, w: float, h: float, stacking: int | None):
+    layers = _n(Hc, h)
+    if stacking is not None:
+        layers = min(layers, max(int(stacking), 0))
+    best, best_rot, best_blocks = -1, (l, w, h), ()
+    if l > 0 and w > 0:
+        for a, b in ((l, w), (w, l)):
+            for blocks in _layouts(Lc, Wc, a, b):
+                per_layer = sum(blk.count for blk in blocks)
+                if per_layer > best:  # empate: se queda la primera (orientación dada, corte A)
+                    best, best_rot, best_blocks = per_layer, (a, b, h), blocks
+    best = max(best, 0)
+    return best * layers, best_rot, layers, tuple(blk for blk in best_blocks if blk.count)
+
+
+def fill(container_dims, box_dims, stacking: int | None = None, max_weight: float | None = None,
+         box_weight: float | None = None) -> Fill:
+    """UC de box_dims (l, w, h mm) en container_dims (L, W, H mm).
+
+    stacking limita las capas (None = hasta el techo); con max_weight y box_weight (kg, UC lleno)
+    el resultado se limita también por peso.
+    """
+    Lc, Wc, Hc = (_mm(v) for v in container_dims)
+    l, w, h = (_mm(v) for v in box_dims)
+    if h <= 0:
+        return Fill(0, 0, None, (l, w, h), 0, ())
+    stack = None if stacking is None else int(stacking)
+    by_volume, rotation, layers, blocks = _fill_by_volume(Lc, Wc, Hc, l, w, h, stack)
+    by_weight = None
+    if max_weight is not None and box_weight is not None and float(box_weight) > 0:
+        by_weight = int(float(max_weight) // float(box_weight))
+    count = by_volume if by_weight is None else min(by_volume, by_weight)
+    return Fill(int(count), int(by_volume), by_weight, rotation, layers, blocks)
+
+
+def fill_cache_info():
+    return _fill_by_volume.cache_info()
+
+
+def _n_arr(space, size):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.floor_divide(space, size)
+    return np.where((size > 0) & (space >= size), n, 0).astype(np.int64)
+
+
+def fill_arrays(l, w, h, container_dims, stacking=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """fill() por volumen para arrays de UC: (UC por contenedor, capas, orientación girada).
+
+    Mismo resultado que fill(container_dims, (l[i], w[i], h[i]), stacking[i]).by_volume;
+    stacking escalar, array o None (NaN = sin límite).
+    """
+    l = np.asarray(l, dtype=np.float64)
+    w = np.asarray(w, dtype=np.float64)
+    h = np.asarray(h, dtype=np.float64)
+    Lc, Wc, Hc = (float(v) for v in container_dims)
+    layers = _n_arr(Hc, h)
+    if stacking is not None:
+        stack = np.broadcast_to(np.asarray(stacking, dtype=np.float64), layers.shape)
+        layers = np.where(np.isnan(stack), layers, np.minimum(layers, np.maximum(np.nan_to_num(stack), 0))).astype(np.int64)
+    best = np.full(l.shape, -1, dtype=np.int64)
+    swapped = np.zeros(l.shape, dtype=bool)
+    for is_swapped, (a, b) in enumerate(((l, w), (w, l))):
+        nl, nw = _n_arr(Lc, a), _n_arr(Wc, b)
+        used_l, used_w = nl * a, nw * b
+        main = nl * nw
+        cut_a = main + _n_arr(used_l, b) * _n_arr(Wc - used_w, a) + _n_arr(Lc - used_l, b) * _n_arr(Wc, a)
+        cut_b = main + _n_arr(Lc, b) * _n_arr(Wc - used_w, a) + _n_arr(Lc - used_l, b) * _n_arr(used_w, a)
+        for per_layer in (cut_a, cut_b):
+            better = per_layer > best  # empate: se queda la primera, como fill()
+            best = np.where(better, per_layer, best)
+            swapped = np.where(better, bool(is_swapped), swapped)
+    valid = (l > 0) & (w > 0) & (h > 0)
+    by_volume = np.where(valid, np.maximum(best, 0) * layers, 0)
+    return by_volume, np.where(h > 0, layers, 0), swapped & valid
+
+
+def fill_table(l, w, h, weight_full=None, stacking=None, containers: dict | None = None,
+               max_weights: dict | None = None) -> pd.DataFrame:
+    """UC por contenedor para cada UC (una columna por contenedor; limitado por peso si hay weight_full)."""
+    containers = DIMENSIONES_OPERATIVAS if containers is None else containers
+    max_weights = PESOS_MAXIMOS if max_weights is None else max_weights
+    out = {}
+    wf = None if weight_full is None else np.asarray(weight_full, dtype=np.float64)
+    for name, dims in containers.items():
+        count, _, _ = fill_arrays(l, w, h, dims, stacking)
+        if wf is not None and name in max_weights:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                by_weight = np.floor_divide(float(max_weights[name]), wf)
+            count = np.where((wf > 0) & (count > 0), np.minimum(count, by_weight), count).astype(np.int64)
+        out[name] = count
+    return pd.DataFrame(out, index=getattr(l, "index", None))
+
+
+BASE_EMB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Base_EMB.xlsx")
+
+
+def base_emb_fill_table(path: str = BASE_EMB_FILE, sheet: str = "Informe 1") -> pd.DataFrame:
+    """Fills de todos los packaging de Base_EMB (UC lleno = vacío + pieza × Qté/UC) en cada contenedor."""
+    df = pd.read_excel(path, sheet_name=sheet)
+    df.columns = [str(c).strip() for c in df.columns]
+    num = {c: pd.to_numeric(df.get(c), errors="coerce") for c in
+           ("Length (mm)", "Width (mm)", "Height (mm)", "Weight EMPTY (kg)", "Part Weight (kg)", "Qté / UC", "Nb pieces par UC")}
+    qty = num["Qté / UC"].fillna(num["Nb pieces par UC"])
+    weight_full = (num["Weight EMPTY (kg)"] + num["Part Weight (kg)"] * qty).round(3)
+    table = fill_table(num["Length (mm)"].fillna(0), num["Width (mm)"].fillna(0), num["Height (mm)"].fillna(0),
+                       weight_full=weight_full.fillna(0))
+    keep = [c for c in ("Reference", "Packaging Code", "Length (mm)", "Width (mm)", "Height (mm)") if c in df.columns]
+    return pd.concat([df[keep], weight_full.rename("Weight full (kg)"), table], axis=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="UC por contenedor para todo el catálogo de packaging")
+    ap.add_argument("workbook", nargs="?", default=BASE_EMB_FILE)
+    ap.add_argument("--sheet", default="Informe 1")
+    ap.add_argument("--out", help="CSV de salida (por defecto: <workbook>_fills.csv)")
+    args = ap.parse_args()
+    table = base_emb_fill_table(args.workbook, args.sheet)
+    out = args.out or os.path.splitext(args.workbook)[0] + "_fills.csv"
+    table.to_csv(out, index=False, encoding="utf-8-sig")
+    print(f"{len(table)} packaging rows -> {out}")
+
+
+if __name__ == "__main__":
+    main()
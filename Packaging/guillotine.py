@@ -0,0 +1,196 @@
+"""Layouts en guillotina por capas: búsqueda acotada sobre la planta del contenedor.
+
+container_fill.fill() solo prueba un bloque principal y dos franjas rotadas. Aquí la planta
+L × W se rellena con cortes en guillotina recursivos (cada rectángulo se corta en dos a lo
+largo o a lo ancho, o se llena con un bloque homogéneo en una de las dos orientaciones) y
+las capas se apilan como en fill(). Los cortes solo se prueban en puntos raster (derivados
+de las combinaciones i·l + j·w); el mejor valor de cada rectángulo restante se memoiza en
+una tabla, así que el resultado es el óptimo en guillotina, que nunca es peor que fill().
+
+La búsqueda está acotada por max_work (parejas de subrectángulos evaluadas) y time_budget
+(segundos): si se agota, se devuelve fill(). Sin time_budget el resultado es determinista
+(Quote) y la planta resultante (no las tablas) queda memoizada por proceso.
+
+    python -m Packaging.guillotine 314 500 1186 [--container "Container 40 HC"]
+"""
+import argparse
+import time
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from .container_fill import DIMENSIONES_OPERATIVAS, Block, Fill, _mm, _n, fill  # type: ignore
+except ImportError:
+    from Packaging.container_fill import DIMENSIONES_OPERATIVAS, Block, Fill, _mm, _n, fill  # type: ignore
+
+DEFAULT_TIME_BUDGET_S = 0.5
+MAX_WORK = 20_000_000
+
+# Tipos de celda de la tabla
+_BLOCK_LW, _BLOCK_WL, _CUT_X, _CUT_Y = 0, 1, 2, 3
+
+
+class _Budget(Exception):
+    pass
+
+
+def _normal_points(size: float, a: float, b: float) -> np.ndarray:
+    """Todas las posiciones i·a + j·b <= size (incluye 0), ordenadas."""
+    i = np.arange(_n(size, a) + 1) * a
+    j = np.arange(_n(size, b) + 1) * b
+    pts = (i[:, None] + j[None, :]).ravel()
+    return np.unique(np.round(pts[pts <= size + 1e-9], 6))
+
+
+def _raster_points(size: float, a: float, b: float) -> np.ndarray:
+    """Puntos raster: mayor patrón normal <= size - p para cada patrón normal p (basta para guillotina)."""
+    normal = _normal_points(size, a, b)
+    idx = np.searchsorted(normal, size - normal + 1e-9, side="right") - 1
+    return np.unique(normal[idx])
+
+
+def _cuts(points: np.ndarray):
+    """Para cada punto p: índices k de cortes 0 < p_k <= p / 2 y c del mayor punto <= p - p_k."""
+    out = []
+    for p in points:
+        ks = np.nonzero((points > 0) & (points <= p / 2 + 1e-9))[0]
+        cs = np.searchsorted(points, p - points[ks] + 1e-9, side="right") - 1
+        out.append((ks, cs))
+    return out
+
+
+def _work(nx: int, ny: int) -> int:
+    """Parejas de subrectángulos que evalúa la tabla nx × ny."""
+    return nx * ny * (nx + ny) // 2
+
+
+def _solve(Lc: float, Wc: float, l: float, w: float, max_work: int, deadline: float | None):
+    X = _raster_points(Lc, l, w)
+    Y = _raster_points(Wc, l, w)
+    nx, ny = len(X), len(Y)
+    if _work(nx, ny) > max_work:
+        raise _Budget()
+    # Bloque homogéneo en cada orientación
+    lw = np.outer([_n(x, l) for x in X], [_n(y, w) for y in Y])
+    wl = np.outer([_n(x, w) for x in X], [_n(y, l) for y in Y])
+    F = np.maximum(lw, wl)
+    kind = np.where(wl > lw, _BLOCK_WL, _BLOCK_LW)
+    pos = np.zeros((nx, ny), dtype=np.int64)
+    x_cuts, y_cuts = _cuts(X), _cuts(Y)
+    for i in range(nx):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise _Budget()
+        ks, cs = x_cuts[i]
+        if len(ks):
+            totals = F[ks, :] + F[cs, :]
+            best = totals.argmax(axis=0)
+            vals = totals[best, np.arange(ny)]
+            better = vals > F[i]
+            F[i] = np.where(better, vals, F[i])
+            kind[i] = np.where(better, _CUT_X, kind[i])
+            pos[i] = np.where(better, ks[best], pos[i])
+        row = F[i]
+        for j in range(ny):
+            ks, cs = y_cuts[j]
+            if len(ks):
+                totals = row[ks] + row[cs]
+                b = int(totals.argmax())
+                if totals[b] > row[j]:
+                    row[j] = totals[b]
+                    kind[i, j] = _CUT_Y
+                    pos[i, j] = ks[b]
+    return X, Y, F, kind, pos
+
+
+def _blocks(X, Y, kind, pos, i, j, x0, y0, l, w, out):
+    k = kind[i, j]
+    if k == _CUT_X:
+        c = pos[i, j]
+        r = np.searchsorted(X, X[i] - X[c] + 1e-9, side="right") - 1
+        _blocks(X, Y, kind, pos, c, j, x0, y0, l, w, out)
+        _blocks(X, Y, kind, pos, r, j, x0 + X[c], y0, l, w, out)
+    elif k == _CUT_Y:
+        c = pos[i, j]
+        r = np.searchsorted(Y, Y[j] - Y[c] + 1e-9, side="right") - 1
+        _blocks(X, Y, kind, pos, i, c, x0, y0, l, w, out)
+        _blocks(X, Y, kind, pos, i, r, x0, y0 + Y[c], l, w, out)
+    else:
+        a, b = (l, w) if k == _BLOCK_LW else (w, l)
+        nl, nw = _n(X[i], a), _n(Y[j], b)
+        if nl * nw:
+            out.append(Block(_mm(x0), _mm(y0), nl, nw, a, b, f"{_mm(a)}×{_mm(b)}"))
+
+
+def layer_layout(Lc: float, Wc: float, l: float, w: float, time_budget: float | None = None,
+                 max_work: int = MAX_WORK) -> tuple[Block, ...] | None:
+    """Mejor planta en guillotina de cajas l × w (rotables 90°) en Lc × Wc; None si se agota el presupuesto."""
+    Lc, Wc, l, w = (_mm(v) for v in (Lc, Wc, l, w))
+    if l <= 0 or w <= 0 or Lc < min(l, w) or Wc < min(l, w):
+        return ()
+    # Tabla por pareja de orientaciones (l, w) y (w, l) comparten resultado
+    l, w = max(l, w), min(l, w)
+    if time_budget is None:
+        return _cached_layout(Lc, Wc, l, w, max_work)
+    return _layout(Lc, Wc, l, w, max_work, time.perf_counter() + time_budget)
+
+
+def _layout(Lc: float, Wc: float, l: float, w: float, max_work: int, deadline: float | None):
+    try:
+        X, Y, F, kind, pos = _solve(Lc, Wc, l, w, max_work, deadline)
+    except _Budget:
+        return None
+    out: list[Block] = []
+    _blocks(X, Y, kind, pos, len(X) - 1, len(Y) - 1, 0, 0, l, w, out)
+    return tuple(out)
+
+
+@lru_cache(maxsize=4096)
+def _cached_layout(Lc: float, Wc: float, l: float, w: float, max_work: int):
+    # Solo se memoiza la planta (no las tablas): sin deadline el resultado es determinista
+    return _layout(Lc, Wc, l, w, max_work, None)
+
+
+def fill_guillotine(container_dims, box_dims, stacking: int | None = None, max_weight: float | None = None,
+                    box_weight: float | None = None, time_budget: float | None = DEFAULT_TIME_BUDGET_S,
+                    max_work: int = MAX_WORK) -> Fill:
+    """Como container_fill.fill(), con la planta de layer_layout() cuando mejora la heurística."""
+    base = fill(container_dims, box_dims, stacking, max_weight, box_weight)
+    if base.layers <= 0:
+        return base
+    Lc, Wc, _ = (_mm(v) for v in container_dims)
+    l, w, h = (_mm(v) for v in box_dims)
+    if base.per_layer >= int(Lc * Wc // (l * w)):  # ya en la cota de superficie
+        return base
+    blocks = layer_layout(Lc, Wc, l, w, time_budget, max_work)
+    per_layer = sum(b.count for b in blocks) if blocks else 0
+    if blocks is None or per_layer <= base.per_layer:
+        return base
+    main = max(blocks, key=lambda b: b.count)
+    by_volume = per_layer * base.layers
+    count = by_volume if base.by_weight is None else min(by_volume, base.by_weight)
+    return Fill(int(count), int(by_volume), base.by_weight, (main.l, main.w, h), base.layers, blocks)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="UC por contenedor con layout en guillotina")
+    ap.add_argument("length", type=float)
+    ap.add_argument("width", type=float)
+    ap.add_argument("height", type=float)
+    ap.add_argument("--container", default="Container 40 HC", choices=list(DIMENSIONES_OPERATIVAS))
+    ap.add_argument("--stacking", type=int)
+    ap.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET_S)
+    args = ap.parse_args()
+    dims = DIMENSIONES_OPERATIVAS[args.container]
+    box = (args.length, args.width, args.height)
+    base = fill(dims, box, args.stacking)
+    t0 = time.perf_counter()
+    best = fill_guillotine(dims, box, args.stacking, time_budget=args.time_budget)
+    print(f"fill():      {base.by_volume} UC ({base.per_layer}/capa × {base.layers})")
+    print(f"guillotina:  {best.by_volume} UC ({best.per_layer}/capa × {best.layers}) en {time.perf_counter() - t0:.3f}s")
+    for b in best.blocks:
+        print(f"  {b.label:>12} en ({b.x}, {b.y}): {b.nl} × {b.nw}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Carga mixta de varios tipos de UC en un contenedor (motor propio de Empower3D+).
+
+Heurística de puntos extremos sobre bloques: cada tipo de UC se coloca en bloques
+nx × ny × nz de cajas iguales (columnas de nz niveles, filas a lo ancho, tramos a lo largo)
+en vez de caja a caja, así que una carga de miles de UC son unas decenas de bloques.
+Los puntos extremos se recorren del fondo a la puerta (x, luego z, luego y); en el primero
+donde cabe el tipo se coloca el mayor bloque en la orientación en planta que mejor llena el
+hueco libre con franjas giradas (los cortes de container_fill; altura fija). Con un solo
+tipo el resultado coincide con container_fill.fill().
+
+Restricciones por bloque:
+  - sin solapes y dentro del contenedor;
+  - apilado: niveles de la columna (los de debajo + nz) <= stacking de todos los tipos de
+    la columna (stacking None = hasta el techo);
+  - soporte: fuera del suelo, al menos support_ratio de la base de cada columna apoyada en
+    techos de bloques a esa misma altura;
+  - peso: el total no supera max_weight.
+
+    load = pack_mixed((12032, 2352, 2700), [BoxType(1200, 1000, 975, 310, 40, 2, "GLT")],
+                      max_weight=24750)
+    pos, size, kind = load.placements()     # arrays NumPy (N, 3), (N, 3), (N,)
+
+    python -m Packaging.mixed_load [--boxes 2000] [--types 12]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from .container_fill import _layouts  # type: ignore
+except ImportError:
+    from Packaging.container_fill import _layouts  # type: ignore
+
+_EPS = 1e-6
+_NO_LIMIT = 10 ** 9
+
+
+@dataclass(frozen=True)
+class BoxType:
+    """Tipo de UC: dimensiones (mm), peso lleno (kg), cantidad, niveles máximos de apilado."""
+    l: float
+    w: float
+    h: float
+    weight: float = 0.0
+    quantity: int = 1
+    stacking: int | None = None
+    label: str = ""
+
+
+@dataclass
+class MixedLoad:
+    """Resultado de pack_mixed: bloques colocados (arrays por bloque) y totales."""
+    container: tuple
+    max_weight: float | None
+    box_types: tuple[BoxType, ...]
+    block_pos: np.ndarray    # (B, 3) origen x, y, z del bloque (mm)
+    block_box: np.ndarray    # (B, 3) caja en el bloque ya orientada (l, w, h)
+    block_n: np.ndarray      # (B, 3) nx, ny, nz
+    block_type: np.ndarray   # (B,) índice en box_types
+
+    @property
+    def counts(self) -> np.ndarray:
+        """UC cargadas por tipo."""
+        return np.bincount(self.block_type, weights=self.block_n.prod(axis=1),
+                           minlength=len(self.box_types)).astype(np.int64)
+
+    @property
+    def unpacked(self) -> np.ndarray:
+        """UC que no caben, por tipo."""
+        return np.array([int(t.quantity) for t in self.box_types], dtype=np.int64) - self.counts
+
+    @property
+    def boxes(self) -> int:
+        return int(self.block_n.prod(axis=1).sum())
+
+    @property
+    def weight(self) -> float:
+        w = np.array([float(t.weight) for t in self.box_types], dtype=np.float64)
+        return float((self.counts * w).sum()) if len(w) else 0.0
+
+    @property
+    def volume_m3(self) -> float:
+        return float((self.block_box.prod(axis=1) * self.block_n.prod(axis=1)).sum() / 1e9)
+
+    @property
+    def volume_saturation(self) -> float:
+        return self.volume_m3 / (float(np.prod(self.container)) / 1e9)
+
+    @property
+    def weight_saturation(self) -> float | None:
+        return self.weight / float(self.max_weight) if self.max_weight else None
+
+    def placements(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Una fila por UC: origen (N, 3), dimensiones (N, 3) e índice de tipo (N,)."""
+        if not len(self.block_n):
+            return np.zeros((0, 3)), np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+        pos, size, kind = [], [], []
+        for p, box, n, t in zip(self.block_pos, self.block_box, self.block_n, self.block_type):
+            grid = np.indices(n).reshape(3, -1).T
+            pos.append(p + grid * box)
+            size.append(np.broadcast_to(box, grid.shape))
+            kind.append(np.full(len(grid), t))
+        return np.concatenate(pos), np.concatenate(size), np.concatenate(kind)
+
+
+class _Blocks:
+    """Bloques colocados en arrays con capacidad creciente (consultas vectorizadas)."""
+
+    def __init__(self, capacity: int = 64):
+        self.n = 0
+        self.lo = np.zeros((capacity, 3))
+        self.hi = np.zeros((capacity, 3))
+        self.carry = np.zeros(capacity, dtype=np.int64)  # UC que aún admite encima cada columna del bloque
+
+    def add(self, lo, hi, carry: int) -> None:
+        if self.n == len(self.lo):
+            grow = len(self.lo)
+            self.lo = np.concatenate([self.lo, np.zeros((grow, 3))])
+            self.hi = np.concatenate([self.hi, np.zeros((grow, 3))])
+            self.carry = np.concatenate([self.carry, np.zeros(grow, dtype=np.int64)])
+        self.lo[self.n], self.hi[self.n], self.carry[self.n] = lo, hi, carry
+        self.n += 1
+
+    def overlap(self, lo, hi) -> np.ndarray:
+        """Máscara de bloques que se solapan con la caja lo-hi."""
+        L, H = self.lo[:self.n], self.hi[:self.n]
+        return ((L < np.asarray(hi) - _EPS) & (H > np.asarray(lo) + _EPS)).all(axis=1)
+
+    def column_support(self, x, y, a, b, nx, ny, z):
+        """(área apoyada mínima por columna, UC admitidas encima) de la base de un bloque nx × ny a la altura z."""
+        L, H = self.lo[:self.n], self.hi[:self.n]
+        on = ((np.abs(H[:, 2] - z) < _EPS) & (L[:, 0] < x + nx * a - _EPS) & (H[:, 0] > x + _EPS)
+              & (L[:, 1] < y + ny * b - _EPS) & (H[:, 1] > y + _EPS))
+        if not on.any():
+            return 0.0, 0
+        cx = x + np.arange(nx) * a
+        cy = y + np.arange(ny) * b
+        dx = np.clip(np.minimum(H[on, 0][:, None], cx + a) - np.maximum(L[on, 0][:, None], cx), 0, None)
+        dy = np.clip(np.minimum(H[on, 1][:, None], cy + b) - np.maximum(L[on, 1][:, None], cy), 0, None)
+        return float(np.einsum("si,sj->ij", dx, dy).min()), int(self.carry[:self.n][on].min())
+
+    def fits(self, points: np.ndarray, a, b, h, container, support_ratio: float) -> np.ndarray:
+        """Máscara de los puntos donde cabe una caja a × b × h (sin solape, apoyada, apilado admitido)."""
+        size = np.array([a, b, h])
+        ok = (points + size <= np.asarray(container) + _EPS).all(axis=1)
+        floor = points[:, 2] <= _EPS
+        if not self.n:
+            return ok & floor
+        L, H = self.lo[:self.n], self.hi[:self.n]
+        lo, hi = points[:, None, :], points[:, None, :] + size
+        ok &= ~((L < hi - _EPS) & (H > lo + _EPS)).all(axis=2).any(axis=1)
+        dx = np.clip(np.minimum(H[:, 0], hi[..., 0]) - np.maximum(L[:, 0], lo[..., 0]), 0, None)
+        dy = np.clip(np.minimum(H[:, 1], hi[..., 1]) - np.maximum(L[:, 1], lo[..., 1]), 0, None)
+        on = (np.abs(H[:, 2] - lo[..., 2]) < _EPS) & (dx * dy > _EPS)
+        area = np.where(on, dx * dy, 0).sum(axis=1)
+        carry = np.where(on, self.carry[:self.n], _NO_LIMIT).min(axis=1)
+        return ok & (floor | ((area >= max(support_ratio, _EPS) * a * b - _EPS) & (carry >= 1)))
+
+
+def _grow(blocks: _Blocks, container, p, a, b, h, stacking: int, allowed: int, support_ratio: float):
+    """Mayor bloque (nx, ny, nz, UC admitidas encima, planta libre) de cajas a × b × h en p, o None."""
+    Lc, Wc, Hc = container
+    x, y, z = p
+    if x + a > Lc + _EPS or y + b > Wc + _EPS or z + h > Hc + _EPS:
+        return None
+    carry = _NO_LIMIT
+    if z > _EPS:
+        area, carry = blocks.column_support(x, y, a, b, 1, 1, z)
+        if area < max(support_ratio, _EPS) * a * b - _EPS:
+            return None
+    # Altura: techo, obstáculos encima, apilado del tipo y lo que admite la columna de debajo
+    above = blocks.overlap((x, y, z), (x + a, y + b, Hc))
+    top = min(Hc, float(blocks.lo[:blocks.n][above, 2].min())) if above.any() else Hc
+    nz = min(stacking, carry, int((top - z + _EPS) // h), allowed)
+    if nz < 1:
+        return None
+    zh = z + nz * h
+    # A lo ancho y a lo largo hasta el primer obstáculo
+    ahead = blocks.overlap((x, y, z), (x + a, Wc, zh))
+    ylim = min(Wc, float(blocks.lo[:blocks.n][ahead, 1].min())) if ahead.any() else Wc
+    ny = max(1, int((ylim - y + _EPS) // b))
+    ahead = blocks.overlap((x, y, z), (Lc, y + ny * b, zh))
+    xlim = min(Lc, float(blocks.lo[:blocks.n][ahead, 0].min())) if ahead.any() else Lc
+    nx = max(1, int((xlim - x + _EPS) // a))
+    free = (xlim - x, ylim - y)
+    if nx * ny * nz > allowed:
+        cols = allowed // nz
+        ny = min(ny, cols)
+        nx = min(nx, cols // ny)
+    if z > _EPS and nx * ny > 1:
+        area, block_carry = blocks.column_support(x, y, a, b, nx, ny, z)
+        if area < max(support_ratio, _EPS) * a * b - _EPS or block_carry < nz:
+            nx = ny = 1  # la base completa no apoya: solo la columna
+        else:
+            carry = block_carry
+    return nx, ny, nz, min(carry, stacking) - nz, free
+
+
+def _floor_score(free, a: float, b: float) -> int:
+    """UC por capa en la planta libre con bloque principal a × b y franjas giradas (cortes de container_fill)."""
+    return max(sum(blk.count for blk in blocks) for blocks in _layouts(free[0], free[1], a, b))
+
+
+def _load_order(types: tuple, Hc: float) -> list[int]:
+    """Primero los tipos que forman columnas más altas (base de la carga), luego bases grandes."""
+    def key(i):
+        t = types[i]
+        levels = int(Hc // t.h) if t.h > 0 else 0
+        if t.stacking:
+            levels = min(levels, int(t.stacking))
+        return (-levels * float(t.h), -float(t.l) * float(t.w), -float(t.h))
+    return sorted(range(len(types)), key=key)
+
+
+def pack_mixed(container_dims, box_types, max_weight: float | None = None, support_ratio: float = 1.0,
+               rotate: bool = True) -> MixedLoad:
+    """Carga los box_types en un contenedor (L, W, H mm). Lo que no cabe queda en MixedLoad.unpacked."""
+    container = tuple(float(v) for v in container_dims)
+    types = tuple(box_types)
+    remaining = [max(int(t.quantity), 0) for t in types]
+    weight_left = float(max_weight) if max_weight else float("inf")
+    blocks = _Blocks()
+    out_pos, out_box, out_n, out_type = [], [], [], []
+    eps = {(0.0, 0.0, 0.0)}
+    for i in _load_order(types, container[2]):
+        t = types[i]
+        l, w, h = float(t.l), float(t.w), float(t.h)
+        if min(l, w, h) <= 0:
+            continue
+        orientations = [(l, w), (w, l)] if rotate and l != w else [(l, w)]
+        stacking = int(t.stacking) if t.stacking else _NO_LIMIT
+        while remaining[i] > 0:
+            allowed = remaining[i]
+            if t.weight > 0 and np.isfinite(weight_left):  # sin max_weight no hay tope por peso
+                allowed = min(allowed, int((weight_left + _EPS) // float(t.weight)))
+            if allowed < 1:
+                break
+            points = np.array(sorted(eps, key=lambda q: (q[0], q[2], q[1])))
+            mask = np.zeros(len(points), dtype=bool)
+            for a, b in orientations:
+                mask |= blocks.fits(points, a, b, h, container, support_ratio)
+            placed = None
+            for p in map(tuple, points[mask]):
+                best, best_score = None, None
+                for a, b in orientations:
+                    g = _grow(blocks, container, p, a, b, h, stacking, allowed, support_ratio)
+                    if g is None:
+                        continue
+                    # Orientación del bloque: la que mejor llena la planta libre con las franjas giradas (como fill())
+                    score = (_floor_score(g[4], a, b), g[0] * g[1] * g[2])
+                    if best is None or score > best_score:
+                        best, best_score = (g, a, b), score
+                if best is not None:
+                    placed = (p, best)
+                    break
+            if placed is None:
+                break
+            p, ((nx, ny, nz, carry, _), a, b) = placed
+            lo = np.array(p)
+            size = np.array([nx * a, ny * b, nz * h])
+            blocks.add(lo, lo + size, carry)
+            out_pos.append(lo)
+            out_box.append((a, b, h))
+            out_n.append((nx, ny, nz))
+            out_type.append(i)
+            count = nx * ny * nz
+            remaining[i] -= count
+            weight_left -= count * float(t.weight)
+            eps = _update_points(eps, blocks, lo, lo + size, container)
+    return MixedLoad(
+        container=container,
+        max_weight=max_weight,
+        box_types=types,
+        block_pos=np.array(out_pos, dtype=np.float64).reshape(-1, 3),
+        block_box=np.array(out_box, dtype=np.float64).reshape(-1, 3),
+        block_n=np.array(out_n, dtype=np.int64).reshape(-1, 3),
+        block_type=np.array(out_type, dtype=np.int64),
+    )
+
+
+def _drop(blocks: _Blocks, x, y, z) -> float:
+    """Altura a la que cae un punto (x, y, z): techo más alto debajo, o el suelo."""
+    L, H = blocks.lo[:blocks.n], blocks.hi[:blocks.n]
+    under = ((L[:, 0] <= x + _EPS) & (H[:, 0] > x + _EPS) & (L[:, 1] <= y + _EPS) & (H[:, 1] > y + _EPS)
+             & (H[:, 2] <= z + _EPS))
+    return float(H[under, 2].max()) if under.any() else 0.0
+
+
+def _update_points(eps: set, blocks: _Blocks, lo, hi, container) -> set:
+    """Quita los puntos cubiertos por el bloque nuevo y añade sus tres puntos extremos."""
+    Lc, Wc, Hc = container
+    keep = {q for q in eps
+            if not all(lo[k] - _EPS <= q[k] < hi[k] - _EPS for k in range(3))}
+    x0, y0, z0 = (float(v) for v in lo)
+    x1, y1, z1 = (float(v) for v in hi)
+    for q in ((x1, y0, z0), (x0, y1, z0), (x0, y0, z1)):
+        if q[0] < Lc - _EPS and q[1] < Wc - _EPS and q[2] < Hc - _EPS:
+            if q[2] > _EPS and q[2] != z1:
+                q = (q[0], q[1], _drop(blocks, q[0], q[1], q[2]))
+            keep.add(q)
+    return keep
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de velocidad del cargador mixto (40 HC)")
+    ap.add_argument("--boxes", type=int, default=2000)
+    ap.add_argument("--types", type=int, default=12)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    rng = np.random.default_rng(args.seed)
+    container = (12032, 2352, 2700)
+    qty = np.maximum(1, rng.multinomial(args.boxes - args.types, np.ones(args.types) / args.types) + 1)
+    dims = rng.uniform([2, 1.5, 1], [4, 3, 3], size=(args.types, 3))
+    # Escala para que el volumen total sea el del contenedor (carga completa)
+    dims *= (np.prod(container) / (qty * dims.prod(axis=1)).sum()) ** (1 / 3)
+    types = [BoxType(*np.round(d).tolist(), float(rng.integers(5, 15)), int(q), int(rng.integers(2, 8)), f"T{i}")
+             for i, (d, q) in enumerate(zip(dims, qty))]
+    t0 = time.perf_counter()
+    load = pack_mixed(container, types, max_weight=24750)
+    dt = time.perf_counter() - t0
+    print(f"{load.boxes}/{int(qty.sum())} UC en {len(load.block_n)} bloques, {dt:.3f}s; "
+          f"volumen {load.volume_saturation:.1%}, peso {load.weight_saturation:.1%}")
+
+
+if __name__ == "__main__":
+    main()
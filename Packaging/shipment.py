@@ -0,0 +1,325 @@
+"""Plan de contenedores para una lista de packaging mixta (consolidación semanal).
+
+    plan = plan_shipment([BoxType(1200, 1000, 975, 310, 400, 2, "GLT"), ...], rate_40ft=2150)
+    plan.mix                  # {"Container 40 HC": 5, "Container 20 Ft Std": 1}
+    plan.total_cost, plan.summary()
+    pos, size, kind = plan.loads[0].load.placements()
+
+1. First-fit-decreasing por volumen y peso: los tipos, de mayor a menor volumen de UC, se
+   reparten en contenedores del tipo principal (el de más volumen por coste).
+2. Refinado con carga real: cada contenedor se carga con pack_mixed (apilado, soporte,
+   peso) y lo que no cabe pasa al siguiente; se abren contenedores hasta cargarlo todo.
+   Después los contenedores menos llenos se juntan con otro si la carga de ambos cabe en uno.
+3. Mezcla: cada contenedor se cambia al tipo más barato en el que cabe entera su carga
+   (p. ej. el último, medio vacío, a 20 ft).
+
+Equipos por flujo (FLOW_CONTAINERS, como el Quote): OVERSEAS en 20 ft / 40 HC, INLAND en
+mega trailer; flow=None los mezcla. Coste: rate_40ft × factor del tipo (RATE_FACTORS,
+proporcional a TEU: 20 ft = medio 40 ft; un mega trailer cuenta como un 40 ft, así que en
+INLAND rate_40ft es la tarifa por trailer completo). main_ports_rate_40ft() lee la tarifa
+40ft all-in de MAIN PORTS para un POL/POD.
+
+Cada repack de la consolidación es un pack_mixed completo, así que solo se prueban unos pocos
+receptores por contenedor: 5000 UC de 60 tipos con apilado 1-4 (~45 contenedores) se
+planifican en 1-1.5 s.
+
+    python -m Packaging.shipment lista.csv [--rate 2150 | --pol CNSHA --pod ESVLC] [--flow INLAND]
+"""
+import argparse
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .container_fill import DIMENSIONES_INTERNAS, PESOS_MAXIMOS  # type: ignore
+    from .mixed_load import BoxType, MixedLoad, pack_mixed  # type: ignore
+except ImportError:
+    from Packaging.container_fill import DIMENSIONES_INTERNAS, PESOS_MAXIMOS  # type: ignore
+    from Packaging.mixed_load import BoxType, MixedLoad, pack_mixed  # type: ignore
+
+# Contenedores y mega trailer (mismo formato que CONTAINERS de Empower3D+)
+SHIPPING_CONTAINERS = {
+    name: {"length": DIMENSIONES_INTERNAS[name][0], "width": DIMENSIONES_INTERNAS[name][1],
+           "height": DIMENSIONES_INTERNAS[name][2], "max_weight": PESOS_MAXIMOS[name]}
+    for name in ("Container 20 Ft Std", "Container 40 HC", "Mega Trailer 90m3")
+}
+
+# Equipos de cada tipo de flujo (como TRANSPORT_OPERATIVE_DIMS del Quote)
+FLOW_CONTAINERS = {
+    "OVERSEAS": ("Container 20 Ft Std", "Container 40 HC"),
+    "INLAND": ("Mega Trailer 90m3",),
+}
+
+# Coste de cada tipo en fracciones de la tarifa 40ft: contenedores por TEU; un mega trailer es
+# una carga completa de camión, como un 40ft en el tramo terrestre
+RATE_FACTORS = {"Container 20 Ft Std": 0.5, "Container 40 HC": 1.0, "Mega Trailer 90m3": 1.0}
+
+
+@dataclass
+class ContainerLoad:
+    container: str
+    load: MixedLoad
+    cost: float | None
+
+
+@dataclass
+class ShipmentPlan:
+    box_types: tuple[BoxType, ...]
+    loads: list[ContainerLoad]
+    unplaced: np.ndarray   # UC por tipo que no caben en ningún contenedor
+
+    @property
+    def mix(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for c in self.loads:
+            out[c.container] = out.get(c.container, 0) + 1
+        return out
+
+    @property
+    def total_cost(self) -> float | None:
+        costs = [c.cost for c in self.loads]
+        return None if any(c is None for c in costs) else float(sum(costs))
+
+    @property
+    def boxes(self) -> int:
+        return sum(c.load.boxes for c in self.loads)
+
+    def summary(self) -> pd.DataFrame:
+        """Una fila por contenedor: UC, volumen, peso, saturaciones y coste."""
+        return pd.DataFrame([{
+            "#": k + 1,
+            "Container": c.container,
+            "Boxes": c.load.boxes,
+            "Volume (m3)": round(c.load.volume_m3, 2),
+            "Volume saturation (%)": round(100 * c.load.volume_saturation, 1),
+            "Weight (kg)": round(c.load.weight, 1),
+            "Weight saturation (%)": round(100 * c.load.weight_saturation, 1) if c.load.weight_saturation is not None else None,
+            "Cost (€)": round(c.cost, 2) if c.cost is not None else None,
+        } for k, c in enumerate(self.loads)])
+
+
+def _dims(spec: dict) -> tuple:
+    return (float(spec["length"]), float(spec["width"]), float(spec["height"]))
+
+
+def _volume(spec: dict) -> float:
+    return float(np.prod(_dims(spec)))
+
+
+def _ffd(types: tuple, quantities: np.ndarray, volume: float, max_weight: float | None) -> list[np.ndarray]:
+    """First-fit-decreasing por volumen y peso: UC de cada tipo en cada contenedor."""
+    vol = np.array([t.l * t.w * t.h for t in types], dtype=np.float64)
+    wt = np.array([max(float(t.weight), 0.0) for t in types], dtype=np.float64)
+    cap_w = float(max_weight) if max_weight else np.inf
+    bins: list[np.ndarray] = []
+    vol_left: list[float] = []
+    wt_left: list[float] = []
+    for i in np.argsort(-vol, kind="stable"):
+        q = int(quantities[i])
+        if q <= 0 or vol[i] <= 0 or vol[i] > volume or wt[i] > cap_w:
+            continue
+        k = 0
+        while q > 0:
+            if k == len(bins):
+                bins.append(np.zeros(len(types), dtype=np.int64))
+                vol_left.append(volume)
+                wt_left.append(cap_w)
+            fit = int(vol_left[k] // vol[i])
+            if wt[i] > 0 and np.isfinite(wt_left[k]):  # sin max_weight no hay tope por peso
+                fit = min(fit, int(wt_left[k] // wt[i]))
+            n = min(q, fit)
+            if n > 0:
+                bins[k][i] += n
+                vol_left[k] -= n * vol[i]
+                wt_left[k] -= n * wt[i]
+                q -= n
+            k += 1
+    return bins
+
+
+def _with_quantities(types: tuple, quantities) -> list[BoxType]:
+    return [BoxType(t.l, t.w, t.h, t.weight, int(q), t.stacking, t.label) for t, q in zip(types, quantities)]
+
+
+# Receptores que se prueban para cada contenedor a vaciar (los de más hueco libre primero)
+CONSOLIDATE_TRIES = 3
+
+
+def _consolidate(loads: list[MixedLoad], pack, spec: dict) -> list[MixedLoad]:
+    """Junta el contenedor menos lleno con otro mientras la carga conjunta quepa en uno solo.
+
+    Cada intento es un pack_mixed completo, así que para cada contenedor solo se prueban los
+    CONSOLIDATE_TRIES receptores con más hueco (que pasan volumen y peso) y una pareja que ya ha
+    fallado no se vuelve a probar: con límites de apilado casi ninguna pareja cabe, y probarlas
+    todas era cuadrático en el nº de contenedores.
+    """
+    volume = _volume(spec)
+    max_weight = spec.get("max_weight")
+    loads = list(loads)
+    failed: set[tuple[bytes, bytes]] = set()
+    merged = True
+    while merged and len(loads) > 1:
+        merged = False
+        order = sorted(range(len(loads)), key=lambda k: loads[k].volume_m3)
+        for a in order:
+            donor = loads[a]
+            tries = 0
+            for b in order:
+                receiver = loads[b]
+                if b == a or (donor.volume_m3 + receiver.volume_m3) * 1e9 > volume:
+                    continue
+                if max_weight and donor.weight + receiver.weight > float(max_weight):
+                    continue
+                if tries == CONSOLIDATE_TRIES:
+                    break
+                tries += 1
+                pair = (donor.counts.tobytes(), receiver.counts.tobytes())
+                if pair in failed:
+                    continue
+                both = pack(donor.counts + receiver.counts)
+                if both.boxes == donor.boxes + receiver.boxes:
+                    loads[b] = both
+                    del loads[a]
+                    merged = True
+                    break
+                failed.add(pair)
+            if merged:
+                break
+    return loads
+
+
+def plan_shipment(box_types, containers: dict | None = None, rate_40ft: float | None = None,
+                  cost_factors: dict | None = None, support_ratio: float = 1.0,
+                  flow: str = "OVERSEAS") -> ShipmentPlan:
+    """Contenedores necesarios para cargar todos los box_types (ver docstring del módulo).
+
+    Sin containers se usan los equipos de flow (FLOW_CONTAINERS); flow=None los mezcla todos.
+    """
+    types = tuple(box_types)
+    if containers is None:
+        names = FLOW_CONTAINERS[str(flow).upper()] if flow else tuple(SHIPPING_CONTAINERS)
+        containers = {n: SHIPPING_CONTAINERS[n] for n in names}
+    factors = RATE_FACTORS if cost_factors is None else cost_factors
+
+    def cost(name: str) -> float | None:
+        if rate_40ft is None or name not in factors:
+            return None
+        return float(rate_40ft) * float(factors[name])
+
+    # Tipo principal: más volumen por unidad de coste (sin tarifa, el mayor)
+    main = max(containers, key=lambda n: (_volume(containers[n]) / factors[n] if n in factors else 0, _volume(containers[n])))
+    spec = containers[main]
+    quantities = np.array([max(int(t.quantity), 0) for t in types], dtype=np.int64)
+
+    def pack(name: str, qty) -> MixedLoad:
+        s = containers[name]
+        return pack_mixed(_dims(s), _with_quantities(types, qty), max_weight=s.get("max_weight"),
+                          support_ratio=support_ratio)
+
+    # 1-2. FFD y refinado con carga real; lo que no cabe pasa al siguiente contenedor
+    loads: list[MixedLoad] = []
+    carry = np.zeros(len(types), dtype=np.int64)
+    for assigned in _ffd(types, quantities, _volume(spec), spec.get("max_weight")):
+        request = assigned + carry
+        load = pack(main, request)
+        if load.boxes:
+            loads.append(load)
+        carry = request - load.counts
+    while carry.sum() > 0:
+        load = pack(main, carry)
+        if not load.boxes:
+            break
+        loads.append(load)
+        carry = carry - load.counts
+    # UC sin hueco en el tipo principal (p. ej. FFD las descartó por tamaño o peso)
+    unplaced = quantities - sum((l.counts for l in loads), np.zeros(len(types), dtype=np.int64))
+    loads = _consolidate(loads, lambda qty: pack(main, qty), spec)
+
+    # 3. Cada contenedor al tipo más barato (o más pequeño) que admite toda su carga
+    cheaper = sorted((n for n in containers if n != main),
+                     key=lambda n: (factors.get(n, np.inf), _volume(containers[n])))
+    plan: list[ContainerLoad] = []
+    for load in loads:
+        chosen, chosen_load = main, load
+        for name in cheaper:
+            s = containers[name]
+            if (factors.get(name, np.inf) > factors.get(main, np.inf) or load.volume_m3 * 1e9 > _volume(s)
+                    or (s.get("max_weight") and load.weight > float(s["max_weight"]))):
+                continue
+            alt = pack(name, load.counts)
+            if alt.boxes == load.boxes:
+                chosen, chosen_load = name, alt
+                break
+        plan.append(ContainerLoad(chosen, chosen_load, cost(chosen)))
+    return ShipmentPlan(types, plan, unplaced)
+
+
+def main_ports_rate_40ft(pol: str, pod: str, data_file: str | None = None) -> float | None:
+    """Tarifa 40ft all-in de MAIN PORTS para el par POL/POD (None si no hay fila o tarifa)."""
+    try:
+        from Quotations.generate_quote import find_qtool_data_file
+        from Quotations.lookup_index import build_lookup_indexes, cell_value
+        from Quotations.main_ports_schema import compile_main_ports_schema
+        from Quotations.reference_data import load_reference_data
+    except ImportError:
+        return None
+    data_file = data_file or find_qtool_data_file()
+    if not data_file or not pol or not pod:
+        return None
+    ref = load_reference_data(data_file)
+    schema = ref.derived(("main_ports_schema",), lambda: compile_main_ports_schema(ref.main_ports, ref.transit_time))
+    cols = (schema.pol_col_mp, schema.pod_col_mp, schema.pol_col_tt, schema.pod_col_tt)
+    indexes = ref.derived(("lookup_indexes",) + cols, lambda: build_lookup_indexes(ref, *cols))
+    pos = indexes.mp_pairs.get((pol.upper(), pod.upper())) if indexes.mp_pairs is not None else None
+    if pos is None or not schema.rate_col_mp:
+        return None
+    val = pd.to_numeric(cell_value(ref.main_ports, pos, schema.rate_col_mp), errors="coerce")
+    return float(val) if pd.notna(val) else None
+
+
+def box_types_from_frame(df: pd.DataFrame) -> list[BoxType]:
+    """Lista de packaging (columnas de Empower3D+: Length, Width, Height, Weight EMPTY, Part Weight,
+    Quantity, Stacking, Packaging Code) a BoxType."""
+    def num(c, default=0) -> pd.Series:
+        # columnas opcionales ausentes -> Series con el valor por defecto
+        col = df[c] if c in df.columns else pd.Series(default, index=df.index)
+        return pd.to_numeric(col, errors="coerce").fillna(default)
+
+    weight = num("Weight EMPTY") + num("Part Weight") if "Weight" not in df.columns else num("Weight")
+    stacking = pd.to_numeric(df.get("Stacking"), errors="coerce") if "Stacking" in df.columns else None
+    labels = df["Packaging Code"].astype(str) if "Packaging Code" in df.columns else pd.Series([""] * len(df))
+    return [
+        BoxType(float(l), float(w), float(h), float(wt), int(q),
+                None if stacking is None or pd.isna(stacking.iloc[k]) else int(stacking.iloc[k]), labels.iloc[k])
+        for k, (l, w, h, wt, q) in enumerate(zip(num("Length"), num("Width"), num("Height"), weight, num("Quantity", 1)))
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Contenedores necesarios para una lista de packaging")
+    ap.add_argument("packaging_list", help="CSV/XLSX con Length, Width, Height, Weight EMPTY, Part Weight, Quantity, Stacking")
+    ap.add_argument("--rate", type=float, help="tarifa 40ft (€); en INLAND, por mega trailer")
+    ap.add_argument("--flow", default="OVERSEAS", choices=[*FLOW_CONTAINERS, "ALL"])
+    ap.add_argument("--pol")
+    ap.add_argument("--pod")
+    args = ap.parse_args()
+    path = args.packaging_list
+    df = pd.read_excel(path) if os.path.splitext(path)[1].lower() in (".xlsx", ".xls") else pd.read_csv(path)
+    df.columns = [str(c).strip() for c in df.columns]
+    rate = args.rate
+    if rate is None and args.pol and args.pod:
+        rate = main_ports_rate_40ft(args.pol, args.pod)
+    t0 = time.perf_counter()
+    plan = plan_shipment(box_types_from_frame(df), rate_40ft=rate, flow=None if args.flow == "ALL" else args.flow)
+    print(plan.summary().to_string(index=False))
+    print(f"\n{plan.boxes} UC en {len(plan.loads)} contenedores {plan.mix} ({time.perf_counter() - t0:.2f}s)"
+          + (f", coste total {plan.total_cost:,.2f} €" if plan.total_cost is not None else ""))
+    if plan.unplaced.sum():
+        print("Sin hueco: " + ", ".join(f"{t.label or i}: {n}" for i, (t, n) in enumerate(zip(plan.box_types, plan.unplaced)) if n))
+
+
+if __name__ == "__main__":
+    main()
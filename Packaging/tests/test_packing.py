@@ -0,0 +1,164 @@
+"""Invariantes de los motores de carga (container_fill, guillotine, mixed_load, shipment).
+
+Comprobaciones de propiedades sobre casos aleatorios con semilla fija:
+  - fill_arrays() == fill() y guillotina >= fill();
+  - plantas dentro del contenedor y sin solapes;
+  - pack_mixed con un solo tipo == fill();
+  - cargas mixtas sin solapes, dentro del contenedor, apoyadas, con el apilado y el peso
+    admitidos; el plan de shipment carga todas las UC.
+
+    python -m pytest Packaging/tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Packaging.container_fill import DIMENSIONES_INTERNAS, DIMENSIONES_OPERATIVAS, fill, fill_arrays
+from Packaging.guillotine import fill_guillotine
+from Packaging.mixed_load import BoxType, pack_mixed
+from Packaging.shipment import box_types_from_frame, plan_shipment
+
+C40 = DIMENSIONES_INTERNAS["Container 40 HC"]
+_EPS = 1e-6
+
+
+def _random_boxes(seed: int, n: int, lo=(150, 150, 150), hi=(2400, 1300, 1500)) -> np.ndarray:
+    return np.random.default_rng(seed).integers(lo, hi, size=(n, 3)).astype(np.float64)
+
+
+def _check_floor(container, blocks) -> int:
+    """Cajas de la planta (bloques de Fill) dentro del contenedor y sin solapes; devuelve cuántas hay."""
+    rects = np.array([(b.x + i * b.l, b.y + j * b.w, b.l, b.w)
+                      for b in blocks for i in range(b.nl) for j in range(b.nw)], dtype=np.float64).reshape(-1, 4)
+    lo, hi = rects[:, :2], rects[:, :2] + rects[:, 2:]
+    assert (lo >= -_EPS).all() and (hi <= np.asarray(container[:2]) + _EPS).all()
+    for k in range(len(rects)):
+        overlap = (lo[k + 1:] < hi[k] - _EPS).all(axis=1) & (hi[k + 1:] > lo[k] + _EPS).all(axis=1)
+        assert not overlap.any()
+    return len(rects)
+
+
+def _check_load(load, support_ratio: float) -> None:
+    """Dentro del contenedor, sin solapes, soporte, apilado (UC encima <= stacking - 1) y peso."""
+    pos, size, kind = load.placements()
+    hi = pos + size
+    assert (pos >= -_EPS).all() and (hi <= np.asarray(load.container) + _EPS).all()
+    for i in range(len(pos)):
+        overlap = (pos[i + 1:] < hi[i] - _EPS).all(axis=1) & (hi[i + 1:] > pos[i] + _EPS).all(axis=1)
+        assert not overlap.any()
+    above = np.zeros(len(pos), dtype=np.int64)
+    for i in np.argsort(-pos[:, 2]):
+        # UC que carga la caja i: la mayor pila de las que apoyan sobre ella
+        on = np.abs(pos[:, 2] - hi[i, 2]) < _EPS
+        dx = np.clip(np.minimum(hi[on, 0], hi[i, 0]) - np.maximum(pos[on, 0], pos[i, 0]), 0, None)
+        dy = np.clip(np.minimum(hi[on, 1], hi[i, 1]) - np.maximum(pos[on, 1], pos[i, 1]), 0, None)
+        resting = np.nonzero(on)[0][dx * dy > _EPS]
+        above[i] = (above[resting] + 1).max() if len(resting) else 0
+        if pos[i, 2] > _EPS:
+            under = np.abs(hi[:, 2] - pos[i, 2]) < _EPS
+            dx = np.clip(np.minimum(hi[under, 0], hi[i, 0]) - np.maximum(pos[under, 0], pos[i, 0]), 0, None)
+            dy = np.clip(np.minimum(hi[under, 1], hi[i, 1]) - np.maximum(pos[under, 1], pos[i, 1]), 0, None)
+            assert (dx * dy).sum() >= support_ratio * size[i, 0] * size[i, 1] - _EPS
+    stacking = np.array([t.stacking or 10 ** 9 for t in load.box_types])
+    assert (above <= stacking[kind] - 1).all()
+    if load.max_weight:
+        assert load.weight <= load.max_weight + _EPS
+    assert (load.counts <= [t.quantity for t in load.box_types]).all()
+
+
+@pytest.mark.parametrize("container", list(DIMENSIONES_OPERATIVAS))
+def test_fill_arrays_matches_fill(container):
+    dims = DIMENSIONES_OPERATIVAS[container]
+    boxes = _random_boxes(1, 400)
+    stacking = np.random.default_rng(2).integers(1, 6, size=len(boxes))
+    for stack in (None, stacking):
+        counts, layers, _ = fill_arrays(boxes[:, 0], boxes[:, 1], boxes[:, 2], dims, stack)
+        for k, box in enumerate(boxes):
+            f = fill(dims, box, None if stack is None else int(stack[k]))
+            assert (counts[k], layers[k]) == (f.by_volume, f.layers)
+
+
+@pytest.mark.parametrize("container", list(DIMENSIONES_OPERATIVAS))
+def test_fill_layout_is_valid(container):
+    dims = DIMENSIONES_OPERATIVAS[container]
+    for box in _random_boxes(3, 150):
+        f = fill(dims, box, max_weight=24000, box_weight=float(box[2]) / 10)
+        if f.layers:
+            assert _check_floor(dims, f.blocks) == f.per_layer
+        assert f.by_volume == f.per_layer * f.layers
+        assert f.count == min(f.by_volume, f.by_weight)
+
+
+@pytest.mark.parametrize("container", ["Container 20 Ft Std", "Container 40 HC"])
+def test_guillotine_never_below_fill(container):
+    dims = DIMENSIONES_OPERATIVAS[container]
+    for box in _random_boxes(4, 40, lo=(250, 200, 200)):
+        base = fill(dims, box)
+        g = fill_guillotine(dims, box, time_budget=None)
+        assert g.by_volume >= base.by_volume
+        if g.layers:
+            assert _check_floor(dims, g.blocks) == g.per_layer
+            assert g.by_volume == g.per_layer * g.layers
+
+
+def test_pack_mixed_single_type_matches_fill():
+    rng = np.random.default_rng(5)
+    for box in _random_boxes(6, 40, lo=(200, 200, 150), hi=(1300, 1200, 1300)):
+        stacking = None if rng.random() < 0.3 else int(rng.integers(1, 6))
+        expected = fill(C40, box, stacking).by_volume
+        load = pack_mixed(C40, [BoxType(*box, weight=1.0, quantity=expected + 10, stacking=stacking)])
+        assert load.boxes == expected
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_pack_mixed_load_is_valid(seed):
+    rng = np.random.default_rng(seed)
+    n_types = int(rng.integers(1, 15))
+    qty = np.maximum(1, rng.multinomial(int(rng.integers(100, 500)), np.ones(n_types) / n_types))
+    dims = rng.uniform([2, 1.5, 1], [4, 3, 3], size=(n_types, 3))
+    dims *= (np.prod(C40) / (qty * dims.prod(axis=1)).sum()) ** (1 / 3)  # volumen total = contenedor
+    types = [BoxType(*np.round(d).tolist(), float(rng.integers(1, 80)), int(q),
+                     None if rng.random() < 0.3 else int(rng.integers(1, 6)), f"T{i}")
+             for i, (d, q) in enumerate(zip(dims, qty))]
+    ratio = float(rng.choice([1.0, 0.8, 0.6]))
+    _check_load(pack_mixed(C40, types, max_weight=24750, support_ratio=ratio), ratio)
+
+
+def test_pack_mixed_without_weight_limit():
+    load = pack_mixed(C40, [BoxType(1200, 1000, 975, 310, 40, 2)])
+    assert load.boxes == 40
+    assert load.unpacked.sum() == 0
+    assert load.weight == 40 * 310
+    assert load.weight_saturation is None
+
+
+@pytest.mark.parametrize("flow", ["OVERSEAS", "INLAND", None])
+def test_plan_shipment_loads_every_box(flow):
+    rng = np.random.default_rng(9)
+    types = [BoxType(float(rng.integers(300, 1250)), float(rng.integers(250, 1000)), float(rng.integers(200, 1100)),
+                     float(rng.integers(10, 400)), int(rng.integers(5, 60)), int(rng.integers(1, 5)), f"T{i}")
+             for i in range(12)]
+    plan = plan_shipment(types, rate_40ft=2000, flow=flow)
+    loaded = sum((c.load.counts for c in plan.loads), np.zeros(len(types), dtype=np.int64))
+    assert (loaded + plan.unplaced == [t.quantity for t in types]).all()
+    assert plan.unplaced.sum() == 0
+    for c in plan.loads:
+        _check_load(c.load, 1.0)
+    assert plan.total_cost == pytest.approx(sum(c.cost for c in plan.loads))
+
+
+def test_plan_shipment_container_without_max_weight():
+    types = [BoxType(1200, 1000, 975, 310, 100, 2, "GLT"), BoxType(600, 400, 280, 12, 500, 5, "KLT")]
+    plan = plan_shipment(types, containers={"Mega": {"length": 13620, "width": 2480, "height": 2900}})
+    assert plan.unplaced.sum() == 0
+    assert sum(c.load.boxes for c in plan.loads) == 600
+
+
+def test_box_types_from_frame_optional_columns():
+    df = pd.DataFrame({"Length": [1200, 600], "Width": [1000, 400], "Height": [975, 280]})
+    types = box_types_from_frame(df)
+    assert [(t.weight, t.quantity, t.stacking) for t in types] == [(0.0, 1, None), (0.0, 1, None)]
+    df["Quantity"] = [3, None]
+    df["Part Weight"] = [12.5, 4]
+    types = box_types_from_frame(df)
+    assert [(t.weight, t.quantity) for t in types] == [(12.5, 3), (4.0, 1)]
@@ -1,7 +1,11 @@
 import os
+import threading
+import time
+from functools import lru_cache
 from math import radians, cos, sin, asin, sqrt
 from typing import Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 # Optional offline geocoding fallback
@@ -28,6 +32,29 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return km
 
 
+EARTH_RADIUS_KM = 6371.0
+ROAD_FACTOR = 1.30
+
+
+def haversine_km_rad(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """haversine_km on arrays already in radians (broadcast; NaN where undefined)."""
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    with np.errstate(invalid="ignore"):
+        return EARTH_RADIUS_KM * (2 * np.arcsin(np.sqrt(a)))
+
+
+def haversine_km_many(lat1, lon1, lat2, lon2, dtype=np.float64) -> np.ndarray:
+    """Array version of haversine_km (inputs broadcast; NaN where any coordinate is missing).
+
+    Always computed in float64; dtype only sets the output type (np.float32 halves the memory
+    of large matrices, ~1 m precision).
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    return haversine_km_rad(lat1, lon1, lat2, lon2).astype(dtype, copy=False)
+
+
 class GeoIndex:
     """In-memory index of optional local geocoding data.
 
@@ -90,6 +117,87 @@ def normalize_zip(zip_code: str) -> str:
     return z
 
 
+# pgeocode datasets kept in memory (countries, LRU) and retry delay after a failed load/download
+PGEOCODE_CACHE_SIZE = 16
+PGEOCODE_RETRY_SECONDS = 300.0
+_CITY_MEMO_MAX = 4096
+
+
+class _PostalIndex:
+    """pgeocode data for one country, indexed once: ZIP -> (lat, lon), CITY -> row positions."""
+
+    def __init__(self, nomi):
+        self.nomi = nomi
+        self.zip_coords: dict[str, tuple[float, float]] = {}
+        uni = getattr(nomi, "_data_frame", None)
+        if isinstance(uni, pd.DataFrame) and not uni.empty:
+            for code, la, lo in zip(uni["postal_code"].values, uni["latitude"].values, uni["longitude"].values):
+                if isinstance(code, str) and code not in self.zip_coords and pd.notna(la) and pd.notna(lo):
+                    self.zip_coords[code] = (float(la), float(lo))
+        self._coords = None
+        self._upper = None
+        self._by_name: dict = {}
+        self._city_memo: dict = {}
+        self._lock = threading.Lock()
+        df = getattr(nomi, "_data", None)
+        if df is not None and isinstance(df, pd.DataFrame) and not df.empty and "place_name" in df.columns:
+            self._coords = df[["latitude", "longitude"]]
+            self._upper = df["place_name"].astype(str).str.upper()
+            self._by_name = self._upper.groupby(self._upper.values).indices
+
+    def city_centroid(self, c: str) -> Optional[Tuple[float, float, str]]:
+        """Mean coordinates of places named c (exact), else of names containing c."""
+        if self._coords is None:
+            return None
+        with self._lock:
+            if c in self._city_memo:
+                return self._city_memo[c]
+        res = None
+        try:
+            pos = self._by_name.get(c)
+            if pos is not None:
+                subset, tag = self._coords.iloc[pos], "pgeocode_city_exact"
+            else:
+                subset, tag = self._coords[self._upper.str.contains(c, na=False).values], "pgeocode_city_contains"
+            subset = subset.dropna(subset=["latitude", "longitude"])
+            if not subset.empty:
+                lat = float(pd.to_numeric(subset["latitude"]).mean())
+                lon = float(pd.to_numeric(subset["longitude"]).mean())
+                res = (lat, lon, tag)
+        except Exception:
+            res = None
+        with self._lock:
+            if len(self._city_memo) >= _CITY_MEMO_MAX:
+                self._city_memo.clear()
+            self._city_memo[c] = res
+        return res
+
+
+_pgeocode_failures: dict[str, float] = {}
+
+
+@lru_cache(maxsize=PGEOCODE_CACHE_SIZE)
+def _load_postal_index(country_code: str) -> _PostalIndex:
+    return _PostalIndex(pgeocode.Nominatim(country_code))
+
+
+def postal_index(country_code: str) -> Optional[_PostalIndex]:
+    """Cached pgeocode index for a country (None if pgeocode is missing or the data can't be loaded)."""
+    if pgeocode is None:
+        return None
+    cc = (country_code or "").strip().upper()
+    failed_at = _pgeocode_failures.get(cc)
+    if failed_at is not None and time.monotonic() - failed_at < PGEOCODE_RETRY_SECONDS:
+        return None
+    try:
+        idx = _load_postal_index(cc)
+    except Exception:
+        _pgeocode_failures[cc] = time.monotonic()
+        return None
+    _pgeocode_failures.pop(cc, None)
+    return idx
+
+
 def resolve_point(geo: GeoIndex,
                   country_code: str,
                   zip_code: Optional[str] = None,
@@ -108,14 +216,11 @@ def resolve_point(geo: GeoIndex,
         if p:
             return p[0], p[1], f"zip:{z}"
         # pgeocode fallback by ZIP (offline)
-        if pgeocode is not None:
-            try:
-                nomi = pgeocode.Nominatim((country_code or "").strip().upper())
-                row = nomi.query_postal_code(z)
-                if row is not None and pd.notna(row.latitude) and pd.notna(row.longitude):
-                    return float(row.latitude), float(row.longitude), f"pgeocode_zip:{z}"
-            except Exception:
-                pass
+        pidx = postal_index(country_code)
+        if pidx is not None:
+            p = pidx.zip_coords.get(z)
+            if p:
+                return p[0], p[1], f"pgeocode_zip:{z}"
     # City
     if city:
         c = str(city).strip().upper()
@@ -123,21 +228,11 @@ def resolve_point(geo: GeoIndex,
         if p:
             return p[0], p[1], f"city:{c}"
         # pgeocode fallback by City centroid
-        if pgeocode is not None:
-            try:
-                nomi = pgeocode.Nominatim((country_code or "").strip().upper())
-                df = getattr(nomi, "_data", None)
-                if df is not None and isinstance(df, pd.DataFrame) and not df.empty and "place_name" in df.columns:
-                    exact = df[df["place_name"].astype(str).str.upper() == c]
-                    subset = exact if not exact.empty else df[df["place_name"].astype(str).str.upper().str.contains(c, na=False)]
-                    subset = subset.dropna(subset=["latitude", "longitude"])
-                    if not subset.empty:
-                        lat = float(pd.to_numeric(subset["latitude"]).mean())
-                        lon = float(pd.to_numeric(subset["longitude"]).mean())
-                        tag = "pgeocode_city_exact" if not exact.empty else "pgeocode_city_contains"
-                        return lat, lon, f"{tag}:{c}"
-            except Exception:
-                pass
+        pidx = postal_index(country_code)
+        if pidx is not None:
+            hit = pidx.city_centroid(c)
+            if hit:
+                return hit[0], hit[1], f"{hit[2]}:{c}"
     # Plant
     if plant:
         pl = str(plant).strip().upper()
@@ -157,7 +252,7 @@ def resolve_point(geo: GeoIndex,
     return None, None, ""
 
 
-def road_km_between(p1: Tuple[float, float], p2: Tuple[float, float], road_factor: float = 1.30) -> float:
+def road_km_between(p1: Tuple[float, float], p2: Tuple[float, float], road_factor: float = ROAD_FACTOR) -> float:
     """Approximate road distance using haversine * road_factor (default 1.30)."""
     lat1, lon1 = p1
     lat2, lon2 = p2
@@ -165,3 +260,40 @@ def road_km_between(p1: Tuple[float, float], p2: Tuple[float, float], road_facto
     return geo_km * float(road_factor)
 
 
+def road_factors(origin_cc, dest_cc, factors: dict | None = None, default: float = ROAD_FACTOR) -> np.ndarray:
+    """Road factor per (origin CC, destination CC) row, from {(OC, DC): factor}; default elsewhere."""
+    oc = np.atleast_1d(np.asarray(origin_cc, dtype=object))
+    dc = np.atleast_1d(np.asarray(dest_cc, dtype=object))
+    oc, dc = np.broadcast_arrays(oc, dc)
+    out = np.full(oc.shape, float(default))
+    if factors:
+        norm = {(str(o).strip().upper(), str(d).strip().upper()): float(f) for (o, d), f in factors.items()}
+        for i, (o, d) in enumerate(zip(oc.ravel(), dc.ravel())):
+            f = norm.get((str(o or "").strip().upper(), str(d or "").strip().upper()))
+            if f is not None:
+                out.flat[i] = f
+    return out
+
+
+def road_km_many(lat1, lon1, lat2, lon2, road_factor=ROAD_FACTOR, dtype=np.float64) -> np.ndarray:
+    """Array version of road_km_between: haversine_km_many * road_factor.
+
+    road_factor is a scalar or an array broadcasting with the coordinates (see road_factors()).
+    """
+    km = haversine_km_many(lat1, lon1, lat2, lon2) * np.asarray(road_factor, dtype=float)
+    return km.astype(dtype, copy=False)
+
+
+def road_km_matrix(origin_lat, origin_lon, dest_lat, dest_lon, road_factor=ROAD_FACTOR, dtype=np.float64) -> np.ndarray:
+    """(n_origins, n_destinations) road km matrix, e.g. every RFQ origin against every port.
+
+    road_factor is a scalar, a per-origin vector (n_origins,) or a full (n_origins, n_destinations) array.
+    """
+    olat = np.asarray(origin_lat, dtype=float).reshape(-1, 1)
+    olon = np.asarray(origin_lon, dtype=float).reshape(-1, 1)
+    dlat = np.asarray(dest_lat, dtype=float).reshape(1, -1)
+    dlon = np.asarray(dest_lon, dtype=float).reshape(1, -1)
+    factor = np.asarray(road_factor, dtype=float)
+    if factor.ndim == 1:
+        factor = factor.reshape(-1, 1)
+    return road_km_many(olat, olon, dlat, dlon, road_factor=factor, dtype=dtype)
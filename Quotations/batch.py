@@ -0,0 +1,200 @@
+"""Headless batch quoting of many 'Quotation Template _INPUT' workbooks.
+
+    python -m Quotations.batch <dir|glob|file> [...] [--out DIR] [--workers N] [--report NAME]
+
+Reference data is loaded once in the parent and the templates are quoted in a process
+pool sized to the available cores (workers forked on Linux inherit the warm cache; spawned
+workers on Windows load it once each). Output names are reserved up front with
+reserve_output_path(), so numbering follows the input order and never collides with other
+writers of the same directory. The run ends with batch_report_<timestamp>.json/.csv in the
+output directory (per-file rows, timings, output path or error); the exit code is 1 when
+any template failed.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+try:
+    from .generate_quote import OUTPUT_PREFIX, build_output, find_qtool_data_file, reserve_output_path
+    from .profiling import collect_stage_timings
+    from .qtool_loader import load_input_template
+    from .reference_data import load_reference_data
+except ImportError:
+    from Quotations.generate_quote import OUTPUT_PREFIX, build_output, find_qtool_data_file, reserve_output_path  # type: ignore
+    from Quotations.profiling import collect_stage_timings  # type: ignore
+    from Quotations.qtool_loader import load_input_template  # type: ignore
+    from Quotations.reference_data import load_reference_data  # type: ignore
+
+
+TEMPLATE_EXTS = (".xlsx", ".xlsm")
+REPORT_FIELDS = ["input", "status", "output", "rows", "load_s", "build_s", "total_s", "error"]
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows / macOS
+        return os.cpu_count() or 1
+
+
+def collect_templates(inputs: list[str]) -> list[str]:
+    """Template paths from directories, globs or files (deduplicated, input order kept).
+
+    Excel lock files (~$...) and our own outputs (OUTPUT_PREFIX...) are skipped.
+    """
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, n) for n in os.listdir(item))
+        elif glob.has_magic(item):
+            paths = sorted(glob.glob(item))
+        else:
+            paths = [item]
+        for path in paths:
+            name = os.path.basename(path)
+            if not name.lower().endswith(TEMPLATE_EXTS) or name.startswith("~$") or name.startswith(OUTPUT_PREFIX):
+                continue
+            if os.path.isfile(path):
+                found.append(os.path.abspath(path))
+    return list(dict.fromkeys(found))
+
+
+def _warm_reference_data() -> None:
+    data_file = find_qtool_data_file()
+    if not data_file:
+        raise FileNotFoundError("QUOTATION TOOL DATA file not found in QTool directory")
+    load_reference_data(data_file)
+
+
+def _release_placeholder(out_path: str) -> None:
+    """Remove the reserved output file if nothing was written to it."""
+    try:
+        if os.path.exists(out_path) and os.path.getsize(out_path) == 0:
+            os.remove(out_path)
+    except OSError:
+        pass
+
+
+def quote_template(template: str, out_path: str) -> dict:
+    """Quote one template into out_path (runs in a worker). Never raises: errors go in the record."""
+    record = {"input": template, "status": "ok", "output": out_path, "rows": None,
+              "load_s": None, "build_s": None, "total_s": None, "error": "", "stages": {}}
+    t0 = time.perf_counter()
+    try:
+        df = load_input_template(template, sheet="Input")
+        record["rows"] = len(df)
+        t1 = time.perf_counter()
+        record["load_s"] = round(t1 - t0, 4)
+        with collect_stage_timings() as timings:
+            build_output(df, out_path, source_workbook_path=template)
+        record["build_s"] = round(time.perf_counter() - t1, 4)
+        record["stages"] = {k: round(v, 4) for k, v in timings.seconds.items()}
+    except Exception as e:
+        record.update(status="failed", output="", error=f"{type(e).__name__}: {e}")
+        record["traceback"] = traceback.format_exc()
+        _release_placeholder(out_path)
+    record["total_s"] = round(time.perf_counter() - t0, 4)
+    return record
+
+
+def run_batch(templates: list[str], out_dir: str, workers: int | None = None) -> dict:
+    """Quote every template; returns the run report (see write_report)."""
+    started = datetime.now()
+    t0 = time.perf_counter()
+    _warm_reference_data()
+    warm_s = time.perf_counter() - t0
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or available_cores(), len(templates) or 1))
+
+    jobs: list[tuple[str, str]] = []
+    records: dict[str, dict] = {}
+    try:
+        for template in templates:
+            jobs.append((template, reserve_output_path(out_dir)))
+        if workers == 1:
+            for template, out_path in jobs:
+                records[template] = quote_template(template, out_path)
+                _progress(records[template], len(records), len(jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_warm_reference_data) as pool:
+                futures = {pool.submit(quote_template, template, out_path): (template, out_path) for template, out_path in jobs}
+                for fut in as_completed(futures):
+                    template, out_path = futures[fut]
+                    try:
+                        records[template] = fut.result()
+                    except Exception as e:  # worker died (e.g. out of memory)
+                        _release_placeholder(out_path)
+                        records[template] = {"input": template, "status": "failed", "output": "", "rows": None,
+                                             "load_s": None, "build_s": None, "total_s": None,
+                                             "error": f"{type(e).__name__}: {e}", "stages": {}}
+                    _progress(records[template], len(records), len(jobs))
+    finally:
+        # Jobs that never ran (interrupted run) must not leave empty placeholder outputs behind
+        for template, out_path in jobs:
+            if template not in records:
+                _release_placeholder(out_path)
+
+    files = [records[template] for template, _ in jobs]
+    return {
+        "started": started.isoformat(sep=" ", timespec="seconds"),
+        "finished": datetime.now().isoformat(sep=" ", timespec="seconds"),
+        "wall_s": round(time.perf_counter() - t0, 4),
+        "reference_load_s": round(warm_s, 4),
+        "workers": workers,
+        "output_dir": os.path.abspath(out_dir),
+        "files_total": len(files),
+        "files_ok": sum(1 for r in files if r["status"] == "ok"),
+        "files_failed": sum(1 for r in files if r["status"] != "ok"),
+        "rows_total": sum(r["rows"] or 0 for r in files),
+        "files": files,
+    }
+
+
+def _progress(record: dict, done: int, total: int) -> None:
+    status = record["output"] if record["status"] == "ok" else f"FAILED {record['error']}"
+    print(f"[{done}/{total}] {os.path.basename(record['input'])}: {status}", file=sys.stderr)
+
+
+def write_report(report: dict, out_dir: str, name: str | None = None) -> tuple[str, str]:
+    """Write <name>.json (full report) and <name>.csv (one row per file); returns both paths."""
+    name = name or f"batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    json_path = os.path.join(out_dir, f"{name}.json")
+    csv_path = os.path.join(out_dir, f"{name}.csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(report["files"])
+    return json_path, csv_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quote many Quotation Template _INPUT workbooks in parallel")
+    ap.add_argument("inputs", nargs="+", help="template files, directories or glob patterns")
+    ap.add_argument("--out", help="output directory (default: directory of the first template)")
+    ap.add_argument("--workers", type=int, help="worker processes (default: available cores)")
+    ap.add_argument("--report", help="report file name without extension (default: batch_report_<timestamp>)")
+    args = ap.parse_args()
+
+    templates = collect_templates(args.inputs)
+    if not templates:
+        sys.exit("No templates found")
+    out_dir = args.out or os.path.dirname(templates[0])
+    report = run_batch(templates, out_dir, workers=args.workers)
+    json_path, csv_path = write_report(report, out_dir, args.report)
+    print(f"{report['files_ok']}/{report['files_total']} quoted in {report['wall_s']:.1f}s "
+          f"({report['workers']} workers). Report: {json_path} | {csv_path}")
+    if report["files_failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Per-country city indexes over CITY_ZIPS and GEO_LOCATIONS/CITY_COORDS.
+
+build_output used to filter the sheet by country, copy it, canonicalise every city with
+.map(_canon) and rebuild the rapidfuzz choices list for each lookup. CityTable does that
+work once per ReferenceData load and answers the same three questions with the same
+first-row semantics:
+
+  exact(cc, city)      first row whose City.strip().upper() equals city.strip().upper()
+  canonical(cc, city)  first row whose canonical (accent/punctuation-free) City equals canon(city)
+  fuzzy(cc, city, n)   first row of the best token_sort_ratio choice scoring >= n
+
+fuzzy_many() scores a whole batch of unresolved cities against a country in one
+rapidfuzz.process.cdist call and memoises the winners, so later scalar fuzzy() calls for
+those cities are dictionary hits.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz  # type: ignore
+except Exception:  # pragma: no cover
+    rf_process = None
+    rf_fuzz = None
+
+
+def resolve_city_columns(df: pd.DataFrame) -> dict[str, str]:
+    """Country/city/ZIP/lat/lon column names, resolved like the original per-call lookups."""
+    cols = {c.lower().strip(): c for c in df.columns}
+    return {
+        "cc": cols.get("country code") or cols.get("cc") or "Country Code",
+        "city": cols.get("city") or "City",
+        "zip": cols.get("zip") or cols.get("zip code") or cols.get("postal code") or "ZIP",
+        "lat": cols.get("lat") or cols.get("latitude") or "Lat",
+        "lon": cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long",
+    }
+
+
+class _Country:
+    __slots__ = ("exact", "canon", "choices", "by_upper")
+
+    def __init__(self, positions: np.ndarray, stripped_u, canon_vals, raw_str, notnull):
+        self.exact: dict[str, int] = {}
+        self.canon: dict[str, int] = {}
+        self.by_upper: dict[str, int] = {}
+        for p in positions.tolist():
+            self.exact.setdefault(stripped_u[p], p)
+            self.canon.setdefault(canon_vals[p], p)
+            self.by_upper.setdefault(raw_str[p].upper(), p)
+        keep = positions[notnull[positions]]
+        self.choices = [raw_str[p] for p in keep.tolist()]
+
+
+class CityTable:
+    """One city sheet indexed per country. Positions refer to rows of the original DataFrame."""
+
+    def __init__(self, df: pd.DataFrame | None, canon):
+        self.df = df
+        self.canon = canon
+        self.cols = resolve_city_columns(df) if df is not None else {}
+        self._countries: dict[str, _Country] = {}
+        self._fuzzy_memo: dict[tuple[str, str], tuple[int | None, float]] = {}
+        self._lock = threading.Lock()
+        self.ok = (
+            df is not None and not df.empty
+            and self.cols["cc"] in df.columns and self.cols["city"] in df.columns
+        )
+        if not self.ok:
+            return
+        city = df[self.cols["city"]]
+        self._raw_str = city.astype(str).tolist()
+        self._stripped_u = city.astype(str).str.strip().str.upper().tolist()
+        self._notnull = city.notna().values
+        self._cc_vals = df[self.cols["cc"]].astype(str).str.upper().values
+        self._canon_vals = None
+
+    def _country(self, cc: str) -> _Country:
+        cc_u = (cc or "").strip().upper()
+        entry = self._countries.get(cc_u)
+        if entry is None:
+            with self._lock:
+                if self._canon_vals is None:
+                    self._canon_vals = [self.canon(v) for v in self._raw_str]
+                entry = _Country(
+                    np.flatnonzero(self._cc_vals == cc_u), self._stripped_u, self._canon_vals,
+                    self._raw_str, self._notnull,
+                )
+                self._countries[cc_u] = entry
+        return entry
+
+    def value(self, pos: int | None, key: str):
+        """Cell of the given logical column ('zip', 'lat', 'lon') at pos (None if missing)."""
+        if pos is None:
+            return None
+        col = self.cols.get(key)
+        if col not in self.df.columns:
+            return None
+        return self.df[col].iat[pos]
+
+    def exact(self, cc: str, city: str | None) -> int | None:
+        return self._country(cc).exact.get((city or "").strip().upper())
+
+    def canonical(self, cc: str, city: str | None) -> int | None:
+        return self._country(cc).canon.get(self.canon(city))
+
+    def _best(self, entry: _Country, query: str) -> tuple[int | None, float]:
+        """(row of the best choice, score) with no cutoff; first choice wins ties."""
+        if not entry.choices or not query:
+            return None, 0.0
+        if rf_process is not None and rf_fuzz is not None:
+            try:
+                res = rf_process.extractOne(query, entry.choices, scorer=rf_fuzz.token_sort_ratio)
+                if res is None:
+                    return None, 0.0
+                return entry.by_upper.get(str(res[0]).upper()), float(res[1])
+            except Exception:
+                pass
+        # fallback exact canon match
+        qn = self.canon(query)
+        for c in entry.choices:
+            if self.canon(c) == qn:
+                return entry.by_upper.get(str(c).upper()), 100.0
+        return None, 0.0
+
+    def fuzzy(self, cc: str, city: str | None, score_cutoff: int) -> int | None:
+        """Row of the best fuzzy choice scoring >= score_cutoff, None otherwise."""
+        cc_u = (cc or "").strip().upper()
+        key = (cc_u, city or "")
+        hit = self._fuzzy_memo.get(key)
+        if hit is None:
+            hit = self._best(self._country(cc_u), city or "")
+            self._fuzzy_memo[key] = hit
+        pos, score = hit
+        return pos if pos is not None and score >= score_cutoff else None
+
+    def fuzzy_many(self, cc: str, cities: list[str]) -> None:
+        """Score every not-yet-resolved city of cc against the country's choices in one call."""
+        cc_u = (cc or "").strip().upper()
+        entry = self._country(cc_u)
+        todo = sorted({c for c in cities if c and (cc_u, c) not in self._fuzzy_memo
+                       and self.exact(cc_u, c) is None and self.canonical(cc_u, c) is None})
+        if not todo or not entry.choices or rf_process is None or rf_fuzz is None:
+            return
+        try:
+            scores = rf_process.cdist(todo, entry.choices, scorer=rf_fuzz.token_sort_ratio,
+                                     dtype=np.float64, workers=-1)
+        except Exception:
+            return
+        best = scores.argmax(axis=1)
+        for query, j, row in zip(todo, best.tolist(), scores):
+            score = float(row[j])
+            pos = entry.by_upper.get(entry.choices[j].upper()) if score > 0 else None
+            self._fuzzy_memo[(cc_u, query)] = (pos, score)
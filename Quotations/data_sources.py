@@ -1,6 +1,11 @@
 import os
 import pandas as pd
 
+try:
+    from .snapshot import read_excel  # type: ignore
+except ImportError:
+    from Quotations.snapshot import read_excel  # type: ignore
+
 
 def _assert_file(path: str):
     if not os.path.exists(path):
@@ -9,27 +14,27 @@ def _assert_file(path: str):
 
 def load_main_ports(path: str) -> pd.DataFrame:
     _assert_file(path)
-    return pd.read_excel(path, sheet_name="MAIN PORTS")
+    return read_excel(path, sheet_name="MAIN PORTS")
 
 
 def load_transit_time(path: str) -> pd.DataFrame:
     _assert_file(path)
-    return pd.read_excel(path, sheet_name="TRANSITTIME")
+    return read_excel(path, sheet_name="TRANSITTIME")
 
 
 def load_horse_puerto(path: str) -> pd.DataFrame:
     _assert_file(path)
-    return pd.read_excel(path, sheet_name="HORSE-PUERTO")
+    return read_excel(path, sheet_name="HORSE-PUERTO")
 
 
 def load_cost_per_km(path: str) -> pd.DataFrame:
     _assert_file(path)
-    return pd.read_excel(path, sheet_name="COSTPERKM")
+    return read_excel(path, sheet_name="COSTPERKM")
 
 
 def load_packaging(path: str) -> pd.DataFrame:
     _assert_file(path)
-    return pd.read_excel(path, sheet_name="PACKAGING")
+    return read_excel(path, sheet_name="PACKAGING")
 
 
 def map_factory_to_port(df_hp: pd.DataFrame, factory_name: str):
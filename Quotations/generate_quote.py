@@ -4,8 +4,9 @@ import sys
 import unicodedata
 from datetime import datetime
 from functools import lru_cache
+import numpy as np
 import pandas as pd
-from typing import Iterable, Optional, Tuple
+from typing import IO, Iterable, Optional, Tuple
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import PatternFill
@@ -18,35 +19,55 @@ except Exception:
 
 # Support running as a script
 try:
-    from .qtool_loader import load_input_template  # type: ignore
+    from .qtool_loader import excel_source, load_input_template  # type: ignore
     from .qtool_loader import STD_COLS  # type: ignore
     from .data_sources import (
-        load_main_ports, load_transit_time, load_horse_puerto, load_cost_per_km,
         map_factory_to_port, find_port_by_country,
     )
     from .rules import flow_by_incoterm
+    from .reference_data import data_stamps, load_reference_data
+    from .lookup_index import build_lookup_indexes, cell_value, normalize_zip_token
+    from .geocode_store import ONLINE_TTL_SECONDS, open_geocode_store, version_tag
+    from .result_store import open_result_store, result_cache_enabled, result_version, row_keys
+    from .port_index import PortIndex
+    from .main_ports_schema import compile_main_ports_schema
+    from .city_index import CityTable
+    from .profiling import stage_clock
+    from .sheet_format import column_widths, set_column_widths, shared_style, styled_cell
+    from Packaging.container_fill import DIMENSIONES_OPERATIVAS, PESOS_MAXIMOS, fill_arrays
+    from Packaging.guillotine import fill_guillotine
     # Prefer local module name 'Distances' (Windows FS retains this casing)
     try:
-        from .Distances import GeoIndex, resolve_point, road_km_between  # type: ignore
+        from .Distances import GEO_FILE_NAME, ROAD_FACTOR, GeoIndex, resolve_point, road_km_between, road_km_many  # type: ignore
     except Exception:
-        from .distances import GeoIndex, resolve_point, road_km_between  # type: ignore
+        from .distances import GEO_FILE_NAME, ROAD_FACTOR, GeoIndex, resolve_point, road_km_between, road_km_many  # type: ignore
     try:
         from .geo_online import geocode_city_online_if_allowed  # type: ignore
     except Exception:
         geocode_city_online_if_allowed = None  # type: ignore
 except Exception:
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from Quotations.qtool_loader import load_input_template  # type: ignore
+    from Quotations.qtool_loader import excel_source, load_input_template  # type: ignore
     from Quotations.qtool_loader import STD_COLS  # type: ignore
     from Quotations.data_sources import (
-        load_main_ports, load_transit_time, load_horse_puerto, load_cost_per_km,
         map_factory_to_port, find_port_by_country,
     )
     from Quotations.rules import flow_by_incoterm  # type: ignore
+    from Quotations.reference_data import data_stamps, load_reference_data  # type: ignore
+    from Quotations.lookup_index import build_lookup_indexes, cell_value, normalize_zip_token  # type: ignore
+    from Quotations.geocode_store import ONLINE_TTL_SECONDS, open_geocode_store, version_tag  # type: ignore
+    from Quotations.result_store import open_result_store, result_cache_enabled, result_version, row_keys  # type: ignore
+    from Quotations.port_index import PortIndex  # type: ignore
+    from Quotations.main_ports_schema import compile_main_ports_schema  # type: ignore
+    from Quotations.city_index import CityTable  # type: ignore
+    from Quotations.profiling import stage_clock  # type: ignore
+    from Quotations.sheet_format import column_widths, set_column_widths, shared_style, styled_cell  # type: ignore
+    from Packaging.container_fill import DIMENSIONES_OPERATIVAS, PESOS_MAXIMOS, fill_arrays  # type: ignore
+    from Packaging.guillotine import fill_guillotine  # type: ignore
     try:
-        from Quotations.Distances import GeoIndex, resolve_point, road_km_between  # type: ignore
+        from Quotations.Distances import GEO_FILE_NAME, ROAD_FACTOR, GeoIndex, resolve_point, road_km_between, road_km_many  # type: ignore
     except Exception:
-        from Quotations.distances import GeoIndex, resolve_point, road_km_between  # type: ignore
+        from Quotations.distances import GEO_FILE_NAME, ROAD_FACTOR, GeoIndex, resolve_point, road_km_between, road_km_many  # type: ignore
     try:
         from Quotations.geo_online import geocode_city_online_if_allowed  # type: ignore
     except Exception:
@@ -55,10 +76,14 @@ except Exception:
 
 QTOOL_DIR = r"C:\Users\OLMEDOJorge\OneDrive - Horse\Exchange VRAC\02_Engineering Department\08. New tools & technologies\QTool"
 INPUT_FILE = os.path.join(QTOOL_DIR, "upload_Quotation Template.xlsx")
+# Explicit QUOTATION TOOL DATA workbook (takes precedence over the QTOOL_DIR search when set)
+QTOOL_DATA_FILE: str | None = None
 OUTPUT_PREFIX = "Horse_TPTQuotation"
 OUTPUT_EXT = ".xlsx"
 DEFAULT_INCOTERM = os.environ.get("QINCOTERM", "FCA")
 OUTPUT_AUTHOR = "MyQuotes_TPT_ENG"
+# Yearly cost of the stock in transit, charged per part over the transit time
+FLOATING_STOCK_RATE = 0.08
 
 
 def _canon_cn_location_key(text: str | None) -> str:
@@ -177,23 +202,35 @@ def _lookup_cn_locations_city_coords(city: str | None) -> tuple[float | None, fl
     return coords
 
 
+def _data_stamps(ref) -> tuple:
+    return data_stamps(ref.version, os.path.join(QTOOL_DIR, GEO_FILE_NAME))
+
+
+def geo_data_version(ref) -> str:
+    """Version offline geocode results are stored under (workbook, VTT DATA and GEO_LOCATIONS.xlsx stamps)."""
+    return version_tag(*_data_stamps(ref))
+
+
 def find_qtool_data_file() -> str | None:
     """Find the QUOTATION TOOL DATA Excel in QTOOL_DIR."""
-    # 0) Prefer repository-bundled file (works in Streamlit Cloud / GitHub deploy)
+    # 0) Explicit workbook set by the caller (the app references its database in place)
+    if QTOOL_DATA_FILE and os.path.exists(QTOOL_DATA_FILE):
+        return QTOOL_DATA_FILE
+    # 1) Prefer repository-bundled file (works in Streamlit Cloud / GitHub deploy)
     try:
         repo_local = os.path.join(os.path.dirname(__file__), "QUOTATION TOOL DATA.xlsx")
         if os.path.exists(repo_local):
             return repo_local
     except Exception:
         pass
-    # 1) Prefer exact canonical filename if present
+    # 2) Prefer exact canonical filename if present
     try:
         exact = os.path.join(QTOOL_DIR, "QUOTATION TOOL DATA.xlsx")
         if os.path.exists(exact):
             return exact
     except Exception:
         pass
-    # 2) Otherwise, pick the latest file that starts with that name
+    # 3) Otherwise, pick the latest file that starts with that name
     candidates = []
     try:
         for name in os.listdir(QTOOL_DIR):
@@ -240,6 +277,21 @@ def next_output_path(directory: str) -> str:
     return os.path.join(directory, f"{OUTPUT_PREFIX}_{date_tag}_{next_n}{OUTPUT_EXT}")
 
 
+def reserve_output_path(directory: str) -> str:
+    """next_output_path() claimed atomically: creates an empty placeholder file with O_EXCL.
+
+    Concurrent writers (batch workers, several app sessions) never get the same number; the
+    caller overwrites the placeholder with the workbook or removes it on failure.
+    """
+    while True:
+        path = next_output_path(directory)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            continue
+
+
 def _find_reference_output_file() -> str | None:
     """Return a path to a reference 'download_quotation-output*.xlsx' in QTOOL_DIR, preferring non-numbered name."""
     exact = os.path.join(QTOOL_DIR, "download_quotation-output.xlsx")
@@ -276,13 +328,57 @@ def _load_reference_quote_columns() -> list[str] | None:
         return None
 
 
-def _load_output_workbook(source_workbook_path: str | None) -> Workbook:
-    if source_workbook_path and os.path.exists(source_workbook_path):
-        return load_workbook(source_workbook_path, data_only=False)
-    wb = Workbook()
-    default_ws = wb.active
-    wb.remove(default_ws)
-    return wb
+def _packaging_fill_lookup(df_packaging: pd.DataFrame, transport_dims: dict) -> dict:
+    """{(flow, l, w, h): UC por volumen} para cada dimensión distinta de PACKAGING (fill_arrays vectorizado).
+
+    Solo entran las dimensiones cuyo layout ya llena la cota de superficie (L·W // l·w por capa):
+    ahí la guillotina no puede mejorar y el valor es definitivo. Las demás las añade
+    calc_pack_per_container con fill_guillotine() la primera vez que se cotizan.
+    """
+    if df_packaging is None or df_packaging.empty:
+        return {}
+    dims = pd.DataFrame({
+        "l": pd.to_numeric(df_packaging.get("Lenght (mm)"), errors="coerce"),
+        "w": pd.to_numeric(df_packaging.get("Width (mm)"), errors="coerce"),
+        "h": pd.to_numeric(df_packaging.get("Height (mm)"), errors="coerce"),
+    }).dropna().drop_duplicates()
+    l, w, h = dims["l"].values, dims["w"].values, dims["h"].values
+    lookup = {}
+    for flow, container in transport_dims.items():
+        counts, layers, _ = fill_arrays(l, w, h, container)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bound = np.floor_divide(float(container[0]) * float(container[1]), l * w)
+        final = (layers <= 0) | (counts >= np.where(l * w > 0, bound, 0) * layers)
+        keys = zip([flow] * int(final.sum()), l[final].tolist(), w[final].tolist(), h[final].tolist())
+        lookup.update(zip(keys, counts[final].tolist()))
+    return lookup
+
+
+def quantity_columns(unit_cost_eur, transit_time_days, plant_to_plant_eur_part, annual_needs, daily_need) -> dict:
+    """Quantity-dependent Quote columns, rounded as in the Quote sheet (Series or scalars).
+
+    transit_time_days is the unrounded transit time; plant_to_plant_eur_part the rounded
+    'Plant to plant (€/part)'. Shared by build_output and quote_lane().
+    """
+    unit_cost_out = np.round(unit_cost_eur, 2)
+    floating = np.round(unit_cost_eur * FLOATING_STOCK_RATE / 365 * transit_time_days, 2)
+    total_part = np.round(unit_cost_out + plant_to_plant_eur_part + floating, 2)
+    return {
+        "Floating Stock €/Part": floating,
+        "PA + LOG + SF TOTAL €/Part": total_part,
+        "Annual weight K€": np.round(annual_needs * total_part / 1000, 2),
+        "FCF Pipe K€": np.round(daily_need * unit_cost_out * transit_time_days / 1000, 2),
+    }
+
+
+def _load_output_workbook(source_workbook: str | IO[bytes] | bytes | None) -> Workbook:
+    """Uploaded workbook (path or in-memory, edited in place) or a new write-only workbook streamed on save."""
+    if isinstance(source_workbook, str):
+        if os.path.exists(source_workbook):
+            return load_workbook(source_workbook, data_only=False)
+    elif source_workbook is not None:
+        return load_workbook(excel_source(source_workbook), data_only=False)
+    return Workbook(write_only=True)
 
 
 def _write_dataframe_to_sheet(ws, df: pd.DataFrame):
@@ -331,7 +427,7 @@ def _quote_formula_map(header_to_idx: dict[str, int], row_idx: int) -> dict[str,
     if part_vol and plant_to_plant_m3:
         formulas["Plant to plant (€/part)"] = f'=IFERROR({part_vol}*{plant_to_plant_m3},"")'
     if unit_cost and transit_time:
-        formulas["Floating Stock €/Part"] = f'=IFERROR({unit_cost}*0.08/365*{transit_time},"")'
+        formulas["Floating Stock €/Part"] = f'=IFERROR({unit_cost}*{FLOATING_STOCK_RATE:g}/365*{transit_time},"")'
     if unit_cost and plant_to_plant_part and floating_stock:
         formulas["PA + LOG + SF TOTAL €/Part"] = f'=IFERROR({unit_cost}+{plant_to_plant_part}+{floating_stock},"")'
     if annual_needs and header_to_idx.get("PA + LOG + SF TOTAL €/Part"):
@@ -344,64 +440,98 @@ def _quote_formula_map(header_to_idx: dict[str, int], row_idx: int) -> dict[str,
     return formulas
 
 
-def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: str | None = None) -> pd.DataFrame:
-    # Load data sources
-    data_file = find_qtool_data_file()
-    if not data_file:
-        raise FileNotFoundError("QUOTATION TOOL DATA file not found in QTool directory")
-    try:
-        df_mp = load_main_ports(data_file)
-        try:
-            df_tt = load_transit_time(data_file)
-        except Exception:
-            df_tt = pd.DataFrame()
-        df_hp = load_horse_puerto(data_file)
-        df_cpkm = load_cost_per_km(data_file)
-        # Optional ports locations sheet (coordinates for POL/POD)
-        try:
-            df_ports = pd.read_excel(data_file, sheet_name="Ports Locations")
-        except Exception:
-            df_ports = pd.DataFrame()
-        # Optional ZIP coordinates sheet (ZIP -> Lat/Lon)
-        try:
-            try:
-                df_zip_coords = pd.read_excel(data_file, sheet_name="ZIP_COORDS")
-            except Exception:
-                df_zip_coords = pd.read_excel(data_file, sheet_name="ZIP_COORDINATES")
-        except Exception:
-            df_zip_coords = pd.DataFrame()
-        # Optional city→ZIP mapping sheet (database-managed)
-        try:
-            df_city_zips = pd.read_excel(data_file, sheet_name="CITY_ZIPS")
-        except Exception:
-            df_city_zips = pd.DataFrame()
-        # Optional city coordinates sheet (database-managed)
-        try:
-            # Accept either GEO_LOCATIONS or CITY_COORDS sheet name
-            try:
-                df_geo_cities = pd.read_excel(data_file, sheet_name="GEO_LOCATIONS")
-            except Exception:
-                df_geo_cities = pd.read_excel(data_file, sheet_name="CITY_COORDS")
-        except Exception:
-            df_geo_cities = pd.DataFrame()
-        # Optional city alias mapping sheet (database-managed)
-        try:
-            df_city_aliases = pd.read_excel(data_file, sheet_name="CITY_ALIASES")
-        except Exception:
-            df_city_aliases = pd.DataFrame()
-        # Packaging codes reference sheet
-        try:
-            df_packaging = pd.read_excel(data_file, sheet_name="PACKAGING")
-        except Exception:
-            df_packaging = pd.DataFrame()
-        # Optional VTT table used by VTT2.py for POL/POD transit time lookups
-        try:
-            vtt_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "VTT Tool", "VTT DATA.xlsx")
-            df_vtt_routes = pd.read_excel(vtt_data_path)
-        except Exception:
-            df_vtt_routes = pd.DataFrame()
-    except PermissionError as e:
-        raise PermissionError(f"No se pudo leer QUOTATION TOOL DATA (bloqueado/abierto): {data_file}") from e
+# Quote columns forced to 2-decimal display ("Part volume(m3/part)" gets 4)
+QUOTE_TWO_DEC_COLS = (
+    "Leg1/POL Distance (km)",
+    "LEG3/POD Distance (km)",
+    "Transit Time",
+    "Leg1 Inland Cost (€)",
+    "Leg2 Overseas Cost (€)",
+    "Leg 3 Inland Cost (€)",
+    "Total Transportation Cost (€)",
+    "Packaging Volume (m³)",
+    "SNP_Pack",
+    "pack/cont 40ft",
+    "vol/cont 40ft (m3)",
+    "weight/cont 40ft (kg)",
+    "Plant to plant (€/m3)",
+    "Plant to plant (€/part)",
+    "Floating Stock €/Part",
+    "PA + LOG + SF TOTAL €/Part",
+    "Annual weight K€",
+    "FCF Pipe K€",
+    "Weight/part (kg)",
+    "Weight empty pack (kg)",
+    "Weight full pack (kg)",
+)
+QUOTE_FOUR_DEC_COLS = ("Part volume(m3/part)",)
+QUOTE_HEADER_FILL = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+# Columns B..AL are auto-sized: width = clamp(longest text + 2, 12, 45)
+QUOTE_WIDTH_COLS = range(2, 39)
+QUOTE_MIN_WIDTH = 12
+QUOTE_MAX_WIDTH = 45
+
+# Placeholder for the row number in the precompiled formula templates
+_ROW_TOKEN = "\x00"
+
+
+def _quote_formula_templates(header_to_idx: dict[str, int]) -> list[tuple[int, str]]:
+    """(column, formula with _ROW_TOKEN) pairs; _quote_formula_map evaluated once per sheet."""
+    out = []
+    for header, formula in _quote_formula_map(header_to_idx, _ROW_TOKEN).items():
+        col_idx = header_to_idx.get(header)
+        if col_idx:
+            out.append((col_idx, formula))
+    return out
+
+
+def _write_quote_sheet(ws, df: pd.DataFrame) -> None:
+    """Write the Quote sheet in one streaming pass.
+
+    Widths, header fill, formulas and number formats are resolved per column up front, so each
+    row is appended once and never revisited (works for write-only and regular worksheets).
+    """
+    header_to_idx = {str(c): i + 1 for i, c in enumerate(df.columns)}
+    formulas = _quote_formula_templates(header_to_idx)
+    # Every row gets the same formula, so the last row number gives the longest text
+    formula_lengths = {c: len(f.replace(_ROW_TOKEN, str(len(df) + 1))) if len(df) else 0 for c, f in formulas}
+    set_column_widths(ws, column_widths(df, QUOTE_WIDTH_COLS, QUOTE_MIN_WIDTH, QUOTE_MAX_WIDTH,
+                                        fixed_lengths=formula_lengths))
+
+    # One registered style per number format, shared by every cell of its columns
+    styles = {}
+    for fmt, headers in (("0.00", QUOTE_TWO_DEC_COLS), ("0.0000", QUOTE_FOUR_DEC_COLS)):
+        style = shared_style(ws, number_format=fmt)
+        for h in headers:
+            if header_to_idx.get(h):
+                styles[header_to_idx[h]] = style
+
+    rows = dataframe_to_rows(df, index=False, header=True)
+    header_style = shared_style(ws, fill=QUOTE_HEADER_FILL)
+    ws.append([styled_cell(ws, 1, i, v, header_style) for i, v in enumerate(next(rows), start=1)])
+
+    for row_idx, row in enumerate(rows, start=2):
+        token = str(row_idx)
+        for col_idx, formula in formulas:
+            row[col_idx - 1] = formula.replace(_ROW_TOKEN, token)
+        for col_idx, style in styles.items():
+            row[col_idx - 1] = styled_cell(ws, row_idx, col_idx, row[col_idx - 1], style)
+        ws.append(row)
+
+
+def _quote_frame(input_df: pd.DataFrame, data_file: str, ref, ref_cols: list[str] | None, clock) -> tuple[pd.DataFrame, dict]:
+    """Quote sheet rows for input_df (no workbook) plus the route memo stats for the Summary."""
+    df_mp = ref.main_ports
+    df_tt = ref.transit_time
+    df_hp = ref.horse_puerto
+    df_cpkm = ref.cost_per_km
+    df_ports = ref.ports_locations
+    df_zip_coords = ref.zip_coords
+    df_city_zips = ref.city_zips
+    df_geo_cities = ref.geo_cities
+    df_city_aliases = ref.city_aliases
+    df_packaging = ref.packaging
+    df_vtt_routes = ref.vtt_routes
 
     # Default packaging code when input is missing or not found in PACKAGING sheet
     DEFAULT_PACKAGING_CODE = "CAR-S*2466"
@@ -413,13 +543,12 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             return DEFAULT_PACKAGING_CODE
         if df_packaging is None or df_packaging.empty:
             return code
-        valid_codes = df_packaging["Packaging Code"].astype(str).str.strip()
-        if code in valid_codes.values:
+        if code in indexes.packaging_codes:
             return code
         # Case-insensitive match
-        match = valid_codes[valid_codes.str.upper() == code.upper()]
-        if not match.empty:
-            return str(match.iloc[0])
+        match = indexes.packaging_code_canonical.get(code.upper())
+        if match is not None:
+            return match
         # Not found in database -> use default
         return DEFAULT_PACKAGING_CODE
 
@@ -447,27 +576,29 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             pn_u = str(pn or "").strip().upper()
             raw_pc_u = str(raw_pack_code or "").strip().upper()
             res_pc_u = str(resolved_pack_code or "").strip().upper()
-            ref_col = df_packaging["Reference"].astype(str).str.strip().str.upper()
-            pcode_col = df_packaging["Packaging Code"].astype(str).str.strip().str.upper()
+            by_ref = indexes.packaging_by_reference
+            by_code = indexes.packaging_by_code
+            if by_ref is None or by_code is None:
+                return result
 
             row = None
             # 1) Priority for Weight/part and base packaging data: match by Reference (PN)
-            m_ref = df_packaging[ref_col == pn_u]
-            if not m_ref.empty:
-                row = m_ref.iloc[0]
+            pos = by_ref.get(pn_u)
+            if pos is not None:
+                row = df_packaging.iloc[pos]
                 result["pkg_debug"] = "Packaging: Weight/part por Reference (PN)"
             else:
                 # 2) Try input packaging code
                 if raw_pc_u and raw_pc_u not in ("NAN", "NONE", "NULL", "-"):
-                    m_raw = df_packaging[pcode_col == raw_pc_u]
-                    if not m_raw.empty:
-                        row = m_raw.iloc[0]
+                    pos = by_code.get(raw_pc_u)
+                    if pos is not None:
+                        row = df_packaging.iloc[pos]
                         result["pkg_debug"] = "Packaging: Weight/part por Packaging Code input"
                 # 3) If input code does not match, use resolved/default packaging code
                 if row is None and res_pc_u:
-                    m_res = df_packaging[pcode_col == res_pc_u]
-                    if not m_res.empty:
-                        row = m_res.iloc[0]
+                    pos = by_code.get(res_pc_u)
+                    if pos is not None:
+                        row = df_packaging.iloc[pos]
                         if raw_pc_u and raw_pc_u != res_pc_u:
                             result["pkg_debug"] = "Packaging: sin match input; usando Packaging Code default"
                         else:
@@ -497,54 +628,21 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             pass
         return result
 
-    # Empaquetado por tipo de transporte (lógica basada en Empower3D, sin stackability manual)
+    # Empaquetado por tipo de transporte (motor común con Empower3D, sin stackability manual)
     TRANSPORT_OPERATIVE_DIMS = {
-        "OVERSEAS": (12032, 2352, 2550),      # Container 40 HC
-        "INLAND": (13620, 2480, 2900),        # Mega Trailer 90m3
+        "OVERSEAS": DIMENSIONES_OPERATIVAS["Container 40 HC"],
+        "INLAND": DIMENSIONES_OPERATIVAS["Mega Trailer 90m3"],
     }
     TRANSPORT_MAX_WEIGHT = {
-        "OVERSEAS": 24750.0,                  # kg
-        "INLAND": 25000.0,                    # kg
+        "OVERSEAS": float(PESOS_MAXIMOS["Container 40 HC"]),      # kg
+        "INLAND": float(PESOS_MAXIMOS["Mega Trailer 90m3"]),      # kg
     }
 
-    def _max_packs_by_volume(container_dim: tuple[int, int, int], box_dim: tuple[float, float, float]) -> int:
-        """Best-fit quantity by volume using two planar rotations, unlimited stack up to container height."""
-        Lc, Wc, Hc = container_dim
-        l1, w1, h = box_dim
-        if l1 <= 0 or w1 <= 0 or h <= 0:
-            return 0
-        l2, w2 = w1, l1
-        nh = int(Hc // h)
-        if nh <= 0:
-            return 0
-
-        # Option 1: main orientation (l1, w1)
-        nl1 = int(Lc // l1)
-        nw1 = int(Wc // w1)
-        sw = Wc - (nw1 * w1)
-        sl = Lc - (nl1 * l1)
-        nl2 = nl1
-        nw2 = int(sw // w2) if sw >= w2 else 0
-        nl3 = int(sl // l2) if sl >= l2 else 0
-        nw3 = nw1
-        nl4 = int(sl // l2) if sl >= l2 else 0
-        nw4 = int(sw // w2) if sw >= w2 else 0
-        total1 = (nl1 * nw1 + nl2 * nw2 + nl3 * nw3 + nl4 * nw4) * nh
-
-        # Option 2: swapped main orientation (w1, l1)
-        nl1b = int(Lc // w1)
-        nw1b = int(Wc // l1)
-        swb = Wc - (nw1b * l1)
-        slb = Lc - (nl1b * w1)
-        nl2b = nl1b
-        nw2b = int(swb // w2) if swb >= w2 else 0
-        nl3b = int(slb // l2) if slb >= l2 else 0
-        nw3b = nw1b
-        nl4b = int(slb // l2) if slb >= l2 else 0
-        nw4b = int(swb // w2) if swb >= w2 else 0
-        total2 = (nl1b * nw1b + nl2b * nw2b + nl3b * nw3b + nl4b * nw4b) * nh
-
-        return int(max(total1, total2))
+    # UC por contenedor de todo el catálogo PACKAGING, calculado una vez por carga de datos
+    pack_fill_lookup = ref.derived(
+        ("pack_fill_table", tuple(sorted(TRANSPORT_OPERATIVE_DIMS.items()))),
+        lambda: _packaging_fill_lookup(df_packaging, TRANSPORT_OPERATIVE_DIMS),
+    )
 
     def calc_pack_per_container(flow_type: str, pkg: dict) -> int | None:
         flow_u = str(flow_type or "").strip().upper()
@@ -555,7 +653,12 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         h = pkg.get("pkg_height_mm")
         if l is None or w is None or h is None:
             return None
-        by_volume = _max_packs_by_volume(TRANSPORT_OPERATIVE_DIMS[flow_u], (float(l), float(w), float(h)))
+        key = (flow_u, float(l), float(w), float(h))
+        by_volume = pack_fill_lookup.get(key)
+        if by_volume is None:
+            # Layout en guillotina (sin límite de tiempo: determinista); queda en la tabla de esta carga de datos
+            by_volume = fill_guillotine(TRANSPORT_OPERATIVE_DIMS[flow_u], (l, w, h), time_budget=None).by_volume
+            pack_fill_lookup[key] = by_volume
         if by_volume <= 0:
             return 0
         wf = pkg.get("pkg_weight_full")
@@ -664,166 +767,22 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         "CN": {"POL": ["CNSHA"]},
     }
 
-    def _find_country_cols():
-        """Detect country columns in MAIN PORTS for POL/POD sides.
-        1) Name-based heuristic.
-        2) Later refined using UN/LOC country prefix match vs POL/POD columns (if resolvable).
-        Returns (pol_country_col, pod_country_col) or (None, None) if not found.
-        """
-        cols = [str(c) for c in df_mp.columns]
-        lc = [c.lower().strip() for c in cols]
-        pol_cc = None
-        pod_cc = None
-        patterns_pol = [
-            "pol country code", "pol country", "origin country code", "origin country",
-            "origin country (code)", "origin cc", "pol cc"
-        ]
-        patterns_pod = [
-            "pod country code", "pod country", "destination country code", "destination country",
-            "destination country (code)", "destination cc", "pod cc"
-        ]
-        for i, name in enumerate(lc):
-            if name in patterns_pol and pol_cc is None:
-                pol_cc = cols[i]
-            if name in patterns_pod and pod_cc is None:
-                pod_cc = cols[i]
-        if pol_cc is None:
-            for i, name in enumerate(lc):
-                if ("pol" in name or "origin" in name) and ("country" in name or "code" in name or name.endswith(" cc") or " cc" in name):
-                    pol_cc = cols[i]
-                    break
-        if pod_cc is None:
-            for i, name in enumerate(lc):
-                if ("pod" in name or "destination" in name) and ("country" in name or "code" in name or name.endswith(" cc") or " cc" in name):
-                    pod_cc = cols[i]
-                    break
-        return pol_cc, pod_cc
-
-    pol_cc_col, pod_cc_col = _find_country_cols()
-
-    # Country cell comparator using only MAIN PORTS values (no HORSE-PUERTO)
+    # MAIN PORTS / TRANSITTIME layout (POL/POD, country, rate and TT columns) and normalised
+    # POL/POD country codes, detected once per data load
+    mp_schema = ref.derived(("main_ports_schema",), lambda: compile_main_ports_schema(df_mp, df_tt))
+    pol_cc_col, pod_cc_col = mp_schema.pol_cc_col, mp_schema.pod_cc_col
+    pol_col_mp, pod_col_mp = mp_schema.pol_col_mp, mp_schema.pod_col_mp
+    pol_col_tt, pod_col_tt = mp_schema.pol_col_tt, mp_schema.pod_col_tt
+
+    # Country targets are normalised like the MAIN PORTS cells in mp_schema (no HORSE-PUERTO)
     def _normalize(s):
         return str(s).strip().upper() if s is not None and str(s).strip() != "" else ""
 
-    def _country_matches_any(cell_val: str, targets: set[str]) -> bool:
-        if not cell_val or not targets:
-            return False
-        v = _normalize(cell_val)
-        if not v:
-            return False
-        return v in targets
-
-    # Resolve actual POL/POD column names in MAIN PORTS and TRANSITTIME
-    def _resolve_port_cols(df: pd.DataFrame) -> tuple[str | None, str | None]:
-        candidates_pol = ["POL", "Port of Loading", "Origin Port", "POL CODE", "POL Code"]
-        candidates_pod = ["POD", "Port of Discharge", "Destination Port", "POD CODE", "POD Code"]
-        lcmap = {str(c).lower().strip(): str(c) for c in df.columns}
-        pol_col = None
-        pod_col = None
-        for cand in candidates_pol:
-            k = cand.lower().strip()
-            if k in lcmap:
-                pol_col = lcmap[k]
-                break
-        for cand in candidates_pod:
-            k = cand.lower().strip()
-            if k in lcmap:
-                pod_col = lcmap[k]
-                break
-        # Contains-based fallback
-        if pol_col is None:
-            for c in df.columns:
-                cl = str(c).lower()
-                if ("pol" in cl or "loading" in cl or "origin port" in cl) and ("port" in cl or "code" in cl):
-                    pol_col = str(c)
-                    break
-        if pod_col is None:
-            for c in df.columns:
-                cl = str(c).lower()
-                if ("pod" in cl or "discharge" in cl or "destination port" in cl) and ("port" in cl or "code" in cl):
-                    pod_col = str(c)
-                    break
-        return pol_col, pod_col
-
-    pol_col_mp, pod_col_mp = _resolve_port_cols(df_mp)
-    pol_col_tt, pod_col_tt = _resolve_port_cols(df_tt)
-
-    def _refine_country_cols(pol_cc_guess: str | None, pod_cc_guess: str | None) -> tuple[str | None, str | None]:
-        """Use UN/LOC country prefix from POL/POD codes to assign the most likely country columns.
-        We choose the column where POL's first-2-letter country code matches column value most often (for POL side),
-        and likewise for POD.
-        If scores are zero or ties remain, keep original guesses.
-        """
-        try:
-            if not pol_col_mp or pol_col_mp not in df_mp.columns or not pod_col_mp or pod_col_mp not in df_mp.columns:
-                return pol_cc_guess, pod_cc_guess
-            # Candidate country-like columns
-            cand_cols = []
-            for c in df_mp.columns:
-                cl = str(c).lower()
-                if ("country" in cl or "code" in cl or cl.endswith(" cc") or " cc" in cl):
-                    cand_cols.append(str(c))
-            if not cand_cols:
-                return pol_cc_guess, pod_cc_guess
-            # Sample rows
-            sample = df_mp.dropna(subset=[pol_col_mp, pod_col_mp]).head(500)
-            def cc_from_port(pval: str) -> str:
-                s = str(pval).strip().upper()
-                return s[:2] if len(s) >= 2 else ""
-            pol_scores = {}
-            pod_scores = {}
-            for cc_col in cand_cols:
-                try:
-                    pol_match = 0; pol_total = 0
-                    for _, rr in sample.iterrows():
-                        cc_val = str(rr.get(cc_col, "")).strip().upper()
-                        pol_port = rr.get(pol_col_mp)
-                        if pd.notna(cc_val) and pd.notna(pol_port):
-                            pol_total += 1
-                            if cc_val == cc_from_port(pol_port):
-                                pol_match += 1
-                    pol_scores[cc_col] = (pol_match, pol_total)
-                    pod_match = 0; pod_total = 0
-                    for _, rr in sample.iterrows():
-                        cc_val = str(rr.get(cc_col, "")).strip().upper()
-                        pod_port = rr.get(pod_col_mp)
-                        if pd.notna(cc_val) and pd.notna(pod_port):
-                            pod_total += 1
-                            if cc_val == cc_from_port(pod_port):
-                                pod_match += 1
-                    pod_scores[cc_col] = (pod_match, pod_total)
-                except Exception:
-                    continue
-            def best_col(scores: dict) -> str | None:
-                items = []
-                for k, (m, t) in scores.items():
-                    ratio = (m / t) if t else 0.0
-                    items.append((ratio, m, k))
-                if not items:
-                    return None
-                items.sort(reverse=True)
-                return items[0][2]
-            pol_best = best_col(pol_scores)
-            pod_best = best_col(pod_scores)
-            # If bests are None or zero-ratio, keep guesses
-            def ratio_of(scores, col):
-                if col is None or col not in scores:
-                    return 0.0
-                m, t = scores[col]
-                return (m / t) if t else 0.0
-            if ratio_of(pol_scores, pol_best) == 0.0 and ratio_of(pod_scores, pod_best) == 0.0:
-                return pol_cc_guess, pod_cc_guess
-            # Avoid assigning the same column to both sides if avoidable
-            if pol_best and pod_best and pol_best == pod_best:
-                # pick second best for POD if available
-                sorted_pod = sorted([( (m/t if t else 0.0), m, k) for k,(m,t) in pod_scores.items() ], reverse=True)
-                if len(sorted_pod) > 1:
-                    pod_best = sorted_pod[1][2]
-            return pol_best or pol_cc_guess, pod_best or pod_cc_guess
-        except Exception:
-            return pol_cc_guess, pod_cc_guess
-
-    pol_cc_col, pod_cc_col = _refine_country_cols(pol_cc_col, pod_cc_col)
+    # O(1) lookup indexes (PN, packaging code, country pairs, POL/POD, CC+ZIP), built once per data load
+    indexes = ref.derived(
+        ("lookup_indexes", pol_col_mp, pod_col_mp, pol_col_tt, pod_col_tt),
+        lambda: build_lookup_indexes(ref, pol_col_mp, pod_col_mp, pol_col_tt, pod_col_tt),
+    )
 
     def _port_country_from_hp(port: str) -> str | None:
         try:
@@ -852,9 +811,9 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
 
         # Enforce country on scope using MAIN PORTS columns if available
         if kind.upper() == "POL" and pol_cc_col is not None and pol_cc_col in df_scope.columns:
-            df_scope = df_scope[df_scope[pol_cc_col].apply(lambda v: _country_matches_any(v, {_normalize(cc)}))]
+            df_scope = mp_schema.rows_in(df_scope, "POL", {_normalize(cc)})
         if kind.upper() == "POD" and pod_cc_col is not None and pod_cc_col in df_scope.columns:
-            df_scope = df_scope[df_scope[pod_cc_col].apply(lambda v: _country_matches_any(v, {_normalize(cc)}))]
+            df_scope = mp_schema.rows_in(df_scope, "POD", {_normalize(cc)})
 
         # Collect candidate ports from scope
         scope_ports = df_scope[col].dropna().astype(str).str.strip().tolist() if col in df_scope.columns else []
@@ -884,7 +843,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             try:
                 scored_dist = []
                 for p in valid:
-                    plat, plon, _ = resolve_point(geo, cc, port=p)
+                    plat, plon, _ = _resolve_point(geo, cc, port=p)
                     if plat is not None:
                         km = road_km_between((plat, plon), near_point)
                         scored_dist.append((km, p))
@@ -911,7 +870,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         if f_lat is not None and f_lon is not None:
             b_lat, b_lon, _ = _best_port_coords_for_origin(origin_point, f_lat, f_lon)
             return b_lat, b_lon
-        plat, plon, _ = resolve_point(geo, cc, port=port)
+        plat, plon, _ = _resolve_point(geo, cc, port=port)
         return (plat, plon)
 
     def select_pol_pod_pair(oc: str, dc: str, origin_point: tuple[float, float] | None, oc_name: str | None = None, dc_name: str | None = None) -> tuple[str, str, str]:
@@ -937,10 +896,10 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         # Apply country filters when columns exist
         if pol_cc_col is not None and pol_cc_col in df_scope.columns:
             oc_targets = {_normalize(oc), _normalize(oc_name)} if oc_name else {_normalize(oc)}
-            df_scope = df_scope[df_scope[pol_cc_col].apply(lambda v: _country_matches_any(v, oc_targets))]
+            df_scope = mp_schema.rows_in(df_scope, "POL", oc_targets)
         if pod_cc_col is not None and pod_cc_col in df_scope.columns:
             dc_targets = {_normalize(dc), _normalize(dc_name)} if dc_name else {_normalize(dc)}
-            df_scope = df_scope[df_scope[pod_cc_col].apply(lambda v: _country_matches_any(v, dc_targets))]
+            df_scope = mp_schema.rows_in(df_scope, "POD", dc_targets)
         # Drop rows without POL/POD
         if (pol_col_mp is None or pol_col_mp not in df_scope.columns) or (pod_col_mp is None or pod_col_mp not in df_scope.columns):
             return "", "", "sin-candidatos"
@@ -950,10 +909,10 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             df_alt = df_mp
             if pol_cc_col is not None and pol_cc_col in df_alt.columns:
                 dc_targets = {_normalize(dc), _normalize(dc_name)} if dc_name else {_normalize(dc)}
-                df_alt = df_alt[df_alt[pol_cc_col].apply(lambda v: _country_matches_any(v, dc_targets))]
+                df_alt = mp_schema.rows_in(df_alt, "POL", dc_targets)
             if pod_cc_col is not None and pod_cc_col in df_alt.columns:
                 oc_targets = {_normalize(oc), _normalize(oc_name)} if oc_name else {_normalize(oc)}
-                df_alt = df_alt[df_alt[pod_cc_col].apply(lambda v: _country_matches_any(v, oc_targets))]
+                df_alt = mp_schema.rows_in(df_alt, "POD", oc_targets)
             if (pol_col_mp is not None and pol_col_mp in df_alt.columns) and (pod_col_mp is not None and pod_col_mp in df_alt.columns):
                 df_alt = df_alt.dropna(subset=[pol_col_mp, pod_col_mp])
                 if not df_alt.empty:
@@ -977,7 +936,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
                         try:
                             scored = []
                             for pol, pod in pairs:
-                                plat, plon, _ = resolve_point(geo, oc, port=pol)
+                                plat, plon, _ = _resolve_point(geo, oc, port=pol)
                                 if plat is not None:
                                     km = road_km_between((plat, plon), origin_point)
                                     scored.append((km, pol, pod))
@@ -1006,7 +965,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
                 rows_pol = df_mp[df_mp[pol_c].astype(str).str.upper() == pol_only.upper()]
                 if pod_cc_col is not None and pod_cc_col in rows_pol.columns:
                     dc_targets = {_normalize(dc), _normalize(dc_name)} if dc_name else {_normalize(dc)}
-                    rows_pol = rows_pol[rows_pol[pod_cc_col].apply(lambda v: _country_matches_any(v, dc_targets))]
+                    rows_pol = mp_schema.rows_in(rows_pol, "POD", dc_targets)
                 if not rows_pol.empty:
                     pod_counts = rows_pol[pod_c].astype(str).str.upper().value_counts()
                     pod_best_u = pod_counts.index[0]
@@ -1020,11 +979,11 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             pod_c = pod_col_mp or "POD"
             if pod_cc_col is not None and pod_cc_col in rows_pod.columns:
                 dc_targets = {_normalize(dc), _normalize(dc_name)} if dc_name else {_normalize(dc)}
-                rows_pod = rows_pod[rows_pod[pod_cc_col].apply(lambda v: _country_matches_any(v, dc_targets))]
+                rows_pod = mp_schema.rows_in(rows_pod, "POD", dc_targets)
             if not rows_pod.empty:
                 if pol_cc_col is not None and pol_cc_col in rows_pod.columns:
                     oc_targets = {_normalize(oc), _normalize(oc_name)} if oc_name else {_normalize(oc)}
-                    rows_pod = rows_pod[rows_pod[pol_cc_col].apply(lambda v: _country_matches_any(v, oc_targets))]
+                    rows_pod = mp_schema.rows_in(rows_pod, "POL", oc_targets)
                 if not rows_pod.empty:
                     pair_counts = rows_pod.groupby([rows_pod[pol_c].astype(str).str.upper(), rows_pod[pod_c].astype(str).str.upper()]).size().sort_values(ascending=False)
                     pol_best_u, pod_best_u = pair_counts.index[0]
@@ -1089,7 +1048,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         df_scope = df_mp
         if pol_cc_col is not None:
             oc_targets = {_normalize(oc), _normalize(oc_name)} if oc_name else {_normalize(oc)}
-            df_scope = df_scope[df_scope[pol_cc_col].apply(lambda v: _country_matches_any(v, oc_targets))]
+            df_scope = mp_schema.rows_in(df_scope, "POL", oc_targets)
         # Candidate POLs from scope
         pols = df_scope[pol_col_mp].dropna().astype(str).str.strip().tolist() if (pol_col_mp and pol_col_mp in df_scope.columns) else []
         # If MP lacks country columns, intersect with HORSE-PUERTO ports for oc
@@ -1139,78 +1098,31 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         scored.sort(reverse=True)
         return scored[0][1], "frecuencia"
 
-    def _resolve_col(df: pd.DataFrame, candidates: list[str], contains_any: list[str] | None = None) -> str | None:
-        """Find a column in df by case-insensitive exact name in candidates, else by contains keywords in order."""
-        cols = [str(c) for c in df.columns]
-        lcmap = {str(c).lower().strip(): c for c in cols}
-        for cand in candidates:
-            k = cand.lower().strip()
-            if k in lcmap:
-                return lcmap[k]
-        if contains_any:
-            lower_cols = [(c, c.lower()) for c in cols]
-            for key in contains_any:
-                for orig, low in lower_cols:
-                    if key.lower() in low:
-                        return orig
-        return None
-
     def get_ocean_rate_and_tt(pol: str, pod: str):
         rate = None
         tt_days = None
-        if pol and pod and not df_vtt_routes.empty:
-            try:
-                pol_vtt = _resolve_col(df_vtt_routes, ["POL"], ["pol"])
-                pod_vtt = _resolve_col(df_vtt_routes, ["POD"], ["pod"])
-                tt_vtt = _resolve_col(df_vtt_routes, ["Transit time", "Transit Time"], ["transit time", "transit"])
-                sec_vtt = _resolve_col(df_vtt_routes, ["Time for security"], ["time for security", "security"])
-                if pol_vtt and pod_vtt and tt_vtt:
-                    mv = df_vtt_routes[
-                        (df_vtt_routes[pol_vtt].astype(str).str.upper().str.strip() == str(pol).upper().strip()) &
-                        (df_vtt_routes[pod_vtt].astype(str).str.upper().str.strip() == str(pod).upper().strip())
-                    ]
-                    if not mv.empty:
-                        try:
-                            tvals = pd.to_numeric(mv[tt_vtt], errors="coerce")
-                            if sec_vtt and sec_vtt in mv.columns:
-                                svals = pd.to_numeric(mv[sec_vtt], errors="coerce")
-                            else:
-                                svals = pd.Series([float("nan")] * len(mv), index=mv.index)
-                            totals = tvals.fillna(0) + svals.fillna(0)
-                            valid = tvals.notna() | svals.notna()
-                            vv = totals[valid]
-                            tt_days = float(vv.min()) if not vv.empty else None
-                        except Exception:
-                            tt_days = None
-            except Exception:
-                pass
+        if pol and pod and indexes.vtt_tt is not None:
+            # Min(Transit time + Time for security) over the VTT DATA rows of this POL/POD
+            tt_days = indexes.vtt_tt.get((str(pol).upper().strip(), str(pod).upper().strip()))
         if pol and pod and not df_mp.empty:
             try:
-                pol_c = pol_col_mp or "POL"
-                pod_c = pod_col_mp or "POD"
-                m = df_mp[(df_mp[pol_c].astype(str).str.upper() == pol.upper()) & (df_mp[pod_c].astype(str).str.upper() == pod.upper())]
-                if not m.empty:
+                pos = indexes.mp_pairs.get((pol.upper(), pod.upper())) if indexes.mp_pairs is not None else None
+                if pos is not None:
                     # Rate
-                    rate_col = _resolve_col(
-                        df_mp,
-                        ["Rate 40ft all-in", "Rate 40FT ALL-IN", "Rate 40ft", "Ocean Rate"],
-                        ["rate", "40", "all"]
-                    )
+                    rate_col = mp_schema.rate_col_mp
                     if rate_col:
                         try:
-                            rate = float(m.iloc[0].get(rate_col)) if pd.notna(m.iloc[0].get(rate_col)) else None
+                            val = cell_value(df_mp, pos, rate_col)
+                            rate = float(val) if pd.notna(val) else None
                         except Exception:
                             rate = None
                     # TT fallback in MAIN PORTS (VTT POL/POD table has priority)
                     if tt_days is None:
-                        tt_col = _resolve_col(
-                            df_mp,
-                            ["TT_OVS", "TT", "TT (days)", "TT(days)", "Transit Time"],
-                            ["tt", "transit time"]
-                        )
+                        tt_col = mp_schema.tt_col_mp
                         if tt_col:
                             try:
-                                tt_days = float(m.iloc[0].get(tt_col)) if pd.notna(m.iloc[0].get(tt_col)) else None
+                                val = cell_value(df_mp, pos, tt_col)
+                                tt_days = float(val) if pd.notna(val) else None
                             except Exception:
                                 tt_days = None
             except Exception:
@@ -1218,16 +1130,13 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         if tt_days is None and pol and pod and not df_tt.empty:
             try:
                 # Find appropriate TT column in TRANSITTIME sheet
-                tt_col2 = _resolve_col(df_tt, ["Transit Time", "TT", "TT (days)", "TT(days)"], ["transit", "tt"])
-                if tt_col2 is None:
-                    tt_col2 = "Transit Time" if "Transit Time" in df_tt.columns else None
+                tt_col2 = mp_schema.tt_col_tt
                 if tt_col2 is not None:
-                    pol_t = pol_col_tt or "POL"
-                    pod_t = pod_col_tt or "POD"
-                    m2 = df_tt[(df_tt[pol_t].astype(str).str.upper() == pol.upper()) & (df_tt[pod_t].astype(str).str.upper() == pod.upper())]
-                    if not m2.empty:
+                    pos = indexes.tt_pairs.get((pol.upper(), pod.upper())) if indexes.tt_pairs is not None else None
+                    if pos is not None:
                         try:
-                            tt_days = float(m2.iloc[0].get(tt_col2)) if pd.notna(m2.iloc[0].get(tt_col2)) else None
+                            val = cell_value(df_tt, pos, tt_col2)
+                            tt_days = float(val) if pd.notna(val) else None
                         except Exception:
                             tt_days = None
             except Exception:
@@ -1273,13 +1182,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             return None
         return None
 
-    def _normalize_zip_token(s: str | None) -> str:
-        if not s:
-            return ""
-        z = str(s).strip().upper().replace(" ", "").replace("-", "")
-        # Keep only alphanumerics
-        z = "".join([ch for ch in z if ch.isalnum()])
-        return z
+    _normalize_zip_token = normalize_zip_token
 
     def _normalize_city_for_country(cc: str, city: str | None) -> str:
         """Normalize city names by country to improve matching.
@@ -1322,46 +1225,32 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
 
     # NOTE: No ZIP enrichment from HORSE-PUERTO. ZIPs must come from CITY_ZIPS (or alias) per data-first policy.
 
+    def _city_table(name: str, df: pd.DataFrame) -> CityTable:
+        """CITY_ZIPS / GEO_LOCATIONS indexed per country once per data load (exact, canonical, fuzzy)."""
+        return ref.derived(("city_table", name), lambda: CityTable(df, _canon))
+
     def _zip_from_city_sheet(cc: str, city: str) -> str | None:
         try:
             if df_city_zips is None or df_city_zips.empty:
                 return None
-            cc_u = (cc or "").strip().upper()
-            city_u = (city or "").strip().upper()
-            cols = {c.lower().strip(): c for c in df_city_zips.columns}
-            cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
-            city_col = cols.get("city") or "City"
-            zip_col = cols.get("zip") or cols.get("zip code") or cols.get("postal code") or "ZIP"
-            m = df_city_zips[
-                df_city_zips.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                df_city_zips.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(city_u)
-            ]
-            if not m.empty:
-                val = m.iloc[0].get(zip_col)
-                return str(val).strip() if pd.notna(val) else None
-            # Accent-insensitive and fuzzy city matching within the same country
-            df_cc = df_city_zips[df_city_zips.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u)]
-            if not df_cc.empty:
+            table = _city_table("city_zips", df_city_zips)
+            if not table.ok:
+                return None
+            pos = table.exact(cc, city)
+            if pos is None:
+                # Accent-insensitive and fuzzy city matching within the same country
                 try:
-                    df_cc = df_cc.copy()
-                    df_cc['__canon_city'] = df_cc.get(city_col, pd.Series()).astype(str).map(_canon)
-                    key = _canon(city)
-                    m2 = df_cc[df_cc['__canon_city'] == key]
-                    if not m2.empty:
-                        val2 = m2.iloc[0].get(zip_col)
-                        return str(val2).strip() if pd.notna(val2) else None
-                    choices = df_cc.get(city_col, pd.Series()).dropna().astype(str).tolist()
-                    best, score = _fuzzy_pick(city, choices, score_cutoff=92)
-                    if best:
-                        m3 = df_cc[df_cc.get(city_col, pd.Series()).astype(str).str.upper() == str(best).upper()]
-                        if not m3.empty:
-                            val3 = m3.iloc[0].get(zip_col)
-                            return str(val3).strip() if pd.notna(val3) else None
+                    pos = table.canonical(cc, city)
+                    if pos is None:
+                        pos = table.fuzzy(cc, city, score_cutoff=92)
                 except Exception:
-                    pass
+                    pos = None
+                if pos is None:
+                    return None
+            val = table.value(pos, "zip")
+            return str(val).strip() if pd.notna(val) else None
         except Exception:
             return None
-        return None
 
     # Representative ZIP fallback for key China industrial/logistics cities.
     # Used only when CITY_ZIPS (and alias lookup) cannot resolve a valid ZIP.
@@ -1426,43 +1315,12 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         return z, None
 
     # Direct coordinate fallback from 'Ports Locations' when GeoIndex cannot resolve a port by country
+    def _ports_index() -> PortIndex:
+        """Ports Locations compiled once per data load (codes, coords, country membership)."""
+        return ref.derived(("port_index",), lambda: PortIndex(df_ports, lambda c: coerce_country_code(c, c)))
+
     def _port_coords_from_ports_locations(port_code: str) -> tuple[float | None, float | None]:
-        try:
-            if not port_code or df_ports is None or df_ports.empty:
-                return None, None
-            m = df_ports[df_ports["POL/POD"].astype(str).str.upper() == str(port_code).strip().upper()]
-            if not m.empty:
-                def _coerce_coord(val, kind: str) -> float | None:
-                    try:
-                        if pd.isna(val):
-                            return None
-                        if isinstance(val, str):
-                            s = val.strip().replace(" ", "")
-                            # Replace comma decimal with dot
-                            s = s.replace(",", ".")
-                            f = float(s)
-                        else:
-                            f = float(val)
-                        # Fix common thousand-without-decimal issue (e.g., 39450 for 39.450)
-                        if kind == "lat" and abs(f) > 90 and abs(f) <= 180000:
-                            f = f / 1000.0
-                        if kind == "lon" and abs(f) > 180 and abs(f) <= 360000:
-                            f = f / 1000.0
-                        # Final sanity
-                        if kind == "lat" and abs(f) <= 90:
-                            return f
-                        if kind == "lon" and abs(f) <= 180:
-                            return f
-                        return None
-                    except Exception:
-                        return None
-                lat = _coerce_coord(m.iloc[0].get("LAT"), "lat")
-                lon = _coerce_coord(m.iloc[0].get("LONG"), "lon")
-                if lat is not None and lon is not None:
-                    return lat, lon
-        except Exception:
-            return None, None
-        return None, None
+        return _ports_index().coords(port_code)
 
     def _best_port_coords_for_origin(origin_point: tuple[float, float] | None,
                                      lat: float | None,
@@ -1494,7 +1352,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             try:
                 rows = df_mp[df_mp[pol_col_mp].astype(str).str.upper() == str(pol).strip().upper()]
                 if not rows.empty and pol_cc_col in rows.columns:
-                    pol_ok = bool(rows[rows[pol_cc_col].apply(lambda v: _country_matches_any(v, oc_targets))].shape[0] > 0)
+                    pol_ok = bool(mp_schema.rows_in(rows, "POL", oc_targets).shape[0] > 0)
             except Exception:
                 pol_ok = True
         # Validate POD
@@ -1503,99 +1361,39 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             try:
                 rows = df_mp[df_mp[pod_col_mp].astype(str).str.upper() == str(pod).strip().upper()]
                 if not rows.empty and pod_cc_col in rows.columns:
-                    pod_ok = bool(rows[rows[pod_cc_col].apply(lambda v: _country_matches_any(v, dc_targets))].shape[0] > 0)
+                    pod_ok = bool(mp_schema.rows_in(rows, "POD", dc_targets).shape[0] > 0)
             except Exception:
                 pod_ok = True
         return pol_ok, pod_ok
 
     # New selection: choose POL/POD strictly from Ports Locations by country and proximity
-    def _row_country_code_ports(rr) -> str:
-        try:
-            cval = rr.get("Country")
-            c = str(cval).strip().upper() if pd.notna(cval) else ""
-            # If it already looks like a code, keep; else map name→code
-            return coerce_country_code(c, c)
-        except Exception:
-            return ""
-
     def _all_ports_for_country_from_ports_locations(cc: str) -> list[tuple[str, float | None, float | None]]:
         """Return list of (port_code, lat, lon) from Ports Locations matching given country by either:
         - Country column (name/code normalized), OR
         - UN/LOCODE prefix of POL/POD (first 2 letters).
         This avoids misses when the Country column uses 3-letter codes or names not in the HP map.
         """
-        out = []
-        try:
-            if df_ports is None or df_ports.empty or not cc:
-                return out
-            cc_u = (cc or "").strip().upper()
-            cc2 = cc_u[:2]
-            for _, rr in df_ports.iterrows():
-                try:
-                    code = str(rr.get("POL/POD", "")).strip().upper()
-                    if not code:
-                        continue
-                    # Accept row if Country matches target OR UN/LOC prefix matches
-                    row_cc = _row_country_code_ports(rr)
-                    pol_cc2 = code[:2]
-                    if not (row_cc == cc_u or pol_cc2 == cc2):
-                        continue
-                    la, lo = _port_coords_from_ports_locations(code)
-                    out.append((code, la, lo))
-                except Exception:
-                    continue
-        except Exception:
-            return out
-        return out
+        return _ports_index().candidates(cc)
 
     def select_port_nearest_from_ports_locations(cc: str, near_point: tuple[float, float] | None, side: str) -> tuple[str, str]:
         """Pick nearest port (POL or POD) in Ports Locations by country and proximity to near_point.
         Returns (port_code, reason). If near_point is None, returns most frequent/first available.
         """
-        cands = _all_ports_for_country_from_ports_locations(cc)
+        ports = _ports_index()
+        cands = ports.candidates(cc)
         if not cands:
             return "", f"sin-candidatos-ports-locations-{side}"
-        # Proximity first when near_point available
+        # Proximity first when near_point available (all candidates scored in one vectorized call)
         if near_point is not None:
-            scored = []
-            for code, la, lo in cands:
-                if la is None or lo is None:
-                    continue
-                bla, blo, _ = _best_port_coords_for_origin(near_point, la, lo)
-                if bla is None or blo is None:
-                    continue
-                try:
-                    km = road_km_between((bla, blo), near_point)
-                except Exception:
-                    continue
-                scored.append((km, code))
-            if scored:
-                scored.sort()
-                return scored[0][1], f"cercania-ports-locations-{side}"
+            nearest = ports.nearest(cc, near_point, k=1)
+            if nearest:
+                return nearest[0][0], f"cercania-ports-locations-{side}"
         # Fallback: pick first available
         return cands[0][0], f"primero-ports-locations-{side}"
 
     def _ports_candidates_debug(cc: str, near_point: tuple[float, float] | None) -> list[dict]:
         """Return detailed candidate list for debug: [{code, has_coords, km}] sorted by km asc (None last)."""
-        info = []
-        cands = _all_ports_for_country_from_ports_locations(cc)
-        for code, la, lo in cands:
-            entry = {"code": code, "has_coords": False, "km": None}
-            if la is not None and lo is not None and near_point is not None:
-                bla, blo, _ = _best_port_coords_for_origin(near_point, la, lo)
-                if bla is not None and blo is not None:
-                    try:
-                        entry["km"] = round(road_km_between((bla, blo), near_point), 1)
-                        entry["has_coords"] = True
-                    except Exception:
-                        entry["has_coords"] = True
-                else:
-                    entry["has_coords"] = True
-            else:
-                entry["has_coords"] = (la is not None and lo is not None)
-            info.append(entry)
-        info.sort(key=lambda x: (float('inf') if x["km"] is None else x["km"]))
-        return info
+        return [{"code": c.code, "has_coords": c.has_coords, "km": c.km} for c in _ports_index().ranked(cc, near_point)]
 
     def _city_coords_from_db(cc: str, city: str) -> tuple[float | None, float | None]:
         """Lookup city coordinates from GEO_LOCATIONS/CITY_COORDS sheet, with alias fallback."""
@@ -1639,51 +1437,35 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
 
             if df_geo_cities is None or df_geo_cities.empty or not city:
                 return None, None
-            cols = {c.lower().strip(): c for c in df_geo_cities.columns}
-            cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
-            city_col = cols.get("city") or "City"
-            lat_col = cols.get("lat") or cols.get("latitude") or "Lat"
-            lon_col = cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long"
-            m = df_geo_cities[
-                df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(key_u)
-            ]
-            if not m.empty:
-                la = m.iloc[0].get(lat_col); lo = m.iloc[0].get(lon_col)
+            table = _city_table("geo_cities", df_geo_cities)
+            if not table.ok:
+                return None, None
+
+            def _coords_at(pos):
+                if pos is None:
+                    return None
+                la = table.value(pos, "lat"); lo = table.value(pos, "lon")
                 if pd.notna(la) and pd.notna(lo):
                     return float(la), float(lo)
+                return None
+
+            hit = _coords_at(table.exact(cc_u, key_u))
+            if hit:
+                return hit
             # Alias fallback
             alias = _city_alias(cc, city)
             if alias:
-                au = alias.strip().upper()
-                m2 = df_geo_cities[
-                    df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                    df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(au)
-                ]
-                if not m2.empty:
-                    la = m2.iloc[0].get(lat_col); lo = m2.iloc[0].get(lon_col)
-                    if pd.notna(la) and pd.notna(lo):
-                        return float(la), float(lo)
+                hit = _coords_at(table.exact(cc_u, alias))
+                if hit:
+                    return hit
             # Accent-insensitive exact and fuzzy fallback within country
             try:
-                df_cc = df_geo_cities[df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u)]
-                if not df_cc.empty:
-                    df_cc = df_cc.copy()
-                    df_cc['__canon_city'] = df_cc.get(city_col, pd.Series()).astype(str).map(_canon)
-                    key = _canon(city)
-                    m3 = df_cc[df_cc['__canon_city'] == key]
-                    if not m3.empty:
-                        la = m3.iloc[0].get(lat_col); lo = m3.iloc[0].get(lon_col)
-                        if pd.notna(la) and pd.notna(lo):
-                            return float(la), float(lo)
-                    choices = df_cc.get(city_col, pd.Series()).dropna().astype(str).tolist()
-                    best, score = _fuzzy_pick(city, choices, score_cutoff=90)
-                    if best:
-                        m4 = df_cc[df_cc.get(city_col, pd.Series()).astype(str).str.upper() == str(best).upper()]
-                        if not m4.empty:
-                            la = m4.iloc[0].get(lat_col); lo = m4.iloc[0].get(lon_col)
-                            if pd.notna(la) and pd.notna(lo):
-                                return float(la), float(lo)
+                hit = _coords_at(table.canonical(cc_u, city))
+                if hit:
+                    return hit
+                hit = _coords_at(table.fuzzy(cc_u, city, score_cutoff=90))
+                if hit:
+                    return hit
             except Exception:
                 pass
             if cc_u == "CN":
@@ -1755,19 +1537,11 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             if cc_u == "CZ" and z_u == "74401":
                 return 49.5489, 18.2108
 
-            if 'df_zip_coords' not in locals() or df_zip_coords is None or df_zip_coords.empty or not z:
+            if indexes.zip_coords is None or not z:
                 return None, None
-            cols = {c.lower().strip(): c for c in df_zip_coords.columns}
-            cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
-            zip_col = cols.get("zip") or cols.get("zip code") or cols.get("postal code") or "ZIP"
-            lat_col = cols.get("lat") or cols.get("latitude") or "Lat"
-            lon_col = cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long"
-            m = df_zip_coords[
-                df_zip_coords.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                df_zip_coords.get(zip_col, pd.Series()).astype(str).str.upper().apply(_normalize_zip_token).eq(z_u)
-            ]
-            if not m.empty:
-                la = m.iloc[0].get(lat_col); lo = m.iloc[0].get(lon_col)
+            hit = indexes.zip_coords.get((cc_u, z_u))
+            if hit is not None:
+                la, lo = hit
                 if pd.notna(la) and pd.notna(lo):
                     return float(la), float(lo)
         except Exception:
@@ -1785,11 +1559,9 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         cc_u = str(cc or "").strip().upper()
         cc_norm = alias.get(cc_u, cc_u)
         try:
-            co = df_cpkm["Country of origin"].astype(str).str.upper().str.strip()
-            cd = df_cpkm["Destination Country"].astype(str).str.upper().str.strip()
-            m = df_cpkm[(co == cc_norm) & (cd == cc_norm)]
-            if not m.empty:
-                val = m.iloc[0].get("Eur/km")
+            pos = indexes.cpkm_pairs.get((cc_norm, cc_norm))
+            if pos is not None:
+                val = cell_value(df_cpkm, pos, "Eur/km")
                 return float(val) if pd.notna(val) else None
         except Exception:
             return None
@@ -1808,17 +1580,15 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         oc_n = alias.get(oc_u, oc_u)
         dc_n = alias.get(dc_u, dc_u)
         try:
-            co = df_cpkm["Country of origin"].astype(str).str.upper().str.strip()
-            cd = df_cpkm["Destination Country"].astype(str).str.upper().str.strip()
-            m = df_cpkm[(co == oc_n) & (cd == dc_n)]
-            if not m.empty:
-                val = m.iloc[0].get("Eur/km")
+            pos = indexes.cpkm_pairs.get((oc_n, dc_n))
+            if pos is not None:
+                val = cell_value(df_cpkm, pos, "Eur/km")
                 if pd.notna(val):
                     return float(val)
             # symmetric fallback
-            m2 = df_cpkm[(co == dc_n) & (cd == oc_n)]
-            if not m2.empty:
-                val2 = m2.iloc[0].get("Eur/km")
+            pos2 = indexes.cpkm_pairs.get((dc_n, oc_n))
+            if pos2 is not None:
+                val2 = cell_value(df_cpkm, pos2, "Eur/km")
                 if pd.notna(val2):
                     return float(val2)
             if oc_n == dc_n:
@@ -1840,16 +1610,14 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         oc_n = alias.get(oc_u, oc_u)
         dc_n = alias.get(dc_u, dc_u)
         try:
-            co = df_cpkm["Country of origin"].astype(str).str.upper().str.strip()
-            cd = df_cpkm["Destination Country"].astype(str).str.upper().str.strip()
-            m = df_cpkm[(co == oc_n) & (cd == dc_n)]
-            if not m.empty:
-                val = m.iloc[0].get("TT_ROAD")
+            pos = indexes.cpkm_pairs.get((oc_n, dc_n))
+            if pos is not None:
+                val = cell_value(df_cpkm, pos, "TT_ROAD")
                 if pd.notna(val):
                     return float(val)
-            m2 = df_cpkm[(co == dc_n) & (cd == oc_n)]
-            if not m2.empty:
-                val2 = m2.iloc[0].get("TT_ROAD")
+            pos2 = indexes.cpkm_pairs.get((dc_n, oc_n))
+            if pos2 is not None:
+                val2 = cell_value(df_cpkm, pos2, "TT_ROAD")
                 if pd.notna(val2):
                     return float(val2)
         except Exception:
@@ -1881,8 +1649,6 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
                 return None
             plant_name = canonical_plant_name(plant_name)
             cols = {str(c).lower().strip(): str(c) for c in df_hp.columns}
-            plant_col = cols.get("plant") or "Plant"
-            port_col = cols.get("pol/pod") or "POL/POD"
             eur_col = cols.get("eur/km")
             # Fallback to column K (index 10) if Eur/km header is unavailable
             if eur_col is None and len(df_hp.columns) > 10:
@@ -1890,12 +1656,11 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             if eur_col is None:
                 return None
 
-            m = df_hp[
-                df_hp.get(plant_col, pd.Series()).astype(str).str.strip().str.upper().eq(str(plant_name).strip().upper()) &
-                df_hp.get(port_col, pd.Series()).astype(str).str.strip().str.upper().eq(str(port_code).strip().upper())
-            ]
-            if not m.empty:
-                val = m.iloc[0].get(eur_col)
+            if indexes.hp_pairs is None:
+                return None
+            pos = indexes.hp_pairs.get((str(plant_name).strip().upper(), str(port_code).strip().upper()))
+            if pos is not None:
+                val = cell_value(df_hp, pos, eur_col)
                 if pd.notna(val):
                     return float(val)
         except Exception:
@@ -2096,379 +1861,629 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
     except Exception:
         geo = GeoIndex.load_from_dir(QTOOL_DIR)
 
-    # Build quote rows
-    rows = []
-    for _, r in input_df.iterrows():
-        # Per-row incoterm (fallback to default)
-        incoterm_row = (r.get("incoterm") or "").strip().upper() if pd.notna(r.get("incoterm")) else DEFAULT_INCOTERM
-        debug_msgs = []
+    # Persistent geocode store: every coordinate path is served from / recorded into it.
+    # Offline results are tied to this reference-data version (workbook, VTT and GEO_LOCATIONS.xlsx),
+    # online ones expire.
+    geo_store = open_geocode_store(data_file)
+    geo_version = geo_data_version(ref)
+    geo_store.retire_versions(geo_version)
+    _zip_coords_from_db_uncached = _zip_coords_from_db
+    _city_coords_from_db_uncached = _city_coords_from_db
+    _city_coords_online_uncached = _city_coords_online
+
+    def _resolve_point(geo_idx, cc, zip_code=None, city=None, plant=None, port=None):
+        lookup = f"{zip_code or ''}|{city or ''}|{plant or ''}|{port or ''}"
+        hit = geo_store.get("resolve_point", geo_version, cc, lookup)
+        if hit is not None:
+            return hit
+        lat, lon, tag = resolve_point(geo_idx, cc, zip_code=zip_code, city=city, plant=plant, port=port)
+        if lat is not None:
+            geo_store.put("resolve_point", geo_version, cc, lookup, lat, lon, tag)
+        return lat, lon, tag
+
+    def _zip_coords_from_db(cc: str, z: str) -> tuple[float | None, float | None]:
+        hit = geo_store.get("zip_coords_db", geo_version, cc, str(z or ""))
+        if hit is not None:
+            return hit[0], hit[1]
+        la, lo = _zip_coords_from_db_uncached(cc, z)
+        if la is not None:
+            geo_store.put("zip_coords_db", geo_version, cc, str(z or ""), la, lo)
+        return la, lo
+
+    def _city_coords_from_db(cc: str, city: str) -> tuple[float | None, float | None]:
+        hit = geo_store.get("city_db", geo_version, cc, str(city or ""))
+        if hit is not None:
+            return hit[0], hit[1]
+        la, lo = _city_coords_from_db_uncached(cc, city)
+        if la is not None:
+            geo_store.put("city_db", geo_version, cc, str(city or ""), la, lo)
+        return la, lo
+
+    def _city_coords_online(cc: str, city: str) -> tuple[float | None, float | None, bool]:
+        if geocode_city_online_if_allowed is None or not city:
+            return None, None, False
+        # Online answers (including "not found") are kept for ONLINE_TTL_SECONDS
+        hit = geo_store.get("nominatim", "online", cc, str(city))
+        if hit is not None:
+            return hit[0], hit[1], hit[0] is not None
+        la, lo, used = _city_coords_online_uncached(cc, city)
+        geo_store.put("nominatim", "online", cc, str(city), la if used else None, lo if used else None,
+                      "nominatim" if used else "", ttl=ONLINE_TTL_SECONDS)
+        return la, lo, used
+
+    _resolve_point = clock.timed("geocode", _resolve_point)
+    _zip_coords_from_db = clock.timed("geocode", _zip_coords_from_db)
+    _city_coords_from_db = clock.timed("geocode", _city_coords_from_db)
+    _city_coords_online = clock.timed("geocode", _city_coords_online)
+    select_port_nearest_from_ports_locations = clock.timed("ports", select_port_nearest_from_ports_locations)
+    _ports_candidates_debug = clock.timed("ports", _ports_candidates_debug)
+    clock.lap("reference")
+
+    # ------------------------------------------------------------------
+    # Batch quoting engine
+    # Every stage works on whole columns: lookups run once per unique key and are fanned
+    # back out to the rows, distances are computed in one NumPy call at the end. Debug
+    # messages are collected per stage and joined in the same order as the old row loop.
+    # ------------------------------------------------------------------
+    n_rows = len(input_df)
+
+    def _col(name: str) -> list:
+        return input_df[name].tolist() if name in input_df.columns else [None] * n_rows
+
+    def _text_col(name: str) -> list[str]:
+        return [str(v) if pd.notna(v) else "" for v in _col(name)]
+
+    def _map_unique(keys: list, fn) -> list:
+        """fn(key) evaluated once per distinct key, returned per row."""
+        done = {}
+        out = []
+        for k in keys:
+            if k not in done:
+                done[k] = fn(k)
+            out.append(done[k])
+        return out
+
+    # Stage 1: incoterm -> legs / type of flow (rules.flow_by_incoterm)
+    def _incoterm_rule(raw):
+        incoterm_row = (raw or "").strip().upper() if pd.notna(raw) else DEFAULT_INCOTERM
         try:
             included_legs, type_of_flow = flow_by_incoterm(incoterm_row)
-        except Exception as e:
-            debug_msgs.append(f"Incoterm no soportado '{r.get('incoterm')}', usando {DEFAULT_INCOTERM}")
+            note = None
+        except Exception:
+            note = f"Incoterm no soportado '{raw}', usando {DEFAULT_INCOTERM}"
             incoterm_row = DEFAULT_INCOTERM
             included_legs, type_of_flow = flow_by_incoterm(incoterm_row)
-        pn = r.get("pn"); designation = r.get("designation"); supplier = r.get("supplier_plant")
-        packaging_code_raw = r.get("packaging_code")
-        packaging_code = resolve_packaging_code(packaging_code_raw)
-        pkg_data = lookup_packaging_data(str(pn or ""), packaging_code_raw, packaging_code)
-        if pkg_data.get("pkg_debug"):
-            debug_msgs.append(str(pkg_data.get("pkg_debug")))
-        oc = coerce_country_code(r.get("origin_country_code"), r.get("origin_country"))
-        dc = coerce_country_code(r.get("dest_country_code"), r.get("dest_country"))
-        road_pair_eur_per_km = get_pair_eur_per_km(oc, dc)
-        road_pair_tt_days = get_pair_tt_road(oc, dc)
+        return incoterm_row, included_legs, type_of_flow, note
+
+    inc_rules = _map_unique(_col("incoterm"), _incoterm_rule)
+    incoterms = [x[0] for x in inc_rules]
+    msgs_incoterm = [[x[3]] if x[3] else [] for x in inc_rules]
+
+    # Stage 2: packaging (PN / packaging code)
+    pns = _col("pn")
+    designations = _col("designation")
+    suppliers = _col("supplier_plant")
+    dest_plants = _col("dest_plant")
+    pkg_keys = list(zip([str(pn or "") for pn in pns], _col("packaging_code")))
+
+    def _packaging_for(key):
+        pn_s, raw_code = key
+        code = resolve_packaging_code(raw_code)
+        return code, lookup_packaging_data(pn_s, raw_code, code)
+
+    pkg_rows = _map_unique(pkg_keys, _packaging_for)
+    packaging_codes = [x[0] for x in pkg_rows]
+    pkg_datas = [x[1] for x in pkg_rows]
+    msgs_pkg = [[str(d.get("pkg_debug"))] if d.get("pkg_debug") else [] for d in pkg_datas]
+
+    clock.lap("packaging")
+
+    # Stage 3: country codes
+    ocs = _map_unique(list(zip(_col("origin_country_code"), _col("origin_country"))), lambda k: coerce_country_code(*k))
+    dcs = _map_unique(list(zip(_col("dest_country_code"), _col("dest_country"))), lambda k: coerce_country_code(*k))
+
+    # Stage 4: COSTPERKM pair (€/km, TT_ROAD) and flow overrides
+    road_pairs = _map_unique(list(zip(ocs, dcs)), lambda k: (get_pair_eur_per_km(*k), get_pair_tt_road(*k)))
+
+    def _flow_rule(key):
+        incoterm_row, oc, dc = key
+        _, included_legs, type_of_flow, _ = _incoterm_rule(incoterm_row)
+        road_eur, road_tt = _road_pair_by_cc[(oc, dc)]
+        note = None
         # Business rule: Morocco -> Europe RoRo moves are handled as Inland transport.
         if is_morocco_europe_roro_route(oc, dc):
             type_of_flow = "Inland"
             included_legs = [1]
-            debug_msgs.append("Ruta especial MA->Europa por RoRo: tratada como Inland")
-        elif incoterm_row == "FCA" and road_pair_eur_per_km is not None:
+            note = "Ruta especial MA->Europa por RoRo: tratada como Inland"
+        elif incoterm_row == "FCA" and road_eur is not None:
             type_of_flow = "Inland"
             included_legs = [1]
-            if road_pair_tt_days is not None:
-                debug_msgs.append(f"Ruta FCA por carretera: tratada como Inland ({oc}->{dc}, TT_ROAD={road_pair_tt_days:g})")
+            if road_tt is not None:
+                note = f"Ruta FCA por carretera: tratada como Inland ({oc}->{dc}, TT_ROAD={road_tt:g})"
             else:
-                debug_msgs.append(f"Ruta FCA por carretera: tratada como Inland ({oc}->{dc})")
+                note = f"Ruta FCA por carretera: tratada como Inland ({oc}->{dc})"
         # If flow is Inland: per requirement, compute ONLY Leg1 (road from origin country to destination country)
         elif str(type_of_flow).strip().upper() == "INLAND":
             included_legs = [1]
-        pack_per_container = calc_pack_per_container(type_of_flow, pkg_data)
-        dest_plant = r.get("dest_plant")
-        supplier_canon = canonical_plant_name(str(supplier or ""))
-        dest_plant_canon = canonical_plant_name(str(dest_plant or ""))
-        origin_city = str(r.get("origin_city")) if pd.notna(r.get("origin_city")) else ""
-        origin_zip = str(r.get("origin_zip")) if pd.notna(r.get("origin_zip")) else ""
-        dest_city = str(r.get("dest_city")) if pd.notna(r.get("dest_city")) else ""
-        dest_zip = str(r.get("dest_zip")) if pd.notna(r.get("dest_zip")) else ""
-        # Determine ports whenever flow is Overseas (even if buyer doesn't pay leg 2)
-        pol_distance_km = None
-        pod_distance_km = None
-        if str(type_of_flow).strip().upper() == "OVERSEAS":
-            # Compute origin point (parse and enrich ZIP first)
-            oc_city_clean_pre, oc_zip_enriched_pre, parse_note_pre = _parse_city_zip(origin_city, origin_zip)
-            if parse_note_pre:
-                debug_msgs.append(parse_note_pre)
-            ozip_final_pre, zip_reason_pre = validate_and_enrich_zip(oc, oc_city_clean_pre, oc_zip_enriched_pre)
-            if zip_reason_pre:
-                debug_msgs.append(f"ZIP origen corregido por {zip_reason_pre}: {oc_zip_enriched_pre or '-'}→{ozip_final_pre}")
-            oc_city_norm_pre = _normalize_city_for_country(oc, oc_city_clean_pre)
-            o_lat, o_lon, _ = resolve_point(geo, oc, zip_code=ozip_final_pre, city=oc_city_norm_pre, plant=supplier_canon)
-            # ZIP_COORDS fallback
-            if o_lat is None and ozip_final_pre:
-                la, lo = _zip_coords_from_db(oc, ozip_final_pre)
-                if la is not None:
-                    o_lat, o_lon = la, lo
-                    debug_msgs.append("Origen resuelto por zip_coords_db")
-            if o_lat is None:
-                # Fallback B: DB city coordinates (GEO_LOCATIONS/CITY_COORDS)
-                o_lat2, o_lon2 = _city_coords_from_db(oc, oc_city_clean_pre)
-                if o_lat2 is not None:
-                    o_lat, o_lon = o_lat2, o_lon2
-                    debug_msgs.append("Origen resuelto por geo_city_fallback")
-            if o_lat is None:
-                # Fallback C: Online (Nominatim) if allowed
-                la, lo, used = _city_coords_online(oc, oc_city_clean_pre)
-                if used and la is not None:
-                    o_lat, o_lon = la, lo
-                    debug_msgs.append("Origen resuelto por nominatim (online)")
-            origin_point = (o_lat, o_lon) if o_lat is not None else None
-
-            # Compute destination point early (for POD proximity)
-            dc_city_clean_pre, dc_zip_enriched_pre, parse_note_pre2 = _parse_city_zip(dest_city, dest_zip)
-            if parse_note_pre2:
-                debug_msgs.append(parse_note_pre2)
-            dzip_final_pre, dzip_reason_pre = validate_and_enrich_zip(dc, dc_city_clean_pre, dc_zip_enriched_pre)
-            if dzip_reason_pre:
-                debug_msgs.append(f"ZIP destino corregido por {dzip_reason_pre}: {dc_zip_enriched_pre or '-'}→{dzip_final_pre}")
-            dc_city_norm_pre = _normalize_city_for_country(dc, dc_city_clean_pre)
-            t_lat_pre, t_lon_pre, _ = resolve_point(geo, dc, zip_code=dzip_final_pre, city=dc_city_norm_pre, plant=dest_plant_canon)
-            # ZIP_COORDS fallback
-            if t_lat_pre is None and dzip_final_pre:
-                la, lo = _zip_coords_from_db(dc, dzip_final_pre)
+        return included_legs, type_of_flow, note
+
+    _road_pair_by_cc = dict(zip(zip(ocs, dcs), road_pairs))
+    flow_rules = _map_unique(list(zip(incoterms, ocs, dcs)), _flow_rule)
+    legs_col = [x[0] for x in flow_rules]
+    flows = [x[1] for x in flow_rules]
+    flows_u = [str(f).strip().upper() for f in flows]
+    msgs_flow = [[x[2]] if x[2] else [] for x in flow_rules]
+
+    clock.lap("flow_rules")
+
+    # Stage 5: packs per container (per flow + packaging)
+    pkg_by_key = dict(zip(pkg_keys, pkg_datas))
+    pack_per_container_col = _map_unique(
+        list(zip(flows, pkg_keys)),
+        lambda k: calc_pack_per_container(k[0], pkg_by_key[k[1]]),
+    )
+
+    clock.lap("packing")
+
+    # Stage 6: locations, POL/POD and leg endpoints (one resolution per route)
+    supplier_canons = _map_unique([str(s or "") for s in suppliers], canonical_plant_name)
+    dest_plant_canons = _map_unique([str(d or "") for d in dest_plants], canonical_plant_name)
+    origin_cities = _text_col("origin_city")
+    origin_zips = _text_col("origin_zip")
+    dest_cities = _text_col("dest_city")
+    dest_zips = _text_col("dest_zip")
+
+    def _pt(lat, lon):
+        return (lat, lon) if lat is not None and lon is not None else None
+
+    def _route_ports(oc, dc, origin_city, origin_zip, dest_city, dest_zip, supplier_canon, dest_plant_canon):
+        """Overseas: origin/destination points (for proximity) and POL/POD from Ports Locations."""
+        msgs = []
+        # Compute origin point (parse and enrich ZIP first)
+        oc_city_clean_pre, oc_zip_enriched_pre, parse_note_pre = _parse_city_zip(origin_city, origin_zip)
+        if parse_note_pre:
+            msgs.append(parse_note_pre)
+        ozip_final_pre, zip_reason_pre = validate_and_enrich_zip(oc, oc_city_clean_pre, oc_zip_enriched_pre)
+        if zip_reason_pre:
+            msgs.append(f"ZIP origen corregido por {zip_reason_pre}: {oc_zip_enriched_pre or '-'}→{ozip_final_pre}")
+        oc_city_norm_pre = _normalize_city_for_country(oc, oc_city_clean_pre)
+        o_lat, o_lon, _ = _resolve_point(geo, oc, zip_code=ozip_final_pre, city=oc_city_norm_pre, plant=supplier_canon)
+        # ZIP_COORDS fallback
+        if o_lat is None and ozip_final_pre:
+            la, lo = _zip_coords_from_db(oc, ozip_final_pre)
+            if la is not None:
+                o_lat, o_lon = la, lo
+                msgs.append("Origen resuelto por zip_coords_db")
+        if o_lat is None:
+            # Fallback B: DB city coordinates (GEO_LOCATIONS/CITY_COORDS)
+            o_lat2, o_lon2 = _city_coords_from_db(oc, oc_city_clean_pre)
+            if o_lat2 is not None:
+                o_lat, o_lon = o_lat2, o_lon2
+                msgs.append("Origen resuelto por geo_city_fallback")
+        if o_lat is None:
+            # Fallback C: Online (Nominatim) if allowed
+            la, lo, used = _city_coords_online(oc, oc_city_clean_pre)
+            if used and la is not None:
+                o_lat, o_lon = la, lo
+                msgs.append("Origen resuelto por nominatim (online)")
+        origin_point = (o_lat, o_lon) if o_lat is not None else None
+
+        # Compute destination point early (for POD proximity)
+        dc_city_clean_pre, dc_zip_enriched_pre, parse_note_pre2 = _parse_city_zip(dest_city, dest_zip)
+        if parse_note_pre2:
+            msgs.append(parse_note_pre2)
+        dzip_final_pre, dzip_reason_pre = validate_and_enrich_zip(dc, dc_city_clean_pre, dc_zip_enriched_pre)
+        if dzip_reason_pre:
+            msgs.append(f"ZIP destino corregido por {dzip_reason_pre}: {dc_zip_enriched_pre or '-'}→{dzip_final_pre}")
+        dc_city_norm_pre = _normalize_city_for_country(dc, dc_city_clean_pre)
+        t_lat_pre, t_lon_pre, _ = _resolve_point(geo, dc, zip_code=dzip_final_pre, city=dc_city_norm_pre, plant=dest_plant_canon)
+        # ZIP_COORDS fallback
+        if t_lat_pre is None and dzip_final_pre:
+            la, lo = _zip_coords_from_db(dc, dzip_final_pre)
+            if la is not None:
+                t_lat_pre, t_lon_pre = la, lo
+                msgs.append("Destino resuelto por zip_coords_db")
+        if t_lat_pre is None:
+            # Fallback B: DB city coordinates
+            t_lat2, t_lon2 = _city_coords_from_db(dc, dc_city_clean_pre)
+            if t_lat2 is not None:
+                t_lat_pre, t_lon_pre = t_lat2, t_lon2
+                msgs.append("Destino resuelto por geo_city_fallback")
+        if t_lat_pre is None:
+            la, lo, used = _city_coords_online(dc, dc_city_clean_pre)
+            if used and la is not None:
+                t_lat_pre, t_lon_pre = la, lo
+                msgs.append("Destino resuelto por nominatim (online)")
+        dest_point = (t_lat_pre, t_lon_pre) if t_lat_pre is not None else None
+
+        # Select POL/POD from Ports Locations by proximity to origin/destination
+        pol_cands_debug = _ports_candidates_debug(oc, origin_point)
+        pod_cands_debug = _ports_candidates_debug(dc, dest_point)
+        pol, why_pol = select_port_nearest_from_ports_locations(oc, origin_point, side="POL")
+        pod, why_pod = select_port_nearest_from_ports_locations(dc, dest_point, side="POD")
+        if pol:
+            msgs.append(f"POL elegido por {why_pol}: {pol}")
+        else:
+            msgs.append("Falta POL (Ports Locations no tiene candidatos para el país de origen)")
+        if pod:
+            msgs.append(f"POD elegido por {why_pod}: {pod}")
+        else:
+            msgs.append("Falta POD (Ports Locations no tiene candidatos para el país de destino)")
+        # Add top-3 proximity candidates to Debug for traceability
+        if pol_cands_debug:
+            top = ", ".join([f"{d['code']}:{'?' if d['km'] is None else d['km']}km" for d in pol_cands_debug[:3]])
+            msgs.append(f"POL candidatos={len(pol_cands_debug)} top3[{top}]")
+            if origin_point is None:
+                msgs.append("Aviso: origen sin coordenadas → no se pueden calcular km de cercanía (agrega ZIP en CITY_ZIPS o coords de ciudad en GEO_LOCATIONS/CITY_COORDS)")
+        if pod_cands_debug:
+            top = ", ".join([f"{d['code']}:{'?' if d['km'] is None else d['km']}km" for d in pod_cands_debug[:3]])
+            msgs.append(f"POD candidatos={len(pod_cands_debug)} top3[{top}]")
+            if dest_point is None:
+                msgs.append("Aviso: destino sin coordenadas → no se pueden calcular km de cercanía (agrega ZIP en CITY_ZIPS o coords de ciudad en GEO_LOCATIONS/CITY_COORDS)")
+
+        # POL/POD distances for audit if we have endpoints
+        pol_pair = pod_pair = None
+        try:
+            if pol and origin_point is not None:
+                plat_a, plon_a = _port_coords_for_distance(oc, pol, origin_point)
+                if plat_a is not None and plon_a is not None:
+                    pol_pair = ((plat_a, plon_a), origin_point)
+            if pod and dest_point is not None:
+                dlat_a, dlon_a = _port_coords_for_distance(dc, pod, dest_point)
+                if dlat_a is not None and dlon_a is not None:
+                    pod_pair = ((dlat_a, dlon_a), dest_point)
+        except Exception:
+            pass
+        return pol, pod, msgs, pol_pair, pod_pair
+
+    def _route_legs_inland(oc, dc, origin_city, origin_zip, dest_city, dest_zip, supplier_canon, dest_plant_canon):
+        """Inland: road from origin location to destination location."""
+        msgs = []
+        # Validate/enrich ZIPs from City+Country if needed
+        ozip, oreason = validate_and_enrich_zip(oc, origin_city, origin_zip)
+        if oreason:
+            msgs.append(f"ZIP origen corregido por {oreason}: {origin_zip}→{ozip}")
+        dzip, dreason = validate_and_enrich_zip(dc, dest_city, dest_zip)
+        if dreason:
+            msgs.append(f"ZIP destino corregido por {dreason}: {dest_zip}→{dzip}")
+        olat, olon, osrc = _resolve_point(geo, oc, zip_code=ozip, city=origin_city, plant=supplier_canon)
+        dlat, dlon, dsrc = _resolve_point(geo, dc, zip_code=dzip, city=dest_city, plant=dest_plant_canon)
+        if (olat is None or olon is None) and ozip:
+            la, lo = _zip_coords_from_db(oc, ozip)
+            if la is not None:
+                olat, olon, osrc = la, lo, "zip_coords_db"
+        if olat is None and origin_city:
+            la, lo = _city_coords_from_db(oc, origin_city)
+            if la is not None:
+                olat, olon, osrc = la, lo, "geo_city_fallback"
+        if (dlat is None or dlon is None) and dzip:
+            la, lo = _zip_coords_from_db(dc, dzip)
+            if la is not None:
+                dlat, dlon, dsrc = la, lo, "zip_coords_db"
+        if dlat is None and dest_city:
+            la, lo = _city_coords_from_db(dc, dest_city)
+            if la is not None:
+                dlat, dlon, dsrc = la, lo, "geo_city_fallback"
+        leg1_pair = None
+        if olat is not None and dlat is not None:
+            leg1_pair = ((olat, olon), (dlat, dlon))
+            msgs.append(f"Leg1 km dinámico ({osrc}→{dsrc})")
+        else:
+            msgs.append("No se pudo calcular Leg1: faltan coordenadas (origen/destino)")
+        return msgs, leg1_pair, None
+
+    def _route_legs_overseas(oc, dc, origin_city, origin_zip, dest_city, dest_zip, supplier_canon, dest_plant_canon, pol, pod):
+        """Overseas: Leg1 origin -> POL and Leg3 POD -> destination plant."""
+        msgs = []
+        oc_city_clean, oc_zip_enriched, parse_note = _parse_city_zip(origin_city, origin_zip)
+        if parse_note:
+            msgs.append(parse_note)
+        oc_city_norm = _normalize_city_for_country(oc, oc_city_clean)
+        # Validate/enrich ZIP for origin using city+country if invalid/missing
+        oc_zip_final, zip_reason = validate_and_enrich_zip(oc, oc_city_clean, oc_zip_enriched)
+        if zip_reason:
+            msgs.append(f"ZIP origen corregido por {zip_reason}: {oc_zip_enriched or '-'}→{oc_zip_final}")
+
+        # Robust resolver for origin: try ZIP → cleaned city → supplier plant
+        olat = olon = None
+        osrc = ""
+        tried = []
+        if oc_zip_final:
+            lat, lon, src = _resolve_point(geo, oc, zip_code=oc_zip_final)
+            tried.append(f"zip:{oc_zip_final}")
+            # Accept ZIP resolution from both local GEO ZIP and pgeocode ZIP fallbacks.
+            if lat is not None and src.startswith(("zip:", "pgeocode_zip:")):
+                olat, olon, osrc = lat, lon, src
+            elif olat is None:
+                la, lo = _zip_coords_from_db(oc, oc_zip_final)
                 if la is not None:
-                    t_lat_pre, t_lon_pre = la, lo
-                    debug_msgs.append("Destino resuelto por zip_coords_db")
-            if t_lat_pre is None:
-                # Fallback B: DB city coordinates
-                t_lat2, t_lon2 = _city_coords_from_db(dc, dc_city_clean_pre)
-                if t_lat2 is not None:
-                    t_lat_pre, t_lon_pre = t_lat2, t_lon2
-                    debug_msgs.append("Destino resuelto por geo_city_fallback")
-            if t_lat_pre is None:
-                la, lo, used = _city_coords_online(dc, dc_city_clean_pre)
-                if used and la is not None:
-                    t_lat_pre, t_lon_pre = la, lo
-                    debug_msgs.append("Destino resuelto por nominatim (online)")
-            dest_point = (t_lat_pre, t_lon_pre) if t_lat_pre is not None else None
-
-            # Select POL/POD from Ports Locations by proximity to origin/destination
-            pol_cands_debug = _ports_candidates_debug(oc, origin_point)
-            pod_cands_debug = _ports_candidates_debug(dc, dest_point)
-            pol, why_pol = select_port_nearest_from_ports_locations(oc, origin_point, side="POL")
-            pod, why_pod = select_port_nearest_from_ports_locations(dc, dest_point, side="POD")
-            if pol:
-                debug_msgs.append(f"POL elegido por {why_pol}: {pol}")
-            else:
-                debug_msgs.append("Falta POL (Ports Locations no tiene candidatos para el país de origen)")
-            if pod:
-                debug_msgs.append(f"POD elegido por {why_pod}: {pod}")
-            else:
-                debug_msgs.append("Falta POD (Ports Locations no tiene candidatos para el país de destino)")
-            # Add top-3 proximity candidates to Debug for traceability
-            if pol_cands_debug:
-                top = ", ".join([f"{d['code']}:{'?' if d['km'] is None else d['km']}km" for d in pol_cands_debug[:3]])
-                debug_msgs.append(f"POL candidatos={len(pol_cands_debug)} top3[{top}]")
-                if origin_point is None:
-                    debug_msgs.append("Aviso: origen sin coordenadas → no se pueden calcular km de cercanía (agrega ZIP en CITY_ZIPS o coords de ciudad en GEO_LOCATIONS/CITY_COORDS)")
-            if pod_cands_debug:
-                top = ", ".join([f"{d['code']}:{'?' if d['km'] is None else d['km']}km" for d in pod_cands_debug[:3]])
-                debug_msgs.append(f"POD candidatos={len(pod_cands_debug)} top3[{top}]")
-                if dest_point is None:
-                    debug_msgs.append("Aviso: destino sin coordenadas → no se pueden calcular km de cercanía (agrega ZIP en CITY_ZIPS o coords de ciudad en GEO_LOCATIONS/CITY_COORDS)")
-
-            # Now, lookup Rate and TT for the chosen POL/POD pair
-            ocean_rate, tt_days = get_ocean_rate_and_tt(pol, pod) if pol and pod else (None, None)
-            # Compute POL/POD distances for audit if we have endpoints
+                    olat, olon, osrc = la, lo, "zip_coords_db"
+        if olat is None and oc_city_norm:
+            lat, lon, src = _resolve_point(geo, oc, city=oc_city_norm)
+            tried.append(f"city:{oc_city_norm}")
+            if lat is not None and src.startswith(("city:", "pgeocode_city_exact:", "pgeocode_city_contains:")):
+                olat, olon, osrc = lat, lon, src
+        # City alias fallback from database (e.g., Mundhwa -> Pune)
+        if olat is None and oc_city_norm:
+            alias = _city_alias(oc, oc_city_norm)
+            if alias:
+                lat, lon, src = _resolve_point(geo, oc, city=alias)
+                tried.append(f"city-alias:{oc_city_norm}->{alias}")
+                if lat is not None and src.startswith(("city:", "pgeocode_city_exact:", "pgeocode_city_contains:")):
+                    olat, olon, osrc = lat, lon, src + "(alias)"
+        if olat is None and supplier_canon:
+            lat, lon, src = _resolve_point(geo, oc, plant=supplier_canon)
+            tried.append(f"plant:{supplier_canon}")
+            if lat is not None and src.startswith("plant:"):
+                olat, olon, osrc = lat, lon, src
+        # No HORSE-PUERTO fallback for city-level geocoding: use database city coords only
+        # Last resort: city coordinates from database sheet (GEO_LOCATIONS/CITY_COORDS)
+        if olat is None and oc_city_norm:
             try:
-                if pol and origin_point is not None:
-                    plat_a, plon_a = _port_coords_for_distance(oc, pol, origin_point)
-                    if plat_a is not None and plon_a is not None:
-                        pol_distance_km = road_km_between((plat_a, plon_a), origin_point)
-                if pod and dest_point is not None:
-                    dlat_a, dlon_a = _port_coords_for_distance(dc, pod, dest_point)
-                    if dlat_a is not None and dlon_a is not None:
-                        pod_distance_km = road_km_between((dlat_a, dlon_a), dest_point)
+                if df_geo_cities is not None and not df_geo_cities.empty:
+                    cc_u = (oc or "").strip().upper()
+                    key_u = oc_city_norm.strip().upper()
+                    cols = {c.lower().strip(): c for c in df_geo_cities.columns}
+                    cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
+                    city_col = cols.get("city") or "City"
+                    lat_col = cols.get("lat") or cols.get("latitude") or "Lat"
+                    lon_col = cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long"
+                    m = df_geo_cities[
+                        df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
+                        df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(key_u)
+                    ]
+                    if not m.empty:
+                        la = m.iloc[0].get(lat_col); lo = m.iloc[0].get(lon_col)
+                        if pd.notna(la) and pd.notna(lo):
+                            olat, olon = float(la), float(lo)
+                            osrc = "geo_city"
+                    if olat is None:
+                        # Try alias via CITY_ALIASES sheet
+                        alias = _city_alias(oc, oc_city_clean)
+                        if alias:
+                            m2 = df_geo_cities[
+                                df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
+                                df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(alias.strip().upper())
+                            ]
+                            if not m2.empty:
+                                la = m2.iloc[0].get(lat_col); lo = m2.iloc[0].get(lon_col)
+                                if pd.notna(la) and pd.notna(lo):
+                                    olat, olon = float(la), float(lo)
+                                    osrc = "geo_city(alias)"
             except Exception:
                 pass
-
-            if pol and pod and ocean_rate is None:
-                debug_msgs.append("Falta tarifa leg2 (ocean) para el par en MAIN PORTS")
-            if pol and pod and tt_days is None:
-                debug_msgs.append("Falta TT leg2 para el par en VTT DATA / MAIN PORTS / TRANSITTIME")
+        if olat is None and oc_city_norm:
+            # Last attempt: Online (Nominatim) if allowed
+            la, lo, used = _city_coords_online(oc, oc_city_norm)
+            if used and la is not None:
+                olat, olon, osrc = la, lo, "nominatim"
+        if olat is None:
+            # Last-resort backup: country centroid (if available in GEO index)
+            la, lo, src = _resolve_point(geo, oc)
+            if la is not None and src.startswith("country:"):
+                olat, olon, osrc = la, lo, src
+                msgs.append("Origen resuelto por centro de país (backup)")
+        if olat is None:
+            msgs.append("Origen no resuelto: intentos " + ", ".join(tried) if tried else "Origen no resuelto (sin datos)")
+
+        # POL point
+        plat, plon, psrc = _resolve_point(geo, oc, port=pol) if pol else (None, None, "")
+        if plat is None and pol:
+            # Fallback: use coordinates directly from Ports Locations regardless of country filter
+            f_lat, f_lon = _port_coords_from_ports_locations(pol)
+            if f_lat is not None:
+                b_lat, b_lon, tag = _best_port_coords_for_origin((olat, olon) if olat is not None else None, f_lat, f_lon)
+                plat, plon, psrc = b_lat, b_lon, tag
+        leg1_pair = None
+        if olat is not None and plat is not None:
+            leg1_pair = ((olat, olon), (plat, plon))
+            # Brief computation hint (approx haversine*road factor), filled in once distances are computed
+            msgs.append(("leg1", f"Leg1 km dinámico ({osrc}→{psrc}) ≈ ", f"*{ROAD_FACTOR:.2f}"))
         else:
-            pol = ""
-            pod = ""
-            ocean_rate, tt_days = None, None
-        # €/km lookups + Transit Time by flow
-        if str(type_of_flow).strip().upper() == "INLAND":
-            eurpkm_leg1 = road_pair_eur_per_km if road_pair_eur_per_km is not None else get_pair_eur_per_km(oc, dc)
-            eurpkm_leg3 = None
-            transit_time_days = road_pair_tt_days if road_pair_tt_days is not None else get_pair_tt_road(oc, dc)
+            if olat is None and plat is None:
+                msgs.append("No se pudo calcular Leg1: faltan coordenadas de origen y POL")
+            elif olat is None:
+                msgs.append("No se pudo calcular Leg1: falta coordenada de origen")
+            else:
+                msgs.append("No se pudo calcular Leg1: falta coordenada de POL")
+        # Leg3: parse and validate/enrich destination ZIP similarly
+        dc_city_clean, dc_zip_parsed, _ = _parse_city_zip(dest_city, dest_zip)
+        dzip_final, dzip_reason = validate_and_enrich_zip(dc, dc_city_clean, dc_zip_parsed)
+        if dzip_reason:
+            msgs.append(f"ZIP destino corregido por {dzip_reason}: {dc_zip_parsed or '-'}→{dzip_final}")
+        tlat, tlon, tsrc = _resolve_point(geo, dc, zip_code=dzip_final, city=dc_city_clean, plant=dest_plant_canon)
+        if (tlat is None or tlon is None) and dzip_final:
+            la, lo = _zip_coords_from_db(dc, dzip_final)
+            if la is not None:
+                tlat, tlon, tsrc = la, lo, "zip_coords_db"
+        if tlat is None and dc_city_clean:
+            la, lo, used = _city_coords_online(dc, dc_city_clean)
+            if used and la is not None:
+                tlat, tlon, tsrc = la, lo, "nominatim"
+        # POD point -> destination plant (swap-guard against this route's destination)
+        dplat, dplon, dpsrc = _resolve_point(geo, dc, port=pod) if pod else (None, None, "")
+        if dplat is None and pod:
+            f_lat, f_lon = _port_coords_from_ports_locations(pod)
+            if f_lat is not None:
+                b_lat, b_lon, tag = _best_port_coords_for_origin((tlat, tlon) if tlat is not None else None, f_lat, f_lon)
+                dplat, dplon, dpsrc = b_lat, b_lon, tag
+        leg3_pair = None
+        if dplat is not None and tlat is not None:
+            leg3_pair = ((dplat, dplon), (tlat, tlon))
+            msgs.append(f"Leg3 km dinámico ({dpsrc}→{tsrc})")
         else:
-            eurpkm_leg1 = get_domestic_eur_per_km(oc)
-            eurpkm_leg3 = get_domestic_eur_per_km(dc)
-            transit_time_days = tt_days
-
-            # Business rule: for CIF/FOB/FCA maritime routes with POL/POD,
-            # prefer HORSE-PUERTO Eur/km (Plant + POL/POD), but keep COSTPERKM
-            # as fallback when the plant/port combination is missing.
-            if incoterm_row in {"CIF", "FOB", "FCA"} and pol and pod:
-                hp_leg1 = get_hp_eur_per_km(supplier_canon, str(pol))
-                hp_leg3 = get_hp_eur_per_km(dest_plant_canon, str(pod))
-                if hp_leg1 is None:
-                    if eurpkm_leg1 is not None:
-                        debug_msgs.append("Falta Eur/km HORSE-PUERTO para leg1 (Plant+POL); se usa COSTPERKM")
-                    else:
-                        debug_msgs.append("Falta Eur/km HORSE-PUERTO para leg1 (Plant+POL)")
-                else:
-                    eurpkm_leg1 = hp_leg1
-                if hp_leg3 is None:
-                    if eurpkm_leg3 is not None:
-                        debug_msgs.append("Falta Eur/km HORSE-PUERTO para leg3 (Plant+POD); se usa COSTPERKM")
-                    else:
-                        debug_msgs.append("Falta Eur/km HORSE-PUERTO para leg3 (Plant+POD)")
-                else:
-                    eurpkm_leg3 = hp_leg3
+            msgs.append("No se pudo calcular Leg3: faltan coordenadas (POD/destino)")
+        return msgs, leg1_pair, leg3_pair
+
+    def _route_dap(oc, dc, origin_city, origin_zip, dest_city, dest_zip, supplier_canon, dest_plant_canon):
+        """DAP: origin → destination plant distance for visibility, even if buyer pays 0."""
+        try:
+            olat, olon, osrc = _resolve_point(geo, oc, zip_code=origin_zip, city=origin_city, plant=supplier_canon)
+            tlat, tlon, tsrc = _resolve_point(geo, dc, zip_code=dest_zip, city=dest_city, plant=dest_plant_canon)
+            if olat is not None and tlat is not None:
+                return ((olat, olon), (tlat, tlon)), ("dap", f"DAP distancia origen→destino ({osrc}→{tsrc}): ", " km")
+        except Exception:
+            pass
+        return None, None
 
+    def _route(key) -> dict:
+        """Resolve one route (POL/POD, leg endpoints and their debug notes)."""
+        flow_u, is_dap, *place = key
+        out = {"pol": "", "pod": "", "msgs_ports": [], "msgs_dap": [],
+               "pairs": {k: None for k in ("pol", "pod", "leg1", "leg3", "dap")}}
+        pairs = out["pairs"]
+        # Determine ports whenever flow is Overseas (even if buyer doesn't pay leg 2)
+        if flow_u == "OVERSEAS":
+            out["pol"], out["pod"], out["msgs_ports"], pairs["pol"], pairs["pod"] = _route_ports(*place)
         # KM computation (fully dynamic via coordinates)
-        leg1_km = None
-        leg3_km = None
-        if str(type_of_flow).strip().upper() == "INLAND":
-            # Road from origin location to destination location
-            # Validate/enrich ZIPs from City+Country if needed
-            ozip, oreason = validate_and_enrich_zip(oc, origin_city, origin_zip)
-            if oreason:
-                debug_msgs.append(f"ZIP origen corregido por {oreason}: {origin_zip}→{ozip}")
-            dzip, dreason = validate_and_enrich_zip(dc, dest_city, dest_zip)
-            if dreason:
-                debug_msgs.append(f"ZIP destino corregido por {dreason}: {dest_zip}→{dzip}")
-            olat, olon, osrc = resolve_point(geo, oc, zip_code=ozip, city=origin_city, plant=supplier_canon)
-            dlat, dlon, dsrc = resolve_point(geo, dc, zip_code=dzip, city=dest_city, plant=dest_plant_canon)
-            if (olat is None or olon is None) and ozip:
-                la, lo = _zip_coords_from_db(oc, ozip)
-                if la is not None:
-                    olat, olon, osrc = la, lo, "zip_coords_db"
-            if olat is None and origin_city:
-                la, lo = _city_coords_from_db(oc, origin_city)
-                if la is not None:
-                    olat, olon, osrc = la, lo, "geo_city_fallback"
-            if (dlat is None or dlon is None) and dzip:
-                la, lo = _zip_coords_from_db(dc, dzip)
-                if la is not None:
-                    dlat, dlon, dsrc = la, lo, "zip_coords_db"
-            if dlat is None and dest_city:
-                la, lo = _city_coords_from_db(dc, dest_city)
-                if la is not None:
-                    dlat, dlon, dsrc = la, lo, "geo_city_fallback"
-            if olat is not None and dlat is not None:
-                leg1_km = road_km_between((olat, olon), (dlat, dlon))
-                debug_msgs.append(f"Leg1 km dinámico ({osrc}→{dsrc})")
-            else:
-                debug_msgs.append("No se pudo calcular Leg1: faltan coordenadas (origen/destino)")
+        if flow_u == "INLAND":
+            out["msgs_km"], pairs["leg1"], pairs["leg3"] = _route_legs_inland(*place)
         else:
-            # Overseas
-            # Leg1: origin -> POL
-            oc_city_clean, oc_zip_enriched, parse_note = _parse_city_zip(origin_city, origin_zip)
-            if parse_note:
-                debug_msgs.append(parse_note)
-            oc_city_norm = _normalize_city_for_country(oc, oc_city_clean)
-            # Validate/enrich ZIP for origin using city+country if invalid/missing
-            oc_zip_final, zip_reason = validate_and_enrich_zip(oc, oc_city_clean, oc_zip_enriched)
-            if zip_reason:
-                debug_msgs.append(f"ZIP origen corregido por {zip_reason}: {oc_zip_enriched or '-'}→{oc_zip_final}")
-
-            # Robust resolver for origin: try ZIP → cleaned city → supplier plant
-            olat = olon = None
-            osrc = ""
-            tried = []
-            if oc_zip_final:
-                lat, lon, src = resolve_point(geo, oc, zip_code=oc_zip_final)
-                tried.append(f"zip:{oc_zip_final}")
-                # Accept ZIP resolution from both local GEO ZIP and pgeocode ZIP fallbacks.
-                if lat is not None and src.startswith(("zip:", "pgeocode_zip:")):
-                    olat, olon, osrc = lat, lon, src
-                elif olat is None:
-                    la, lo = _zip_coords_from_db(oc, oc_zip_final)
-                    if la is not None:
-                        olat, olon, osrc = la, lo, "zip_coords_db"
-            if olat is None and oc_city_norm:
-                lat, lon, src = resolve_point(geo, oc, city=oc_city_norm)
-                tried.append(f"city:{oc_city_norm}")
-                if lat is not None and src.startswith(("city:", "pgeocode_city_exact:", "pgeocode_city_contains:")):
-                    olat, olon, osrc = lat, lon, src
-            # City alias fallback from database (e.g., Mundhwa -> Pune)
-            if olat is None and oc_city_norm:
-                alias = _city_alias(oc, oc_city_norm)
-                if alias:
-                    lat, lon, src = resolve_point(geo, oc, city=alias)
-                    tried.append(f"city-alias:{oc_city_norm}->{alias}")
-                    if lat is not None and src.startswith(("city:", "pgeocode_city_exact:", "pgeocode_city_contains:")):
-                        olat, olon, osrc = lat, lon, src + "(alias)"
-            if olat is None and supplier_canon:
-                lat, lon, src = resolve_point(geo, oc, plant=supplier_canon)
-                tried.append(f"plant:{supplier_canon}")
-                if lat is not None and src.startswith("plant:"):
-                    olat, olon, osrc = lat, lon, src
-            # No HORSE-PUERTO fallback for city-level geocoding: use database city coords only
-            # Last resort: city coordinates from database sheet (GEO_LOCATIONS/CITY_COORDS)
-            if olat is None and oc_city_norm:
-                try:
-                    if df_geo_cities is not None and not df_geo_cities.empty:
-                        cc_u = (oc or "").strip().upper()
-                        key_u = oc_city_norm.strip().upper()
-                        cols = {c.lower().strip(): c for c in df_geo_cities.columns}
-                        cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
-                        city_col = cols.get("city") or "City"
-                        lat_col = cols.get("lat") or cols.get("latitude") or "Lat"
-                        lon_col = cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long"
-                        m = df_geo_cities[
-                            df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                            df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(key_u)
-                        ]
-                        if not m.empty:
-                            la = m.iloc[0].get(lat_col); lo = m.iloc[0].get(lon_col)
-                            if pd.notna(la) and pd.notna(lo):
-                                olat, olon = float(la), float(lo)
-                                osrc = "geo_city"
-                        if olat is None:
-                            # Try alias via CITY_ALIASES sheet
-                            alias = _city_alias(oc, oc_city_clean)
-                            if alias:
-                                m2 = df_geo_cities[
-                                    df_geo_cities.get(cc_col, pd.Series()).astype(str).str.upper().eq(cc_u) &
-                                    df_geo_cities.get(city_col, pd.Series()).astype(str).str.strip().str.upper().eq(alias.strip().upper())
-                                ]
-                                if not m2.empty:
-                                    la = m2.iloc[0].get(lat_col); lo = m2.iloc[0].get(lon_col)
-                                    if pd.notna(la) and pd.notna(lo):
-                                        olat, olon = float(la), float(lo)
-                                        osrc = "geo_city(alias)"
-                except Exception:
-                    pass
-            if olat is None and oc_city_norm:
-                # Last attempt: Online (Nominatim) if allowed
-                la, lo, used = _city_coords_online(oc, oc_city_norm)
-                if used and la is not None:
-                    olat, olon, osrc = la, lo, "nominatim"
-            if olat is None:
-                # Last-resort backup: country centroid (if available in GEO index)
-                la, lo, src = resolve_point(geo, oc)
-                if la is not None and src.startswith("country:"):
-                    olat, olon, osrc = la, lo, src
-                    debug_msgs.append("Origen resuelto por centro de país (backup)")
-            if olat is None:
-                debug_msgs.append("Origen no resuelto: intentos " + ", ".join(tried) if tried else "Origen no resuelto (sin datos)")
-
-            # POL point
-            plat, plon, psrc = resolve_point(geo, oc, port=pol) if pol else (None, None, "")
-            if plat is None and pol:
-                # Fallback: use coordinates directly from Ports Locations regardless of country filter
-                f_lat, f_lon = _port_coords_from_ports_locations(pol)
-                if f_lat is not None:
-                    b_lat, b_lon, tag = _best_port_coords_for_origin((olat, olon) if olat is not None else None, f_lat, f_lon)
-                    plat, plon, psrc = b_lat, b_lon, tag
-            if olat is not None and plat is not None:
-                leg1_km = road_km_between((olat, olon), (plat, plon))
-                # Add brief computation hint (approx haversine*1.30)
-                try:
-                    approx_geo = float(leg1_km) / 1.30
-                    debug_msgs.append(f"Leg1 km dinámico ({osrc}→{psrc}) ≈ {approx_geo:.0f}*1.30")
-                except Exception:
-                    debug_msgs.append(f"Leg1 km dinámico ({osrc}→{psrc})")
+            out["msgs_km"], pairs["leg1"], pairs["leg3"] = _route_legs_overseas(*place, out["pol"], out["pod"])
+        if is_dap:
+            pairs["dap"], dap_note = _route_dap(*place)
+            if dap_note:
+                out["msgs_dap"].append(dap_note)
+        return out
+
+    def _prefetch_city_matches(keys) -> None:
+        """Fuzzy-match every route city missing from CITY_ZIPS / GEO_LOCATIONS in one batch per country."""
+        zip_q: dict[str, set] = {}
+        geo_q: dict[str, set] = {}
+        for key in keys:
+            for cc, city, zip_code in ((key[2], key[4], key[5]), (key[3], key[6], key[7])):
+                clean = _parse_city_zip(city, zip_code)[0]
+                zip_q.setdefault(cc, set()).add((clean or "").strip().upper())
+                geo_q.setdefault(cc, set()).update((clean, city))
+        for name, df, queries in (("city_zips", df_city_zips, zip_q), ("geo_cities", df_geo_cities, geo_q)):
+            if df is None or df.empty:
+                continue
+            table = _city_table(name, df)
+            if table.ok:
+                for cc, cities in queries.items():
+                    table.fuzzy_many(cc, list(cities))
+
+    # Rows sharing supplier location, destination plant and flow are resolved once
+    route_keys = [
+        (flows_u[i], incoterms[i] == "DAP", ocs[i], dcs[i], origin_cities[i], origin_zips[i],
+         dest_cities[i], dest_zips[i], supplier_canons[i], dest_plant_canons[i])
+        for i in range(n_rows)
+    ]
+    route_index: dict = {}
+    route_of_row = [route_index.setdefault(k, len(route_index)) for k in route_keys]
+    _prefetch_city_matches(route_index)
+    routes = [_route(k) for k in route_index]
+    geo_store.flush()
+    route_stats = {"routes": len(routes), "hits": n_rows - len(routes), "misses": len(routes)}
+    pols = [routes[r]["pol"] for r in route_of_row]
+    pods = [routes[r]["pod"] for r in route_of_row]
+    msgs_ports = [routes[r]["msgs_ports"] for r in route_of_row]
+    msgs_km = [routes[r]["msgs_km"] for r in route_of_row]
+    msgs_dap = [routes[r]["msgs_dap"] for r in route_of_row]
+
+    clock.lap("routes")
+
+    # Stage 7: ocean rate / TT per POL-POD lane
+    rate_tt = _map_unique(
+        list(zip(pols, pods)),
+        lambda k: get_ocean_rate_and_tt(*k) if k[0] and k[1] else (None, None),
+    )
+    msgs_rate = [[] for _ in range(n_rows)]
+    for i in range(n_rows):
+        if flows_u[i] == "OVERSEAS" and pols[i] and pods[i]:
+            if rate_tt[i][0] is None:
+                msgs_rate[i].append("Falta tarifa leg2 (ocean) para el par en MAIN PORTS")
+            if rate_tt[i][1] is None:
+                msgs_rate[i].append("Falta TT leg2 para el par en VTT DATA / MAIN PORTS / TRANSITTIME")
+
+    clock.lap("rates")
+
+    # Stage 8: €/km per leg (COSTPERKM, HORSE-PUERTO for CIF/FOB/FCA maritime routes)
+    domestic_eur = {cc: get_domestic_eur_per_km(cc) for cc in set(ocs) | set(dcs)}
+    hp_eur = {}
+
+    def _hp(plant_canon, port):
+        key = (plant_canon, port)
+        if key not in hp_eur:
+            hp_eur[key] = get_hp_eur_per_km(plant_canon, port)
+        return hp_eur[key]
+
+    eur_leg1 = [None] * n_rows
+    eur_leg3 = [None] * n_rows
+    transit_days = [None] * n_rows
+    msgs_hp = [[] for _ in range(n_rows)]
+    for i in range(n_rows):
+        if flows_u[i] == "INLAND":
+            eur_leg1[i], transit_days[i] = road_pairs[i]
+            continue
+        eur_leg1[i] = domestic_eur[ocs[i]]
+        eur_leg3[i] = domestic_eur[dcs[i]]
+        transit_days[i] = rate_tt[i][1]
+        # Business rule: for CIF/FOB/FCA maritime routes with POL/POD,
+        # prefer HORSE-PUERTO Eur/km (Plant + POL/POD), but keep COSTPERKM
+        # as fallback when the plant/port combination is missing.
+        if incoterms[i] in {"CIF", "FOB", "FCA"} and pols[i] and pods[i]:
+            hp_leg1 = _hp(supplier_canons[i], str(pols[i]))
+            hp_leg3 = _hp(dest_plant_canons[i], str(pods[i]))
+            if hp_leg1 is None:
+                if eur_leg1[i] is not None:
+                    msgs_hp[i].append("Falta Eur/km HORSE-PUERTO para leg1 (Plant+POL); se usa COSTPERKM")
+                else:
+                    msgs_hp[i].append("Falta Eur/km HORSE-PUERTO para leg1 (Plant+POL)")
             else:
-                if olat is None and plat is None:
-                    debug_msgs.append("No se pudo calcular Leg1: faltan coordenadas de origen y POL")
-                elif olat is None:
-                    debug_msgs.append("No se pudo calcular Leg1: falta coordenada de origen")
+                eur_leg1[i] = hp_leg1
+            if hp_leg3 is None:
+                if eur_leg3[i] is not None:
+                    msgs_hp[i].append("Falta Eur/km HORSE-PUERTO para leg3 (Plant+POD); se usa COSTPERKM")
                 else:
-                    debug_msgs.append("No se pudo calcular Leg1: falta coordenada de POL")
-            # Leg3: POD -> destination plant
-            dplat, dplon, dpsrc = resolve_point(geo, dc, port=pod) if pod else (None, None, "")
-            if dplat is None and pod:
-                f_lat, f_lon = _port_coords_from_ports_locations(pod)
-                if f_lat is not None:
-                    b_lat, b_lon, tag = _best_port_coords_for_origin((tlat, tlon) if 'tlat' in locals() and tlat is not None else None, f_lat, f_lon)
-                    dplat, dplon, dpsrc = b_lat, b_lon, tag
-            # Parse and validate/enrich destination ZIP similarly
-            dc_city_clean, dc_zip_parsed, _ = _parse_city_zip(dest_city, dest_zip)
-            dzip_final, dzip_reason = validate_and_enrich_zip(dc, dc_city_clean, dc_zip_parsed)
-            if dzip_reason:
-                debug_msgs.append(f"ZIP destino corregido por {dzip_reason}: {dc_zip_parsed or '-'}→{dzip_final}")
-            tlat, tlon, tsrc = resolve_point(geo, dc, zip_code=dzip_final, city=dc_city_clean, plant=dest_plant_canon)
-            if (tlat is None or tlon is None) and dzip_final:
-                la, lo = _zip_coords_from_db(dc, dzip_final)
-                if la is not None:
-                    tlat, tlon, tsrc = la, lo, "zip_coords_db"
-            if tlat is None and dc_city_clean:
-                la, lo, used = _city_coords_online(dc, dc_city_clean)
-                if used and la is not None:
-                    tlat, tlon, tsrc = la, lo, "nominatim"
-            if dplat is not None and tlat is not None:
-                leg3_km = road_km_between((dplat, dplon), (tlat, tlon))
-                debug_msgs.append(f"Leg3 km dinámico ({dpsrc}→{tsrc})")
+                    msgs_hp[i].append("Falta Eur/km HORSE-PUERTO para leg3 (Plant+POD)")
             else:
-                debug_msgs.append("No se pudo calcular Leg3: faltan coordenadas (POD/destino)")
-        # Special: For DAP, compute origin → destination plant distance for visibility, even if buyer pays 0
-        if incoterm_row == 'DAP':
-            try:
-                olat, olon, osrc = resolve_point(geo, oc, zip_code=origin_zip, city=origin_city, plant=supplier_canon)
-                tlat, tlon, tsrc = resolve_point(geo, dc, zip_code=dest_zip, city=dest_city, plant=dest_plant_canon)
-                if olat is not None and tlat is not None:
-                    dap_km = road_km_between((olat, olon), (tlat, tlon))
-                    debug_msgs.append(f"DAP distancia origen→destino ({osrc}→{tsrc}): {dap_km:.1f} km")
-            except Exception:
-                pass
+                eur_leg3[i] = hp_leg3
+
+    clock.lap("eur_per_km")
+
+    # Stage 9: road distances of every unique route in one vectorized haversine call
+    kinds = ("pol", "pod", "leg1", "leg3", "dap")
+    n_routes = len(routes)
+    coords = np.full((len(kinds) * n_routes, 4), np.nan)
+    for k_i, kind in enumerate(kinds):
+        for r_i, route in enumerate(routes):
+            pair = route["pairs"][kind]
+            if pair is not None:
+                (la1, lo1), (la2, lo2) = pair
+                coords[k_i * n_routes + r_i] = (la1, lo1, la2, lo2)
+    road_factor = ROAD_FACTOR
+    km_all = (road_km_many(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], road_factor=road_factor)
+              if n_routes else coords[:, 0])
+    dist_km = {}
+    for k_i, kind in enumerate(kinds):
+        block = km_all[k_i * n_routes:(k_i + 1) * n_routes]
+        route_km = [float(v) if route["pairs"][kind] is not None else None for v, route in zip(block, routes)]
+        dist_km[kind] = [route_km[r] for r in route_of_row]
+
+    def _render(msg, i: int) -> str:
+        if isinstance(msg, str):
+            return msg
+        kind, prefix, suffix = msg
+        if kind == "leg1":
+            return f"{prefix}{float(dist_km['leg1'][i]) / road_factor:.0f}{suffix}"
+        return f"{prefix}{dist_km[kind][i]:.1f}{suffix}"
+
+    clock.lap("distances")
+
+    # Stage 10: leg costs, totals and remaining red flags
+    rows = []
+    for i in range(n_rows):
+        included_legs = legs_col[i]
+        oc, dc, pol, pod = ocs[i], dcs[i], pols[i], pods[i]
+        ocean_rate, tt_days = rate_tt[i] if flows_u[i] == "OVERSEAS" else (None, None)
+        eurpkm_leg1, eurpkm_leg3 = eur_leg1[i], eur_leg3[i]
+        pol_distance_km, pod_distance_km = dist_km["pol"][i], dist_km["pod"][i]
+        leg1_km, leg3_km = dist_km["leg1"][i], dist_km["leg3"][i]
+        debug_msgs = [
+            *msgs_incoterm[i], *msgs_pkg[i], *msgs_flow[i], *msgs_ports[i], *msgs_rate[i], *msgs_hp[i],
+            *(_render(m, i) for m in msgs_km[i]), *(_render(m, i) for m in msgs_dap[i]),
+        ]
         if 1 in included_legs and eurpkm_leg1 is None:
             debug_msgs.append("Falta €/km leg1 (origen)")
         if 3 in included_legs and eurpkm_leg3 is None:
@@ -2481,7 +2496,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         if 2 in included_legs and ocean_rate is None:
             debug_msgs.append("Falta tarifa leg2 (ocean)")
         # Mostrar TT si hay par POL/POD aunque el comprador no pague leg 2
-        if str(type_of_flow).strip().upper() == "OVERSEAS" and tt_days is None:
+        if flows_u[i] == "OVERSEAS" and tt_days is None:
             debug_msgs.append("Falta TT leg2")
         # Incoterm suggestions
         try:
@@ -2499,15 +2514,16 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         for val in (leg1_cost, leg2_cost, leg3_cost):
             if isinstance(val, (int, float)) and val is not None:
                 total += float(val)
+        pkg_data = pkg_datas[i]
         rows.append({
-            "pn": pn,
-            "designation": designation,
-            "supplier_plant": supplier,
-            "incoterm": incoterm_row,
-            "type_of_flow": type_of_flow,
+            "pn": pns[i],
+            "designation": designations[i],
+            "supplier_plant": suppliers[i],
+            "incoterm": incoterms[i],
+            "type_of_flow": flows[i],
             "origin_cc": oc,
             "dest_cc": dc,
-            "dest_plant": dest_plant,
+            "dest_plant": dest_plants[i],
             "POL": pol,
             "POD": pod,
             "pol_distance_km": pol_distance_km,
@@ -2517,20 +2533,20 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             "leg1_cost_eur": leg1_cost,
             "leg2_ocean_rate_eur": ocean_rate if 2 in included_legs else None,
             # Publicar TT cuando el flujo es Overseas (aunque el comprador no pague leg2)
-            "leg2_tt_days": tt_days if str(type_of_flow).strip().upper() == "OVERSEAS" else None,
-            "transit_time_days": transit_time_days,
+            "leg2_tt_days": tt_days if flows_u[i] == "OVERSEAS" else None,
+            "transit_time_days": transit_days[i],
             "leg3_eur_per_km": eurpkm_leg3 if 3 in included_legs else None,
             "leg3_km": leg3_cost_km,
             "leg3_cost_eur": leg3_cost,
             "total_cost_eur": total,
             "Red flag/Debug": "; ".join(debug_msgs) if debug_msgs else "",
-            "packaging_code_resolved": packaging_code,
+            "packaging_code_resolved": packaging_codes[i],
             "pkg_volume_m3": pkg_data["pkg_volume_m3"],
             "pkg_snp": pkg_data["pkg_snp"],
             "pkg_weight_part": pkg_data["pkg_weight_part"],
             "pkg_weight_empty": pkg_data["pkg_weight_empty"],
             "pkg_weight_full": pkg_data["pkg_weight_full"],
-            "pack_per_cont_40ft": pack_per_container,
+            "pack_per_cont_40ft": pack_per_container_col[i],
             "notes": "Distancias dinámicas: puertos desde Ports Locations; origen/destino desde CITY_ZIPS y GEO_LOCATIONS/CITY_COORDS. Si falta coordenada, la distancia queda vacía."
         })
 
@@ -2567,18 +2583,15 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
     part_vol_m3 = (pkg_vol_m3_out / pkg_snp_out).where(pkg_snp_out > 0)
     plant_to_plant_eur_m3 = (total_cost_eur / vol_per_cont_m3).where(vol_per_cont_m3 > 0)
     plant_to_plant_eur_part = (part_vol_m3 * plant_to_plant_eur_m3)
-    pn_unit_cost_eur = pd.to_numeric(raw_like_df.get("PN Unit cost (€)"), errors="coerce")
-    floating_stock_eur_part = pn_unit_cost_eur * 0.08 / 365 * pd.to_numeric(
-        quote_df.get("transit_time_days"), errors="coerce"
-    )
-    pn_unit_cost_eur_out = pn_unit_cost_eur.round(2)
+    transit_time_days = pd.to_numeric(quote_df.get("transit_time_days"), errors="coerce")
     plant_to_plant_eur_part_out = plant_to_plant_eur_part.round(2)
-    floating_stock_eur_part_out = floating_stock_eur_part.round(2)
-    pa_log_sf_total_eur_part = (pn_unit_cost_eur_out + plant_to_plant_eur_part_out + floating_stock_eur_part_out).round(2)
-    annual_needs = pd.to_numeric(raw_like_df.get("Anual Needs (PN / Year)"), errors="coerce")
-    daily_need = pd.to_numeric(raw_like_df.get("Daily Need (PN / Day)"), errors="coerce")
-    annual_weight_keur = (annual_needs * pa_log_sf_total_eur_part / 1000).round(2)
-    fcf_pipe_keur = (daily_need * pn_unit_cost_eur_out * pd.to_numeric(quote_df.get("transit_time_days"), errors="coerce") / 1000).round(2)
+    quantities = quantity_columns(
+        pd.to_numeric(raw_like_df.get("PN Unit cost (€)"), errors="coerce"),
+        transit_time_days,
+        plant_to_plant_eur_part_out,
+        pd.to_numeric(raw_like_df.get("Anual Needs (PN / Year)"), errors="coerce"),
+        pd.to_numeric(raw_like_df.get("Daily Need (PN / Day)"), errors="coerce"),
+    )
 
     computed_map = {
         "POL": quote_df.get("POL"),
@@ -2590,7 +2603,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         ).round(2),
         # Keep LEG3/POD Distance as the single Leg3 distance output
         "LEG3/POD Distance (km)": pd.to_numeric(quote_df.get("pod_distance_km"), errors="coerce").round(2),
-        "Transit Time": pd.to_numeric(quote_df.get("transit_time_days"), errors="coerce").round(2),
+        "Transit Time": transit_time_days.round(2),
         # Explicit leg cost columns
         "Leg1 Inland Cost (€)": pd.to_numeric(quote_df.get("leg1_cost_eur"), errors="coerce").fillna(0.0).round(2),
         "Leg2 Overseas Cost (€)": pd.to_numeric(quote_df.get("leg2_ocean_rate_eur"), errors="coerce").fillna(0.0).round(2),
@@ -2608,10 +2621,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         ).round(2),
         "Plant to plant (€/m3)": plant_to_plant_eur_m3.round(2),
         "Plant to plant (€/part)": plant_to_plant_eur_part_out,
-        "Floating Stock €/Part": floating_stock_eur_part_out,
-        "PA + LOG + SF TOTAL €/Part": pa_log_sf_total_eur_part.round(2),
-        "Annual weight K€": annual_weight_keur,
-        "FCF Pipe K€": fcf_pipe_keur,
+        **quantities,
         "Weight/part (kg)": pd.to_numeric(quote_df.get("pkg_weight_part"), errors="coerce").round(2),
         "Weight empty pack (kg)": pd.to_numeric(quote_df.get("pkg_weight_empty"), errors="coerce").round(2),
         "Weight full pack (kg)": pd.to_numeric(quote_df.get("pkg_weight_full"), errors="coerce").round(2),
@@ -2622,7 +2632,6 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
     }
 
     # Try to follow exact target order from reference output
-    ref_cols = _load_reference_quote_columns()
     if ref_cols:
         cols = ref_cols
     else:
@@ -2799,6 +2808,82 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         else:
             data[c] = pd.Series([""] * n)
     final_quote_df = pd.DataFrame(data, columns=cols)
+    # Unrounded transit time (quote_lane() recomputes the quantity columns from it)
+    final_quote_df.attrs["transit_time_days"] = transit_time_days.tolist()
+    clock.lap("assemble")
+    return final_quote_df, route_stats
+
+
+# Debug notes written when a point could not be geocoded (online lookup down, coordinates not yet in the data)
+_GEOCODE_GAP_NOTES = ("sin coordenadas", "faltan coordenadas", "falta coordenada")
+
+
+def _geocode_gap(row: dict) -> bool:
+    """True when the Quote row was computed without some of its coordinates."""
+    debug = row.get("Red flag/Debug")
+    return isinstance(debug, str) and any(note in debug for note in _GEOCODE_GAP_NOTES)
+
+
+def _merge_cached_rows(fresh: pd.DataFrame | None, fresh_pos: list[int], cached: dict[int, dict], n: int) -> pd.DataFrame:
+    """Quote rows in input order from freshly computed rows (at fresh_pos) and cached rows {position: row}."""
+    parts, order = [], []
+    if fresh is not None and len(fresh):
+        parts.append(fresh)
+        order.extend(fresh_pos)
+    if cached:
+        cols = list(fresh.columns) if fresh is not None else list(next(iter(cached.values())))
+        parts.append(pd.DataFrame.from_records([cached[i] for i in sorted(cached)], columns=cols))
+        order.extend(sorted(cached))
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    merged = pd.concat(parts, ignore_index=True)
+    return merged.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+
+
+def build_output(input_df: pd.DataFrame, out_path: str | IO[bytes] | None,
+                 source_workbook_path: str | IO[bytes] | bytes | None = None,
+                 use_result_cache: bool = True) -> pd.DataFrame:
+    # out_path: file path or binary file object for the workbook; None returns the quote rows only
+    # source_workbook_path: uploaded template (path, BytesIO or bytes) whose sheets are kept in the output
+    # use_result_cache: reuse Quote rows of unchanged input rows (result_store); QTOOL_RESULT_CACHE=0 disables it
+    # Stage timings (only recorded inside profiling.collect_stage_timings())
+    clock = stage_clock()
+    # Load data sources
+    data_file = find_qtool_data_file()
+    if not data_file:
+        raise FileNotFoundError("QUOTATION TOOL DATA file not found in QTool directory")
+    try:
+        # All sheets (plus VTT DATA) come from a process-wide cache, reparsed only when the files change
+        ref = load_reference_data(data_file)
+    except PermissionError as e:
+        raise PermissionError(f"No se pudo leer QUOTATION TOOL DATA (bloqueado/abierto): {data_file}") from e
+    ref_cols = _load_reference_quote_columns()
+
+    # Per-row result cache: only new or edited rows go through the quoting stages
+    n = len(input_df)
+    store = open_result_store(data_file) if use_result_cache and result_cache_enabled() and n else None
+    cached: dict[int, dict] = {}
+    keys: list[str] = []
+    if store is not None:
+        keys = row_keys(input_df, result_version(_data_stamps(ref), ref_cols))
+        hits = store.get_many(keys)
+        cached = {i: hits[k] for i, k in enumerate(keys) if k in hits}
+    clock.lap("result_cache")
+
+    todo = [i for i in range(n) if i not in cached]
+    fresh = None
+    route_stats = {"routes": 0, "hits": 0, "misses": 0}
+    if todo or not n:
+        todo_df = input_df if not cached else input_df.iloc[todo].reset_index(drop=True)
+        fresh, route_stats = _quote_frame(todo_df, data_file, ref, ref_cols, clock)
+        if store is not None:
+            # Rows with missing coordinates may only reflect a transient geocoding failure: not cached
+            store.put_many({keys[i]: row for i, row in zip(todo, fresh.to_dict("records")) if not _geocode_gap(row)})
+            store.flush()
+    final_quote_df = fresh if not cached else _merge_cached_rows(fresh, todo, cached, n)
+    if out_path is None:
+        # Quote rows only (HTTP/JSON callers): no workbook
+        return final_quote_df
 
     wb = _load_output_workbook(source_workbook_path)
 
@@ -2811,68 +2896,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
             wb.remove(wb[sheet_name])
 
     quote_ws = wb.create_sheet("Quote")
-    _write_dataframe_to_sheet(quote_ws, final_quote_df)
-
-    # Highlight all Quote headers in yellow.
-    yellow_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-    for cell in quote_ws[1]:
-        cell.fill = yellow_fill
-
-    header_to_idx = {str(c.value): i + 1 for i, c in enumerate(quote_ws[1])}
-    for row_idx in range(2, quote_ws.max_row + 1):
-        for header, formula in _quote_formula_map(header_to_idx, row_idx).items():
-            col_idx = header_to_idx.get(header)
-            if col_idx:
-                quote_ws.cell(row=row_idx, column=col_idx, value=formula)
-
-    # Adjust Quote column widths from B to AL based on content length.
-    for col_idx in range(2, 39):  # B..AL
-        max_len = 0
-        for row in quote_ws.iter_rows(min_row=1, max_row=quote_ws.max_row, min_col=col_idx, max_col=col_idx):
-            val = row[0].value
-            if val is None:
-                continue
-            txt = str(val)
-            if len(txt) > max_len:
-                max_len = len(txt)
-        quote_ws.column_dimensions[get_column_letter(col_idx)].width = max(12, min(max_len + 2, 45))
-
-    # Force 2-decimal display in key numeric result columns.
-    two_dec_cols = {
-        "Leg1/POL Distance (km)",
-        "LEG3/POD Distance (km)",
-        "Transit Time",
-        "Leg1 Inland Cost (€)",
-        "Leg2 Overseas Cost (€)",
-        "Leg 3 Inland Cost (€)",
-        "Total Transportation Cost (€)",
-        "Packaging Volume (m³)",
-        "SNP_Pack",
-        "pack/cont 40ft",
-        "vol/cont 40ft (m3)",
-        "weight/cont 40ft (kg)",
-        "Plant to plant (€/m3)",
-        "Plant to plant (€/part)",
-        "Floating Stock €/Part",
-        "PA + LOG + SF TOTAL €/Part",
-        "Annual weight K€",
-        "FCF Pipe K€",
-        "Weight/part (kg)",
-        "Weight empty pack (kg)",
-        "Weight full pack (kg)",
-    }
-    for h in two_dec_cols:
-        idx = header_to_idx.get(h)
-        if not idx:
-            continue
-        for row in quote_ws.iter_rows(min_row=2, max_row=quote_ws.max_row, min_col=idx, max_col=idx):
-            row[0].number_format = "0.00"
-
-    # Specific precision override: part volume needs 4 decimals.
-    idx_part_vol = header_to_idx.get("Part volume(m3/part)")
-    if idx_part_vol:
-        for row in quote_ws.iter_rows(min_row=2, max_row=quote_ws.max_row, min_col=idx_part_vol, max_col=idx_part_vol):
-            row[0].number_format = "0.0000"
+    _write_quote_sheet(quote_ws, final_quote_df)
 
     if "incoterm" in input_df.columns:
         inc_series = input_df["incoterm"].dropna()
@@ -2885,6 +2909,13 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         "Rows": [len(input_df)],
         "Incoterms": [incoterm_summary],
         "Note": ["Incoterm aplicado por fila (fallback al global si vacío/incorrecto)"],
+        # Route memoization: rows served from an already resolved route vs routes computed
+        "Unique routes": [route_stats["routes"]],
+        "Route cache hits": [route_stats["hits"]],
+        "Route cache misses": [route_stats["misses"]],
+        # Per-row result cache (result_store): rows reused from a previous quote vs rows computed
+        "Rows from cache": [len(cached)],
+        "Rows computed": [len(todo)],
     })
     summary_ws = wb.create_sheet("Summary")
     _write_dataframe_to_sheet(summary_ws, summary)
@@ -2903,6 +2934,7 @@ def build_output(input_df: pd.DataFrame, out_path: str, source_workbook_path: st
         pass
 
     wb.save(out_path)
+    clock.lap("xlsx_write")
     return final_quote_df
 
 
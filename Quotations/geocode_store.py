@@ -0,0 +1,220 @@
+"""Persistent geocode cache shared by every coordinate resolution path of build_output.
+
+Resolved coordinates are stored in a small SQLite file next to QUOTATION TOOL DATA, keyed
+by (source, country, lookup key), with the lookup provenance (source + tag, e.g.
+"pgeocode_zip:41015"), the data version they were computed against and timestamps.
+Offline sources are tied to the reference-data version (a new workbook simply misses, and
+rows of older versions are purged the first time a process sees the new one); online
+results expire after ONLINE_TTL_SECONDS.
+
+The whole table is read into memory when the store is opened (bulk warm-up) and new
+results are written back in one transaction by flush(). If the file cannot be created
+(read-only deployment) the store keeps working in memory only.
+
+    python -m Quotations.geocode_store stats [db]
+    python -m Quotations.geocode_store purge [db]
+    python -m Quotations.geocode_store warm <Quotation Template _INPUT.xlsx> ...
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+GEOCODE_DB_NAME = "GEOCODE_CACHE.sqlite"
+ONLINE_TTL_SECONDS = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    source     TEXT NOT NULL,
+    country    TEXT NOT NULL,
+    lookup     TEXT NOT NULL,
+    version    TEXT NOT NULL,
+    lat        REAL,
+    lon        REAL,
+    tag        TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (source, country, lookup)
+)
+"""
+
+
+def default_store_path(data_file: str | None) -> str:
+    """QTOOL_GEOCODE_DB if set, else GEOCODE_CACHE.sqlite next to the data workbook."""
+    env = os.environ.get("QTOOL_GEOCODE_DB")
+    if env:
+        return env
+    base = os.path.dirname(os.path.abspath(data_file)) if data_file else tempfile.gettempdir()
+    return os.path.join(base, GEOCODE_DB_NAME)
+
+
+def version_tag(*parts) -> str:
+    """Short, stable digest of whatever identifies the data a result was computed from."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class GeocodeStore:
+    """(source, country, lookup) -> (lat, lon, tag), persisted in SQLite, served from memory."""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.persistent = False
+        self._lock = threading.Lock()
+        self._mem: dict[tuple[str, str, str], tuple] = {}
+        self._pending: dict[tuple[str, str, str], tuple] = {}
+        self.hits = 0
+        self.misses = 0
+        self._live_version: str | None = None
+        if path:
+            try:
+                with self._connect() as conn:
+                    rows = conn.execute(
+                        "SELECT source, country, lookup, version, lat, lon, tag, created_at, expires_at FROM geocode"
+                    ).fetchall()
+                self.persistent = True
+                for source, country, lookup, *rest in rows:
+                    self._mem[(source, country, lookup)] = tuple(rest)
+            except (sqlite3.Error, OSError):
+                self.persistent = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    def get(self, source: str, version: str, country: str, lookup: str):
+        """Cached (lat, lon, tag), or None when unknown, stale or expired. lat is None for a cached miss."""
+        key = (source, (country or "").strip().upper(), lookup)
+        with self._lock:
+            rec = self._mem.get(key)
+            if rec is None or rec[0] != version or (rec[5] is not None and rec[5] < time.time()):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return rec[1], rec[2], rec[3]
+
+    def put(self, source: str, version: str, country: str, lookup: str,
+            lat: float | None, lon: float | None, tag: str = "", ttl: float | None = None) -> None:
+        now = time.time()
+        key = (source, (country or "").strip().upper(), lookup)
+        rec = (version, lat, lon, tag or "", now, (now + ttl) if ttl else None)
+        with self._lock:
+            self._mem[key] = rec
+            self._pending[key] = rec
+
+    def flush(self) -> int:
+        """Write pending results to disk in a single transaction. Returns the number of rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self.persistent:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO geocode (source, country, lookup, version, lat, lon, tag, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(*k, *v) for k, v in pending.items()],
+                )
+        except (sqlite3.Error, OSError):
+            return 0
+        return len(pending)
+
+    def purge(self, version: str | None = None) -> int:
+        """Delete expired online results and, given the current data version, offline results
+        computed against any other version. Returns the number of rows removed."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, v in self._mem.items()
+                        if (v[5] is not None and v[5] < now) or (version and v[5] is None and v[0] != version)]:
+                del self._mem[key]
+        if not self.persistent:
+            return 0
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM geocode WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)).rowcount
+            if version:
+                removed += conn.execute("DELETE FROM geocode WHERE expires_at IS NULL AND version <> ?", (version,)).rowcount
+            return removed
+
+    def retire_versions(self, version: str) -> None:
+        """purge(version) once per new data version seen by this process (rows of older versions never hit)."""
+        with self._lock:
+            if self._live_version == version:
+                return
+            self._live_version = version
+        try:
+            self.purge(version)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def stats(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        with self._lock:
+            for source, _, _ in self._mem:
+                out[source] = out.get(source, 0) + 1
+        return out
+
+
+_stores: dict[str, GeocodeStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_geocode_store(data_file: str | None = None, path: str | None = None) -> GeocodeStore:
+    """Process-wide GeocodeStore for the given workbook (opened and bulk-loaded once)."""
+    path = os.path.abspath(path or default_store_path(data_file))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = GeocodeStore(path)
+            _stores[path] = store
+        return store
+
+
+def warm_up(template_paths: list[str]) -> GeocodeStore:
+    """Resolve every location of the given input templates once so later quotes hit the store."""
+    try:
+        from .generate_quote import build_output, find_qtool_data_file  # type: ignore
+        from .qtool_loader import load_input_template  # type: ignore
+    except ImportError:
+        from Quotations.generate_quote import build_output, find_qtool_data_file  # type: ignore
+        from Quotations.qtool_loader import load_input_template  # type: ignore
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, path in enumerate(template_paths):
+            build_output(load_input_template(path, sheet="Input"), os.path.join(tmp, f"warm_{i}.xlsx"))
+    return open_geocode_store(find_qtool_data_file())
+
+
+def _cli_store(path: str | None) -> tuple[GeocodeStore, str | None]:
+    """Store for the CLI and the current offline data version (None for an explicit db path)."""
+    if path:
+        return open_geocode_store(path=path), None
+    try:
+        from .generate_quote import find_qtool_data_file, geo_data_version  # type: ignore
+        from .reference_data import load_reference_data  # type: ignore
+    except ImportError:
+        from Quotations.generate_quote import find_qtool_data_file, geo_data_version  # type: ignore
+        from Quotations.reference_data import load_reference_data  # type: ignore
+    data_file = find_qtool_data_file()
+    version = geo_data_version(load_reference_data(data_file)) if data_file else None
+    return open_geocode_store(data_file), version
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else "stats"
+    if cmd == "warm":
+        store = warm_up(args[1:])
+    else:
+        store, version = _cli_store(args[1] if len(args) > 1 else None)
+        if cmd == "purge":
+            print(f"Expired / superseded rows removed: {store.purge(version)}")
+    print(f"Geocode store: {store.path} ({'persistent' if store.persistent else 'memory only'})")
+    for source, count in sorted(store.stats().items()):
+        print(f"{count:>8}  {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Single-lane quoting for interactive what-if use (sliders, sensitivity tables).
+
+    q = quote_lane("CN", origin_city="Shanghai", dest_plant="HORSE TURKEY", incoterm="FOB",
+                   packaging_code="CAR-S*2466", unit_cost_eur=3.2, annual_needs=10000)
+    q.pol, q.pod, q.total_cost_eur, q.total_eur_part, q.notes
+
+The route part of a quote (ports, distances, transit time, leg costs, packaging and
+container fill) depends only on origin (incl. supplier plant), destination, incoterm,
+packaging code and PN. It is computed once through build_output (no workbook) and memoised
+per reference-data load; the quantity-dependent figures (unit cost, annual/daily needs) are
+then recomputed in plain Python with the same rounding as the Quote sheet. Repeated calls on
+a lane with different quantities are served in microseconds; the first call on a lane costs
+one build_output row.
+"""
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .generate_quote import build_output, find_qtool_data_file, quantity_columns
+    from .qtool_loader import normalize_input_frame
+    from .reference_data import load_reference_data
+except ImportError:
+    from Quotations.generate_quote import build_output, find_qtool_data_file, quantity_columns  # type: ignore
+    from Quotations.qtool_loader import normalize_input_frame  # type: ignore
+    from Quotations.reference_data import load_reference_data  # type: ignore
+
+
+# Route results kept per reference-data load
+LANE_CACHE_SIZE = 4096
+
+# Route key fields (standard input names) in key order
+LANE_KEY_FIELDS = (
+    "origin_country_code", "origin_country", "origin_city", "origin_zip", "supplier_plant",
+    "dest_plant", "dest_country_code", "dest_country", "dest_city", "dest_zip",
+    "incoterm", "packaging_code", "pn",
+)
+
+
+@dataclass(frozen=True)
+class LaneQuote:
+    """One quoted lane. Distances in km, costs in EUR, transit time in days; None = not available."""
+    flow: str | None
+    incoterm: str | None
+    pol: str | None
+    pod: str | None
+    leg1_km: float | None
+    leg3_km: float | None
+    transit_time_days: float | None
+    leg1_cost_eur: float | None
+    leg2_cost_eur: float | None
+    leg3_cost_eur: float | None
+    total_cost_eur: float | None
+    packaging_code: str | None
+    packaging_volume_m3: float | None
+    snp: float | None
+    part_volume_m3: float | None
+    weight_part_kg: float | None
+    weight_empty_pack_kg: float | None
+    weight_full_pack_kg: float | None
+    packs_per_container: float | None
+    container_volume_m3: float | None
+    container_weight_kg: float | None
+    eur_per_m3: float | None
+    eur_per_part: float | None
+    # Quantity-dependent (None when unit cost / needs are not given)
+    unit_cost_eur: float | None = None
+    floating_stock_eur_part: float | None = None
+    total_eur_part: float | None = None
+    annual_weight_keur: float | None = None
+    fcf_pipe_keur: float | None = None
+    notes: tuple[str, ...] = ()
+    cached: bool = False
+
+
+# Quote sheet columns
+FLOW_COL = "Type of Flow"
+DEBUG_COL = "Red flag/Debug"
+
+# LaneQuote field -> Quote sheet column
+_QUOTE_COLUMNS = {
+    "flow": FLOW_COL,
+    "incoterm": "Incoterm",
+    "pol": "POL",
+    "pod": "POD",
+    "leg1_km": "Leg1/POL Distance (km)",
+    "leg3_km": "LEG3/POD Distance (km)",
+    "transit_time_days": "Transit Time",
+    "leg1_cost_eur": "Leg1 Inland Cost (€)",
+    "leg2_cost_eur": "Leg2 Overseas Cost (€)",
+    "leg3_cost_eur": "Leg 3 Inland Cost (€)",
+    "total_cost_eur": "Total Transportation Cost (€)",
+    "packaging_code": "Packaging Code",
+    "packaging_volume_m3": "Packaging Volume (m³)",
+    "snp": "SNP_Pack",
+    "part_volume_m3": "Part volume(m3/part)",
+    "weight_part_kg": "Weight/part (kg)",
+    "weight_empty_pack_kg": "Weight empty pack (kg)",
+    "weight_full_pack_kg": "Weight full pack (kg)",
+    "packs_per_container": "pack/cont 40ft",
+    "container_volume_m3": "vol/cont 40ft (m3)",
+    "container_weight_kg": "weight/cont 40ft (kg)",
+    "eur_per_m3": "Plant to plant (€/m3)",
+    "eur_per_part": "Plant to plant (€/part)",
+}
+
+
+class _LaneCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+            return hit
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+def _clean(v):
+    """Quote cell -> plain Python (None for NaN/blank)."""
+    if v is None:
+        return None
+    if isinstance(v, (float, np.floating)):
+        return None if math.isnan(v) else float(v)
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, str):
+        return v or None
+    return v
+
+
+def _num(v) -> float:
+    try:
+        return float(v) if v is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _round2(x: float) -> float:
+    return float(np.round(x, 2))
+
+
+def _route_quote(key: tuple) -> tuple[LaneQuote, float]:
+    """Route part of the lane and its unrounded transit time (days)."""
+    row = dict(zip(LANE_KEY_FIELDS, key))
+    # Fresh rows only: cached Quote rows do not carry the unrounded transit time
+    quote = build_output(normalize_input_frame(pd.DataFrame([row])), None, use_result_cache=False)
+    rec = quote.iloc[0]
+    debug = str(rec.get(DEBUG_COL) or "")
+    route = LaneQuote(
+        **{field: _clean(rec.get(col)) for field, col in _QUOTE_COLUMNS.items()},
+        notes=tuple(n.strip() for n in debug.split(";") if n.strip()),
+    )
+    tt = quote.attrs.get("transit_time_days", [route.transit_time_days])[0]
+    return route, _num(tt)
+
+
+def _with_quantities(route: LaneQuote, transit_time_days: float, unit_cost_eur, annual_needs, daily_need) -> LaneQuote:
+    """Quantity columns of the Quote sheet (quantity_columns(), as build_output)."""
+    unit_cost = _num(unit_cost_eur)
+    q = quantity_columns(unit_cost, transit_time_days, _num(route.eur_per_part), _num(annual_needs), _num(daily_need))
+    return replace(
+        route,
+        unit_cost_eur=_clean(_round2(unit_cost)),
+        floating_stock_eur_part=_clean(float(q["Floating Stock €/Part"])),
+        total_eur_part=_clean(float(q["PA + LOG + SF TOTAL €/Part"])),
+        annual_weight_keur=_clean(float(q["Annual weight K€"])),
+        fcf_pipe_keur=_clean(float(q["FCF Pipe K€"])),
+    )
+
+
+def _key_part(v) -> str:
+    return "" if v is None else str(v).strip()
+
+
+def quote_lane(origin_country_code: str, origin_zip: str | None = None, origin_city: str | None = None,
+               dest_plant: str = "", incoterm: str | None = None, packaging_code: str | None = None,
+               pn: str | None = None, dest_country_code: str | None = None, dest_city: str | None = None,
+               dest_zip: str | None = None, origin_country: str | None = None, dest_country: str | None = None,
+               supplier_plant: str | None = None, unit_cost_eur: float | None = None, annual_needs: float | None = None,
+               daily_need: float | None = None) -> LaneQuote:
+    """Quote one lane without any workbook I/O (see module docstring)."""
+    data_file = find_qtool_data_file()
+    if not data_file:
+        raise FileNotFoundError("QUOTATION TOOL DATA file not found in QTool directory")
+    ref = load_reference_data(data_file)
+    cache = ref.derived(("lane_quotes",), lambda: _LaneCache(LANE_CACHE_SIZE))
+    key = tuple(_key_part(v) for v in (
+        origin_country_code, origin_country, origin_city, origin_zip, supplier_plant,
+        dest_plant, dest_country_code, dest_country, dest_city, dest_zip,
+        (incoterm or "").upper(), packaging_code, pn,
+    ))
+    hit = cache.get(key)
+    if hit is None:
+        route, tt = _route_quote(key)
+        cache.put(key, (route, tt))
+    else:
+        route, tt = hit
+        route = replace(route, cached=True)
+    return _with_quantities(route, tt, unit_cost_eur, annual_needs, daily_need)
@@ -0,0 +1,194 @@
+"""Hash indexes over the QUOTATION TOOL DATA tables used by the per-row lookups.
+
+build_output used to normalise a whole column (astype(str).str.strip().str.upper()) and
+filter it with a boolean mask for every input row. The indexes below are compiled once per
+ReferenceData load and map the same normalised keys to the position of the FIRST matching
+row, so every lookup keeps the original "m.iloc[0]" semantics as an O(1) dict probe.
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+def normalize_zip_token(s: str | None) -> str:
+    """Uppercase ZIP without spaces/dashes, alphanumerics only ('' when empty)."""
+    if not s:
+        return ""
+    z = str(s).strip().upper().replace(" ", "").replace("-", "")
+    # Keep only alphanumerics
+    z = "".join([ch for ch in z if ch.isalnum()])
+    return z
+
+
+def _first_positions(keys) -> dict:
+    """{key: position of the first row with that key}."""
+    out: dict = {}
+    for pos, key in enumerate(keys):
+        if key not in out:
+            out[key] = pos
+    return out
+
+
+def _col_upper_strip(df: pd.DataFrame, col: str) -> pd.Series:
+    return df[col].astype(str).str.upper().str.strip()
+
+
+def _col_strip_upper(df: pd.DataFrame, col: str) -> pd.Series:
+    return df[col].astype(str).str.strip().str.upper()
+
+
+def _cols_lookup(df: pd.DataFrame) -> dict[str, str]:
+    return {str(c).lower().strip(): c for c in df.columns}
+
+
+@dataclass
+class LookupIndexes:
+    """First-row positions keyed by the normalised lookup keys of each table.
+
+    A None index means the table or its key columns are missing (lookups return nothing).
+    """
+    # PACKAGING
+    packaging_codes: set = field(default_factory=set)               # stripped codes, as typed
+    packaging_code_canonical: dict = field(default_factory=dict)    # CODE -> first stripped code
+    packaging_by_reference: dict | None = None                      # PN -> row
+    packaging_by_code: dict | None = None                           # CODE -> row
+    # COSTPERKM (Country of origin, Destination Country)
+    cpkm_pairs: dict | None = None
+    # HORSE-PUERTO (Plant, POL/POD)
+    hp_pairs: dict | None = None
+    # VTT DATA: (POL, POD) -> min(Transit time + Time for security), None when no numeric TT
+    vtt_tt: dict | None = None
+    # MAIN PORTS / TRANSITTIME (POL, POD) -> row
+    mp_pairs: dict | None = None
+    tt_pairs: dict | None = None
+    # ZIP_COORDS (CC, ZIP) -> (lat, lon) of the first matching row
+    zip_coords: dict | None = None
+
+
+def resolve_col(df: pd.DataFrame, candidates: list[str], contains_any: list[str] | None = None) -> str | None:
+    """Same resolution rules as build_output._resolve_col (exact, then contains)."""
+    cols = [str(c) for c in df.columns]
+    lcmap = {str(c).lower().strip(): c for c in cols}
+    for cand in candidates:
+        k = cand.lower().strip()
+        if k in lcmap:
+            return lcmap[k]
+    if contains_any:
+        lower_cols = [(c, c.lower()) for c in cols]
+        for key in contains_any:
+            for orig, low in lower_cols:
+                if key.lower() in low:
+                    return orig
+    return None
+
+
+def _packaging(idx: LookupIndexes, df: pd.DataFrame) -> None:
+    if df is None or df.empty:
+        return
+    if "Packaging Code" in df.columns:
+        stripped = df["Packaging Code"].astype(str).str.strip()
+        idx.packaging_codes = set(stripped.values)
+        for code in stripped.values:
+            idx.packaging_code_canonical.setdefault(code.upper(), code)
+        idx.packaging_by_code = _first_positions(stripped.str.upper().values)
+    if "Reference" in df.columns and "Packaging Code" in df.columns:
+        idx.packaging_by_reference = _first_positions(_col_strip_upper(df, "Reference").values)
+
+
+def _vtt(df: pd.DataFrame) -> dict | None:
+    if df is None or df.empty:
+        return None
+    pol_c = resolve_col(df, ["POL"], ["pol"])
+    pod_c = resolve_col(df, ["POD"], ["pod"])
+    tt_c = resolve_col(df, ["Transit time", "Transit Time"], ["transit time", "transit"])
+    sec_c = resolve_col(df, ["Time for security"], ["time for security", "security"])
+    if not (pol_c and pod_c and tt_c):
+        return None
+    tvals = pd.to_numeric(df[tt_c], errors="coerce")
+    if sec_c and sec_c in df.columns:
+        svals = pd.to_numeric(df[sec_c], errors="coerce")
+    else:
+        svals = pd.Series([float("nan")] * len(df), index=df.index)
+    totals = (tvals.fillna(0) + svals.fillna(0)).values
+    valid = (tvals.notna() | svals.notna()).values
+    out: dict = {}
+    keys = zip(_col_upper_strip(df, pol_c).values, _col_upper_strip(df, pod_c).values)
+    for key, total, ok in zip(keys, totals, valid):
+        cur = out.get(key)
+        if ok:
+            out[key] = float(total) if cur is None else min(cur, float(total))
+        elif key not in out:
+            out[key] = None
+    return out
+
+
+def _port_pairs(df: pd.DataFrame, pol_col: str | None, pod_col: str | None) -> dict | None:
+    if df is None or df.empty:
+        return None
+    pol_c = pol_col or "POL"
+    pod_c = pod_col or "POD"
+    if pol_c not in df.columns or pod_c not in df.columns:
+        return None
+    # MAIN PORTS / TRANSITTIME are matched on upper() only (no strip), as before
+    pol_vals = df[pol_c].astype(str).str.upper().values
+    pod_vals = df[pod_c].astype(str).str.upper().values
+    return _first_positions(zip(pol_vals, pod_vals))
+
+
+def _zip_coords(df: pd.DataFrame) -> dict | None:
+    if df is None or df.empty:
+        return None
+    cols = _cols_lookup(df)
+    cc_col = cols.get("country code") or cols.get("cc") or "Country Code"
+    zip_col = cols.get("zip") or cols.get("zip code") or cols.get("postal code") or "ZIP"
+    lat_col = cols.get("lat") or cols.get("latitude") or "Lat"
+    lon_col = cols.get("lon") or cols.get("long") or cols.get("longitude") or "Long"
+    if cc_col not in df.columns or zip_col not in df.columns:
+        return None
+    ccs = df[cc_col].astype(str).str.upper().values
+    zips = [normalize_zip_token(z) for z in df[zip_col].astype(str).str.upper().values]
+    lats = df[lat_col].values if lat_col in df.columns else [None] * len(df)
+    lons = df[lon_col].values if lon_col in df.columns else [None] * len(df)
+    out: dict = {}
+    for key, la, lo in zip(zip(ccs, zips), lats, lons):
+        if key not in out:
+            out[key] = (la, lo)
+    return out
+
+
+def build_lookup_indexes(ref, pol_col_mp: str | None, pod_col_mp: str | None,
+                         pol_col_tt: str | None, pod_col_tt: str | None) -> LookupIndexes:
+    """Compile all indexes for a ReferenceData bundle (port columns as resolved by build_output)."""
+    idx = LookupIndexes()
+    _packaging(idx, ref.packaging)
+
+    df_cpkm = ref.cost_per_km
+    if df_cpkm is not None and {"Country of origin", "Destination Country"} <= set(df_cpkm.columns):
+        idx.cpkm_pairs = _first_positions(zip(
+            _col_upper_strip(df_cpkm, "Country of origin").values,
+            _col_upper_strip(df_cpkm, "Destination Country").values,
+        ))
+
+    df_hp = ref.horse_puerto
+    if df_hp is not None and not df_hp.empty:
+        cols = {str(c).lower().strip(): str(c) for c in df_hp.columns}
+        plant_col = cols.get("plant") or "Plant"
+        port_col = cols.get("pol/pod") or "POL/POD"
+        if plant_col in df_hp.columns and port_col in df_hp.columns:
+            idx.hp_pairs = _first_positions(zip(
+                _col_strip_upper(df_hp, plant_col).values,
+                _col_strip_upper(df_hp, port_col).values,
+            ))
+
+    idx.vtt_tt = _vtt(ref.vtt_routes)
+    idx.mp_pairs = _port_pairs(ref.main_ports, pol_col_mp, pod_col_mp)
+    idx.tt_pairs = _port_pairs(ref.transit_time, pol_col_tt, pod_col_tt)
+    idx.zip_coords = _zip_coords(ref.zip_coords)
+    return idx
+
+
+def cell_value(df: pd.DataFrame, pos: int, col):
+    """df.iloc[pos].get(col) without materialising the whole row."""
+    if col not in df.columns:
+        return None
+    return df[col].iat[pos]
@@ -0,0 +1,230 @@
+"""Column layout of MAIN PORTS / TRANSITTIME, detected once per reference-data load.
+
+The sheets are maintained by hand, so build_output finds its columns heuristically (exact
+names, then keyword matches, then the country columns re-scored against the UN/LOCODE
+prefix of POL/POD). Those rules live here unchanged; compile_main_ports_schema() runs them
+once per workbook version and also normalises the POL/POD country columns so that
+"rows of country X" becomes a vectorized isin() mask instead of a per-row apply().
+"""
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .lookup_index import resolve_col  # type: ignore
+except ImportError:
+    from Quotations.lookup_index import resolve_col  # type: ignore
+
+
+def normalize_country_cell(v) -> str:
+    """MAIN PORTS country cell as compared by build_output ('' for empty/falsy cells)."""
+    try:
+        if not v:
+            return ""
+    except (TypeError, ValueError):  # pd.NA and friends
+        return ""
+    return str(v).strip().upper() if v is not None and str(v).strip() != "" else ""
+
+
+def find_country_cols(df_mp: pd.DataFrame) -> tuple[str | None, str | None]:
+    """Detect country columns in MAIN PORTS for POL/POD sides (name-based heuristic).
+    Returns (pol_country_col, pod_country_col) or (None, None) if not found.
+    """
+    cols = [str(c) for c in df_mp.columns]
+    lc = [c.lower().strip() for c in cols]
+    pol_cc = None
+    pod_cc = None
+    patterns_pol = [
+        "pol country code", "pol country", "origin country code", "origin country",
+        "origin country (code)", "origin cc", "pol cc"
+    ]
+    patterns_pod = [
+        "pod country code", "pod country", "destination country code", "destination country",
+        "destination country (code)", "destination cc", "pod cc"
+    ]
+    for i, name in enumerate(lc):
+        if name in patterns_pol and pol_cc is None:
+            pol_cc = cols[i]
+        if name in patterns_pod and pod_cc is None:
+            pod_cc = cols[i]
+    if pol_cc is None:
+        for i, name in enumerate(lc):
+            if ("pol" in name or "origin" in name) and ("country" in name or "code" in name or name.endswith(" cc") or " cc" in name):
+                pol_cc = cols[i]
+                break
+    if pod_cc is None:
+        for i, name in enumerate(lc):
+            if ("pod" in name or "destination" in name) and ("country" in name or "code" in name or name.endswith(" cc") or " cc" in name):
+                pod_cc = cols[i]
+                break
+    return pol_cc, pod_cc
+
+
+def resolve_port_cols(df: pd.DataFrame) -> tuple[str | None, str | None]:
+    """Actual POL/POD column names of MAIN PORTS or TRANSITTIME."""
+    candidates_pol = ["POL", "Port of Loading", "Origin Port", "POL CODE", "POL Code"]
+    candidates_pod = ["POD", "Port of Discharge", "Destination Port", "POD CODE", "POD Code"]
+    lcmap = {str(c).lower().strip(): str(c) for c in df.columns}
+    pol_col = None
+    pod_col = None
+    for cand in candidates_pol:
+        k = cand.lower().strip()
+        if k in lcmap:
+            pol_col = lcmap[k]
+            break
+    for cand in candidates_pod:
+        k = cand.lower().strip()
+        if k in lcmap:
+            pod_col = lcmap[k]
+            break
+    # Contains-based fallback
+    if pol_col is None:
+        for c in df.columns:
+            cl = str(c).lower()
+            if ("pol" in cl or "loading" in cl or "origin port" in cl) and ("port" in cl or "code" in cl):
+                pol_col = str(c)
+                break
+    if pod_col is None:
+        for c in df.columns:
+            cl = str(c).lower()
+            if ("pod" in cl or "discharge" in cl or "destination port" in cl) and ("port" in cl or "code" in cl):
+                pod_col = str(c)
+                break
+    return pol_col, pod_col
+
+
+def _prefix_match_score(values: pd.Series, ports: pd.Series) -> tuple[int, int]:
+    """(rows whose value equals the UN/LOC country prefix of the port, rows)."""
+    cc_vals = values.astype(str).str.strip().str.upper()
+    port_u = ports.astype(str).str.strip().str.upper()
+    prefix = port_u.str[:2].where(port_u.str.len() >= 2, "")
+    return int((cc_vals.values == prefix.values).sum()), len(values)
+
+
+def refine_country_cols(df_mp: pd.DataFrame, pol_col: str | None, pod_col: str | None,
+                        pol_cc_guess: str | None, pod_cc_guess: str | None) -> tuple[str | None, str | None]:
+    """Use UN/LOC country prefix from POL/POD codes to assign the most likely country columns.
+    We choose the column where POL's first-2-letter country code matches column value most often (for POL side),
+    and likewise for POD.
+    If scores are zero or ties remain, keep original guesses.
+    """
+    try:
+        if not pol_col or pol_col not in df_mp.columns or not pod_col or pod_col not in df_mp.columns:
+            return pol_cc_guess, pod_cc_guess
+        # Candidate country-like columns
+        cand_cols = []
+        for c in df_mp.columns:
+            cl = str(c).lower()
+            if ("country" in cl or "code" in cl or cl.endswith(" cc") or " cc" in cl):
+                cand_cols.append(str(c))
+        if not cand_cols:
+            return pol_cc_guess, pod_cc_guess
+        # Sample rows
+        sample = df_mp.dropna(subset=[pol_col, pod_col]).head(500)
+        pol_scores = {}
+        pod_scores = {}
+        for cc_col in cand_cols:
+            try:
+                pol_scores[cc_col] = _prefix_match_score(sample[cc_col], sample[pol_col])
+                pod_scores[cc_col] = _prefix_match_score(sample[cc_col], sample[pod_col])
+            except Exception:
+                continue
+
+        def best_col(scores: dict) -> str | None:
+            items = []
+            for k, (m, t) in scores.items():
+                ratio = (m / t) if t else 0.0
+                items.append((ratio, m, k))
+            if not items:
+                return None
+            items.sort(reverse=True)
+            return items[0][2]
+        pol_best = best_col(pol_scores)
+        pod_best = best_col(pod_scores)
+
+        # If bests are None or zero-ratio, keep guesses
+        def ratio_of(scores, col):
+            if col is None or col not in scores:
+                return 0.0
+            m, t = scores[col]
+            return (m / t) if t else 0.0
+        if ratio_of(pol_scores, pol_best) == 0.0 and ratio_of(pod_scores, pod_best) == 0.0:
+            return pol_cc_guess, pod_cc_guess
+        # Avoid assigning the same column to both sides if avoidable
+        if pol_best and pod_best and pol_best == pod_best:
+            # pick second best for POD if available
+            sorted_pod = sorted([((m / t if t else 0.0), m, k) for k, (m, t) in pod_scores.items()], reverse=True)
+            if len(sorted_pod) > 1:
+                pod_best = sorted_pod[1][2]
+        return pol_best or pol_cc_guess, pod_best or pod_cc_guess
+    except Exception:
+        return pol_cc_guess, pod_cc_guess
+
+
+@dataclass
+class MainPortsSchema:
+    """Resolved MAIN PORTS / TRANSITTIME columns plus normalised POL/POD country codes."""
+    pol_col_mp: str | None
+    pod_col_mp: str | None
+    pol_col_tt: str | None
+    pod_col_tt: str | None
+    pol_cc_col: str | None
+    pod_cc_col: str | None
+    rate_col_mp: str | None = None
+    tt_col_mp: str | None = None
+    tt_col_tt: str | None = None
+    # Normalised country cells per MAIN PORTS row (index aligned with the sheet)
+    pol_cc_norm: pd.Series | None = None
+    pod_cc_norm: pd.Series | None = None
+    _masks: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def country_mask(self, side: str, targets) -> pd.Series | None:
+        """Boolean Series over MAIN PORTS: rows whose POL (side='POL') or POD country is in targets."""
+        norm = self.pol_cc_norm if side.upper() == "POL" else self.pod_cc_norm
+        if norm is None:
+            return None
+        key = (side.upper(), frozenset(targets or ()))
+        mask = self._masks.get(key)
+        if mask is None:
+            wanted = [t for t in key[1] if t]
+            mask = pd.Series(np.isin(norm.values, wanted) if wanted else np.zeros(len(norm), dtype=bool), index=norm.index)
+            with self._lock:
+                self._masks[key] = mask
+        return mask
+
+    def rows_in(self, df_part: pd.DataFrame, side: str, targets) -> pd.DataFrame:
+        """Rows of df_part (a slice of MAIN PORTS) matching the country targets on the given side."""
+        mask = self.country_mask(side, targets)
+        return df_part[mask.loc[df_part.index].values]
+
+
+def compile_main_ports_schema(df_mp: pd.DataFrame, df_tt: pd.DataFrame) -> MainPortsSchema:
+    pol_cc_col, pod_cc_col = find_country_cols(df_mp)
+    pol_col_mp, pod_col_mp = resolve_port_cols(df_mp)
+    pol_col_tt, pod_col_tt = resolve_port_cols(df_tt)
+    pol_cc_col, pod_cc_col = refine_country_cols(df_mp, pol_col_mp, pod_col_mp, pol_cc_col, pod_cc_col)
+    tt_col_tt = resolve_col(df_tt, ["Transit Time", "TT", "TT (days)", "TT(days)"], ["transit", "tt"])
+    if tt_col_tt is None:
+        tt_col_tt = "Transit Time" if "Transit Time" in df_tt.columns else None
+
+    def _norm(col):
+        if col is None or col not in df_mp.columns:
+            return None
+        return pd.Series([normalize_country_cell(v) for v in df_mp[col].tolist()], index=df_mp.index, dtype=object)
+
+    return MainPortsSchema(
+        pol_col_mp=pol_col_mp,
+        pod_col_mp=pod_col_mp,
+        pol_col_tt=pol_col_tt,
+        pod_col_tt=pod_col_tt,
+        pol_cc_col=pol_cc_col,
+        pod_cc_col=pod_cc_col,
+        rate_col_mp=resolve_col(df_mp, ["Rate 40ft all-in", "Rate 40FT ALL-IN", "Rate 40ft", "Ocean Rate"], ["rate", "40", "all"]),
+        tt_col_mp=resolve_col(df_mp, ["TT_OVS", "TT", "TT (days)", "TT(days)", "Transit Time"], ["tt", "transit time"]),
+        tt_col_tt=tt_col_tt,
+        pol_cc_norm=_norm(pol_cc_col),
+        pod_cc_norm=_norm(pod_cc_col),
+    )
@@ -0,0 +1,167 @@
+"""Per-country index over the 'Ports Locations' sheet for nearest POL/POD selection.
+
+build_output used to walk the whole sheet with iterrows() for every route, re-filter it
+once per candidate to read its coordinates and then score the candidates one by one. The
+index below parses the sheet once per ReferenceData load (codes, coerced LAT/LONG as
+radians arrays), keeps the candidate positions of each country it has been asked for, and
+ranks all candidates of a country against a point in one vectorized haversine call.
+
+Selection rules are unchanged:
+  - a row belongs to a country when its Country column (name/code) maps to it, or when
+    the UN/LOCODE prefix of POL/POD matches;
+  - coordinates come from the FIRST row carrying that port code;
+  - the (lon, lat) swap guard keeps whichever reading is closer to the point;
+  - ties are broken by port code, and unscored ports keep their sheet order.
+"""
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .Distances import ROAD_FACTOR, haversine_km_rad  # type: ignore
+except ImportError:
+    from Quotations.Distances import ROAD_FACTOR, haversine_km_rad  # type: ignore
+
+
+def coerce_port_coord(val, kind: str) -> float | None:
+    """Parse a LAT/LONG cell ('39,45', 39450 for 39.450, ...); None when not a valid coordinate."""
+    try:
+        if pd.isna(val):
+            return None
+        if isinstance(val, str):
+            s = val.strip().replace(" ", "")
+            # Replace comma decimal with dot
+            s = s.replace(",", ".")
+            f = float(s)
+        else:
+            f = float(val)
+        # Fix common thousand-without-decimal issue (e.g., 39450 for 39.450)
+        if kind == "lat" and abs(f) > 90 and abs(f) <= 180000:
+            f = f / 1000.0
+        if kind == "lon" and abs(f) > 180 and abs(f) <= 360000:
+            f = f / 1000.0
+        # Final sanity
+        if kind == "lat" and abs(f) <= 90:
+            return f
+        if kind == "lon" and abs(f) <= 180:
+            return f
+        return None
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True)
+class PortCandidate:
+    code: str
+    has_coords: bool
+    km: float | None    # road km to the query point (None when it could not be scored)
+
+
+class PortIndex:
+    """Ports Locations compiled for repeated country/proximity queries (read-only once built)."""
+
+    def __init__(self, df_ports: pd.DataFrame | None, country_of=None):
+        """country_of(raw Country cell) -> ISO2 code; rows whose mapping fails only match by prefix."""
+        self._coords: dict[str, tuple[float, float] | None] = {}
+        self._by_country: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        codes: list[str] = []
+        ccs: list[str] = []
+        if df_ports is not None and not df_ports.empty and "POL/POD" in df_ports.columns:
+            raw_codes = df_ports["POL/POD"].astype(str).values
+            lats = df_ports["LAT"].values if "LAT" in df_ports.columns else [None] * len(df_ports)
+            lons = df_ports["LONG"].values if "LONG" in df_ports.columns else [None] * len(df_ports)
+            countries = df_ports["Country"].values if "Country" in df_ports.columns else [None] * len(df_ports)
+            for raw, la, lo in zip(raw_codes, lats, lons):
+                key = raw.upper()
+                if key not in self._coords:
+                    lat = coerce_port_coord(la, "lat")
+                    lon = coerce_port_coord(lo, "lon")
+                    self._coords[key] = (lat, lon) if lat is not None and lon is not None else None
+            for raw, cval in zip(raw_codes, countries):
+                code = raw.strip().upper()
+                if not code:
+                    continue
+                codes.append(code)
+                ccs.append(_row_country(cval, country_of))
+        self.codes = np.array(codes, dtype=str) if codes else np.array([], dtype=str)
+        self.row_cc = np.array(ccs, dtype=str) if ccs else np.array([], dtype=str)
+        self.prefix = np.array([c[:2] for c in codes], dtype=str) if codes else np.array([], dtype=str)
+        coords = [self._coords.get(c) for c in codes]
+        self.has_coords = np.array([c is not None for c in coords], dtype=bool)
+        self.lat = np.array([c[0] if c else np.nan for c in coords], dtype=float)
+        self.lon = np.array([c[1] if c else np.nan for c in coords], dtype=float)
+        self.lat_r = np.radians(self.lat)
+        self.lon_r = np.radians(self.lon)
+
+    def coords(self, port_code: str | None) -> tuple[float | None, float | None]:
+        """(lat, lon) of the first row with this POL/POD code, (None, None) if unknown or unparsable."""
+        if not port_code:
+            return None, None
+        hit = self._coords.get(str(port_code).strip().upper())
+        return hit if hit is not None else (None, None)
+
+    def _positions(self, cc: str) -> np.ndarray:
+        cc_u = (cc or "").strip().upper()
+        pos = self._by_country.get(cc_u)
+        if pos is None:
+            if not cc_u or self.codes.size == 0:
+                pos = np.array([], dtype=np.intp)
+            else:
+                pos = np.flatnonzero((self.row_cc == cc_u) | (self.prefix == cc_u[:2]))
+            with self._lock:
+                self._by_country[cc_u] = pos
+        return pos
+
+    def candidates(self, cc: str) -> list[tuple[str, float | None, float | None]]:
+        """[(port_code, lat, lon)] of the country in sheet order (duplicates kept)."""
+        return [(c, *self.coords(c)) for c in self.codes[self._positions(cc)].tolist()]
+
+    def distances(self, cc: str, point: tuple[float, float] | None) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """(codes, road km, has_coords) for every candidate of cc; km is NaN when not scored.
+
+        Each port is measured as given and with lat/lon swapped, keeping the shorter reading.
+        """
+        pos = self._positions(cc)
+        codes = self.codes[pos].tolist()
+        has = self.has_coords[pos]
+        km = np.full(len(pos), np.nan)
+        if point is not None and len(pos):
+            plat, plon = np.radians(float(point[0])), np.radians(float(point[1]))
+            lat_r, lon_r = self.lat_r[pos], self.lon_r[pos]
+            direct = haversine_km_rad(lat_r, lon_r, plat, plon) * ROAD_FACTOR
+            swapped = haversine_km_rad(lon_r, lat_r, plat, plon) * ROAD_FACTOR
+            with np.errstate(invalid="ignore"):
+                km = np.where(swapped < direct, swapped, direct)
+        return codes, km, has
+
+    def nearest(self, cc: str, point: tuple[float, float] | None, k: int | None = None) -> list[tuple[str, float]]:
+        """The k nearest scored ports of cc as [(code, road km)], ordered by (km, code)."""
+        codes, km, _ = self.distances(cc, point)
+        ok = np.flatnonzero(~np.isnan(km))
+        if not ok.size:
+            return []
+        order = ok[np.lexsort((np.array(codes, dtype=str)[ok], km[ok]))]
+        if k is not None:
+            order = order[:k]
+        return [(codes[i], float(km[i])) for i in order]
+
+    def ranked(self, cc: str, point: tuple[float, float] | None) -> list[PortCandidate]:
+        """Every candidate of cc by km ascending (rounded to 0.1); unscored ones last, in sheet order."""
+        codes, km, has = self.distances(cc, point)
+        out = [
+            PortCandidate(code, bool(h), None if np.isnan(d) else round(float(d), 1))
+            for code, d, h in zip(codes, km, has)
+        ]
+        out.sort(key=lambda c: float("inf") if c.km is None else c.km)
+        return out
+
+
+def _row_country(cval, country_of) -> str:
+    try:
+        c = str(cval).strip().upper() if pd.notna(cval) else ""
+        return country_of(c) if country_of else c
+    except Exception:
+        return ""
@@ -0,0 +1,87 @@
+"""Opt-in stage timings for build_output.
+
+Nothing is measured unless the caller asks for it:
+
+    with collect_stage_timings() as timings:
+        build_output(df, out_path)
+    timings.seconds   # {"reference": 0.12, "routes": 1.4, "routes.geocode": 0.9, ...}
+
+build_output takes a clock with stage_clock() and calls clock.lap(name) at the end of each
+stage; helpers wrapped with clock.timed(name, fn) are accumulated as "<lap>.<name>" inside
+the stage that calls them. Without an active collector the clock is a no-op.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_current: contextvars.ContextVar = contextvars.ContextVar("qtool_stage_timings", default=None)
+
+
+class StageTimings:
+    """Seconds and call counts per stage name, accumulated over every build_output in the block."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+
+    def add(self, name: str, dt: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + dt
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+
+class _StageClock:
+    def __init__(self, timings: StageTimings):
+        self._timings = timings
+        self._t0 = time.perf_counter()
+        self._sub: dict[str, float] = {}
+        self._active: set[str] = set()
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        self._timings.add(name, now - self._t0)
+        for sub, dt in self._sub.items():
+            self._timings.add(f"{name}.{sub}", dt)
+        self._sub = {}
+        self._t0 = now
+
+    def timed(self, name: str, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if name in self._active:  # nested call of the same kind is already being timed
+                return fn(*args, **kwargs)
+            self._active.add(name)
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._sub[name] = self._sub.get(name, 0.0) + time.perf_counter() - t
+                self._active.discard(name)
+        return wrapper
+
+
+class _NullClock:
+    def lap(self, name: str) -> None:
+        pass
+
+    def timed(self, name: str, fn):
+        return fn
+
+
+_NULL_CLOCK = _NullClock()
+
+
+def stage_clock():
+    """Clock for one build_output run (no-op unless inside collect_stage_timings())."""
+    timings = _current.get()
+    return _NULL_CLOCK if timings is None else _StageClock(timings)
+
+
+@contextmanager
+def collect_stage_timings():
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
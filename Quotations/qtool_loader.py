@@ -1,5 +1,8 @@
 import os
 import sys
+from io import BytesIO
+from typing import IO
+
 import pandas as pd
 
 
@@ -24,12 +27,28 @@ STD_COLS = {
 }
 
 
-def load_input_template(path: str, sheet: str = "Input") -> pd.DataFrame:
-    if not os.path.exists(path):
-        raise FileNotFoundError(path)
-    df_full = pd.read_excel(path, sheet_name=sheet)
+def excel_source(source: str | IO[bytes] | bytes | bytearray | memoryview):
+    """Path or rewound binary stream for pd.read_excel / load_workbook (raw bytes are wrapped, not copied to disk)."""
+    if isinstance(source, (str, os.PathLike)):
+        if not os.path.exists(source):
+            raise FileNotFoundError(source)
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def load_input_template(source: str | IO[bytes] | bytes | memoryview, sheet: str = "Input") -> pd.DataFrame:
+    """Normalized input rows of a template given as a path or in memory (BytesIO, bytes, upload object)."""
+    return normalize_input_frame(pd.read_excel(excel_source(source), sheet_name=sheet))
+
+
+def normalize_input_frame(df_full: pd.DataFrame) -> pd.DataFrame:
+    """Template columns (or their standard names) -> the normalized input expected by build_output."""
     # Keep only known columns, rename to standard
-    keep = [c for c in df_full.columns if c in STD_COLS]
+    std_names = set(STD_COLS.values())
+    keep = [c for c in df_full.columns if c in STD_COLS or c in std_names]
     df = df_full[keep].rename(columns=STD_COLS)
     # Fallback: if 'incoterm' missing (header mismatch), try case-insensitive or column M (index 12)
     if "incoterm" not in df.columns:
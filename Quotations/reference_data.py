@@ -0,0 +1,139 @@
+import os
+import threading
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+try:
+    from .snapshot import read_excel  # type: ignore
+except ImportError:
+    from Quotations.snapshot import read_excel  # type: ignore
+
+
+# Optional VTT table used by VTT2.py for POL/POD transit time lookups
+VTT_DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "VTT Tool", "VTT DATA.xlsx")
+
+# Sheets that must exist in QUOTATION TOOL DATA (anything else is optional)
+REQUIRED_SHEETS = ("MAIN PORTS", "HORSE-PUERTO", "COSTPERKM")
+
+
+@dataclass
+class ReferenceData:
+    """All reference tables used by build_output, parsed once per workbook version.
+
+    Instances are shared process-wide (every Streamlit session/rerun sees the same object),
+    so treat the DataFrames as read-only.
+    """
+    data_file: str
+    version: tuple
+    main_ports: pd.DataFrame
+    transit_time: pd.DataFrame
+    horse_puerto: pd.DataFrame
+    cost_per_km: pd.DataFrame
+    ports_locations: pd.DataFrame
+    zip_coords: pd.DataFrame
+    city_zips: pd.DataFrame
+    geo_cities: pd.DataFrame
+    city_aliases: pd.DataFrame
+    packaging: pd.DataFrame
+    vtt_routes: pd.DataFrame
+    # Structures derived from the tables above (indexes, ...), built lazily via derived()
+    _derived: dict = field(default_factory=dict, repr=False, compare=False)
+    _derived_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def derived(self, key, factory):
+        """Return factory() memoised on this bundle under key (dropped with the bundle on reload)."""
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._derived_lock:
+            if key not in self._derived:
+                self._derived[key] = factory()
+            return self._derived[key]
+
+
+_cache_lock = threading.Lock()
+_cache: dict[str, ReferenceData] = {}
+
+
+def file_stamp(path: str) -> tuple[str, int, int]:
+    """Return (abs path, mtime_ns, size) used to detect a changed source file."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+def optional_stamp(path: str) -> tuple | None:
+    try:
+        return file_stamp(path)
+    except OSError:
+        return None
+
+
+def data_stamps(version: tuple, geo_file: str) -> tuple:
+    """(mtime_ns, size) of the workbook, VTT DATA and GEO_LOCATIONS.xlsx: the files coordinates and quotes come from."""
+    geo = optional_stamp(geo_file)
+    return version[0][1:], version[1][1:] if version[1] else None, geo[1:] if geo else None
+
+
+def _first_sheet(sheets: dict[str, pd.DataFrame], *names: str) -> pd.DataFrame:
+    for name in names:
+        if name in sheets:
+            return sheets[name]
+    return pd.DataFrame()
+
+
+def _read_vtt_routes(path: str) -> pd.DataFrame:
+    try:
+        return read_excel(path)
+    except Exception:
+        return pd.DataFrame()
+
+
+def _load(data_file: str, vtt_file: str, version: tuple) -> ReferenceData:
+    # Single workbook pass (served from the Parquet sidecar when the workbook is unchanged)
+    sheets = read_excel(data_file, sheet_name=None)
+    for name in REQUIRED_SHEETS:
+        if name not in sheets:
+            raise ValueError(f"Worksheet named '{name}' not found in {data_file}")
+    return ReferenceData(
+        data_file=data_file,
+        version=version,
+        main_ports=sheets["MAIN PORTS"],
+        transit_time=_first_sheet(sheets, "TRANSITTIME"),
+        horse_puerto=sheets["HORSE-PUERTO"],
+        cost_per_km=sheets["COSTPERKM"],
+        ports_locations=_first_sheet(sheets, "Ports Locations"),
+        zip_coords=_first_sheet(sheets, "ZIP_COORDS", "ZIP_COORDINATES"),
+        city_zips=_first_sheet(sheets, "CITY_ZIPS"),
+        geo_cities=_first_sheet(sheets, "GEO_LOCATIONS", "CITY_COORDS"),
+        city_aliases=_first_sheet(sheets, "CITY_ALIASES"),
+        packaging=_first_sheet(sheets, "PACKAGING"),
+        vtt_routes=_read_vtt_routes(vtt_file),
+    )
+
+
+def load_reference_data(data_file: str, vtt_file: str = VTT_DATA_FILE) -> ReferenceData:
+    """Return the cached ReferenceData for data_file, reloading only if a source file changed.
+
+    The cache key is (path, mtime, size) of both QUOTATION TOOL DATA and VTT DATA, so
+    replacing either workbook on disk is picked up on the next call.
+    """
+    version = (file_stamp(data_file), optional_stamp(vtt_file))
+    key = version[0][0]
+    with _cache_lock:
+        ref = _cache.get(key)
+        if ref is not None and ref.version == version:
+            return ref
+        ref = _load(data_file, vtt_file, version)
+        _cache[key] = ref
+        return ref
+
+
+def invalidate_reference_data(data_file: str | None = None) -> None:
+    """Drop cached reference data (one workbook, or everything when data_file is None)."""
+    with _cache_lock:
+        if data_file is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(data_file), None)
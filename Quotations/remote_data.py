@@ -0,0 +1,216 @@
+"""Conditional, streamed download of a remote reference workbook (QUOTATION TOOL DATA on SharePoint).
+
+    sync = remote_workbook(url, "/tmp/qflow_qtool/QUOTATION TOOL DATA.xlsx", token=...)
+    sync.refresh()                 # blocking check; downloads only when the server copy changed
+    sync.start(interval_s=900)     # background revalidation
+
+Every check is a conditional GET (If-None-Match / If-Modified-Since from the validators of
+the last download, kept in <dest>.meta.json), so an unchanged workbook costs one 304. A new
+copy is streamed to a temporary file next to dest in CHUNK_BYTES pieces and swapped in with
+os.replace(), so readers see either the old or the new workbook, never a partial one; the
+cached ReferenceData for dest is then dropped. Any http(s) URL works, including a local
+stub server.
+
+    python -m Quotations.remote_data <url> <dest> [--token T]
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+try:
+    from .reference_data import invalidate_reference_data  # type: ignore
+except ImportError:
+    from Quotations.reference_data import invalidate_reference_data  # type: ignore
+
+
+CHUNK_BYTES = 1024 * 1024
+DEFAULT_TIMEOUT_S = 90
+DEFAULT_REFRESH_S = 900
+USER_AGENT = "QFLOW/1.0"
+
+
+@dataclass
+class SyncResult:
+    status: str          # "downloaded", "not_modified" or "error"
+    path: str
+    bytes: int = 0
+    error: str = ""
+
+
+class RemoteWorkbook:
+    """Local copy of one remote file, revalidated with conditional requests."""
+
+    def __init__(self, url: str, dest: str, token: str | None = None, timeout: float = DEFAULT_TIMEOUT_S):
+        self.url = url
+        self.dest = os.path.abspath(dest)
+        self.token = token or None
+        self.timeout = timeout
+        self.meta_path = self.dest + ".meta.json"
+        self.last_result: SyncResult | None = None
+        self.last_check: float | None = None
+        self._lock = threading.Lock()  # one check at a time per file
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Validators only apply to the copy they were stored with
+        if meta.get("url") != self.url or not os.path.exists(self.dest):
+            return {}
+        return meta
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def _request(self, meta: dict) -> urllib.request.Request:
+        headers = {"User-Agent": USER_AGENT}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return urllib.request.Request(self.url, headers=headers)
+
+    def refresh(self) -> SyncResult:
+        """Revalidate the local copy now (blocking). Never raises: errors come back in the result."""
+        with self._lock:
+            result = self._refresh()
+            self.last_result = result
+            self.last_check = time.time()
+            return result
+
+    def _refresh(self) -> SyncResult:
+        meta = self._read_meta()
+        try:
+            with urllib.request.urlopen(self._request(meta), timeout=self.timeout) as resp:
+                size = self._stream_to_dest(resp)
+                headers = resp.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return SyncResult("not_modified", self.dest)
+            return SyncResult("error", self.dest, error=f"HTTP {e.code}: {e.reason}")
+        except (urllib.error.URLError, OSError) as e:
+            return SyncResult("error", self.dest, error=str(getattr(e, "reason", e)))
+        except http.client.HTTPException as e:  # e.g. IncompleteRead from a cut-off chunked download
+            return SyncResult("error", self.dest, error=f"{type(e).__name__}: {e}")
+        except Exception as e:  # anything else; _stream_to_dest has already removed the temp file
+            return SyncResult("error", self.dest, error=f"{type(e).__name__}: {e}")
+        self._write_meta({
+            "url": self.url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": size,
+            "downloaded_at": time.time(),
+        })
+        invalidate_reference_data(self.dest)
+        return SyncResult("downloaded", self.dest, bytes=size)
+
+    def _stream_to_dest(self, resp) -> int:
+        directory = os.path.dirname(self.dest)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".download_", suffix=os.path.splitext(self.dest)[1], dir=directory)
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = resp.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            expected = resp.headers.get("Content-Length")
+            if expected is not None and expected.isdigit() and int(expected) != size:
+                raise OSError(f"incomplete download: {size} of {expected} bytes")
+            os.replace(tmp, self.dest)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return size
+
+    def ensure(self) -> SyncResult:
+        """Download when there is no local copy yet; otherwise keep it (background refresh updates it)."""
+        if os.path.exists(self.dest):
+            return SyncResult("not_modified", self.dest)
+        return self.refresh()
+
+    def start(self, interval_s: float = DEFAULT_REFRESH_S) -> None:
+        """Revalidate every interval_s seconds in a daemon thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def check():
+            try:
+                self.refresh()
+            except Exception as e:  # a failed check must not end background refresh
+                self.last_result = SyncResult("error", self.dest, error=f"{type(e).__name__}: {e}")
+                self.last_check = time.time()
+
+        def loop():
+            if self.last_check is None:  # copy left by an earlier process: revalidate right away
+                check()
+            while not self._stop.wait(interval_s):
+                check()
+
+        self._thread = threading.Thread(target=loop, name=f"remote-data:{os.path.basename(self.dest)}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+
+_workbooks: dict[str, RemoteWorkbook] = {}
+_workbooks_lock = threading.Lock()
+
+
+def remote_workbook(url: str, dest: str, token: str | None = None) -> RemoteWorkbook:
+    """Process-wide RemoteWorkbook for dest (Streamlit reruns and sessions share one downloader)."""
+    key = os.path.abspath(dest)
+    with _workbooks_lock:
+        sync = _workbooks.get(key)
+        if sync is None or sync.url != url or sync.token != (token or None):
+            if sync is not None:
+                sync.stop()
+            sync = RemoteWorkbook(url, dest, token=token)
+            _workbooks[key] = sync
+        return sync
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Conditional download of a remote workbook")
+    ap.add_argument("url")
+    ap.add_argument("dest")
+    ap.add_argument("--token", help="Bearer token")
+    args = ap.parse_args()
+    result = RemoteWorkbook(args.url, args.dest, token=args.token).refresh()
+    print(f"{result.status}: {result.path}" + (f" ({result.bytes} bytes)" if result.bytes else "") +
+          (f" - {result.error}" if result.error else ""))
+    if result.status == "error":
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Content-addressed cache of Quote rows, so a re-uploaded template only recomputes edited lines.
+
+Each input row is keyed by a digest of its normalised content (standard column names, blank
+cells as None, strings stripped) plus a version tag of everything else the result depends
+on: the reference workbooks (QUOTATION TOOL DATA / VTT DATA stamps), the Quote column
+layout and the quoting code itself (Quotations and Packaging sources). A changed workbook
+or code version therefore simply misses; nothing has to be invalidated by hand.
+
+Rows live in a SQLite file next to QUOTATION TOOL DATA (QTOOL_RESULT_CACHE_DB overrides
+the path, QTOOL_RESULT_CACHE=0 disables the cache). Lookups read only the requested keys and
+new rows are written in one transaction by flush(). Rows are stored as JSON (plain scalars
+and strings), never pickled: the file sits on a shared volume, and unpickling it would run
+whatever anyone with write access put there. Entries expire after RESULT_TTL_SECONDS, like
+online geocodes, because a row may depend on them. If the file cannot be created the store
+keeps working in memory only, holding at most MEMORY_MAX_ROWS rows.
+
+    python -m Quotations.result_store stats [db]
+    python -m Quotations.result_store purge [db]
+"""
+import glob
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .geocode_store import ONLINE_TTL_SECONDS, version_tag  # type: ignore
+except ImportError:
+    from Quotations.geocode_store import ONLINE_TTL_SECONDS, version_tag  # type: ignore
+
+
+RESULT_DB_NAME = "QUOTE_CACHE.sqlite"
+RESULT_TTL_SECONDS = ONLINE_TTL_SECONDS
+# Rows kept when the store is memory only (oldest dropped first)
+MEMORY_MAX_ROWS = 200_000
+# Rows per SELECT ... IN (...) (SQLite variable limit is 999 on old builds)
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quote_row (
+    key        TEXT PRIMARY KEY,
+    payload    BLOB NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def result_cache_enabled() -> bool:
+    return os.environ.get("QTOOL_RESULT_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def default_store_path(data_file: str | None) -> str:
+    """QTOOL_RESULT_CACHE_DB if set, else QUOTE_CACHE.sqlite next to the data workbook."""
+    env = os.environ.get("QTOOL_RESULT_CACHE_DB")
+    if env:
+        return env
+    base = os.path.dirname(os.path.abspath(data_file)) if data_file else tempfile.gettempdir()
+    return os.path.join(base, RESULT_DB_NAME)
+
+
+_code_tag: str | None = None
+
+
+def code_tag() -> str:
+    """Digest of the Quotations and Packaging sources (a code change must not serve rows quoted by older code)."""
+    global _code_tag
+    if _code_tag is None:
+        h = hashlib.sha1()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in sorted(glob.glob(os.path.join(root, "Quotations", "*.py")) + glob.glob(os.path.join(root, "Packaging", "*.py"))):
+            with open(path, "rb") as f:
+                h.update(os.path.basename(path).encode("utf-8"))
+                h.update(f.read())
+        _code_tag = h.hexdigest()[:16]
+    return _code_tag
+
+
+def result_version(stamps: tuple, quote_columns: list[str] | None) -> str:
+    """Version tag for row keys: reference data stamps (see data_stamps), Quote column layout and code."""
+    return version_tag(*stamps, tuple(quote_columns or ()), code_tag())
+
+
+def _cell_key(v):
+    if v is None:
+        return None
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float):
+        return None if math.isnan(v) else v
+    if isinstance(v, str):
+        v = v.strip()
+        return v or None
+    if v is pd.NaT or v is pd.NA:
+        return None
+    return str(v)
+
+
+def _json_default(v):
+    if isinstance(v, np.generic):
+        return v.item()
+    return str(v)
+
+
+def dump_row(row: dict) -> str:
+    """Quote row as JSON text (NaN kept as NaN, numpy scalars as Python scalars)."""
+    return json.dumps(row, ensure_ascii=False, default=_json_default)
+
+
+def load_row(payload) -> dict | None:
+    """Quote row from its JSON text; None for anything that is not a JSON object (e.g. old pickled rows)."""
+    try:
+        row = json.loads(payload.decode("utf-8") if isinstance(payload, bytes) else payload)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def row_keys(input_df: pd.DataFrame, version: str) -> list[str]:
+    """One digest per input row: normalised content (columns in sorted order) + version tag."""
+    cols = sorted(str(c) for c in input_df.columns)
+    frame = input_df.rename(columns=str)[cols]
+    prefix = json.dumps([version, cols], ensure_ascii=False)
+    keys = []
+    for values in frame.itertuples(index=False, name=None):
+        payload = json.dumps([_cell_key(v) for v in values], ensure_ascii=False, default=str)
+        keys.append(hashlib.sha1(f"{prefix}\x00{payload}".encode("utf-8")).hexdigest())
+    return keys
+
+
+class ResultStore:
+    """row key -> Quote row ({column: value}), persisted in SQLite."""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.persistent = False
+        self._lock = threading.Lock()
+        self._mem: dict[str, tuple[dict, float]] = {}
+        self._pending: dict[str, tuple[dict, float]] = {}
+        if path:
+            try:
+                with self._connect():
+                    pass
+                self.persistent = True
+            except (sqlite3.Error, OSError):
+                self.persistent = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Cached rows for the given keys (missing and expired keys are left out)."""
+        wanted = list(dict.fromkeys(keys))
+        found: dict[str, tuple[dict, float]] = {}
+        with self._lock:
+            for key in wanted:
+                rec = self._pending.get(key) or self._mem.get(key)
+                if rec is not None:
+                    found[key] = rec
+        todo = [k for k in wanted if k not in found]
+        if todo and self.persistent:
+            try:
+                with self._connect() as conn:
+                    for i in range(0, len(todo), _LOOKUP_CHUNK):
+                        chunk = todo[i:i + _LOOKUP_CHUNK]
+                        marks = ",".join("?" * len(chunk))
+                        for key, payload, created_at in conn.execute(
+                            f"SELECT key, payload, created_at FROM quote_row WHERE key IN ({marks})", chunk
+                        ):
+                            row = load_row(payload)
+                            if row is not None:
+                                found[key] = (row, created_at)
+            except (sqlite3.Error, OSError):
+                pass
+        cutoff = time.time() - RESULT_TTL_SECONDS
+        return {k: row for k, (row, created_at) in found.items() if created_at >= cutoff}
+
+    def put_many(self, rows: dict[str, dict]) -> None:
+        now = time.time()
+        with self._lock:
+            for key, row in rows.items():
+                self._pending[key] = (row, now)
+
+    def flush(self) -> int:
+        """Write pending rows to disk in a single transaction. Returns the number of rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not self.persistent:
+                self._mem.update(pending)
+                for key in list(self._mem)[:max(len(self._mem) - MEMORY_MAX_ROWS, 0)]:
+                    del self._mem[key]
+        if not pending or not self.persistent:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO quote_row (key, payload, created_at) VALUES (?, ?, ?)",
+                    [(k, dump_row(row), created_at) for k, (row, created_at) in pending.items()],
+                )
+        except (sqlite3.Error, OSError):
+            return 0
+        return len(pending)
+
+    def purge(self) -> int:
+        """Delete expired rows. Returns the number of rows removed."""
+        cutoff = time.time() - RESULT_TTL_SECONDS
+        with self._lock:
+            for key in [k for k, (_, created_at) in self._mem.items() if created_at < cutoff]:
+                del self._mem[key]
+        if not self.persistent:
+            return 0
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM quote_row WHERE created_at < ?", (cutoff,)).rowcount
+
+    def count(self) -> int:
+        if not self.persistent:
+            with self._lock:
+                return len(self._mem)
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM quote_row").fetchone()[0]
+
+
+_stores: dict[str, ResultStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_result_store(data_file: str | None = None, path: str | None = None) -> ResultStore:
+    """Process-wide ResultStore for the given workbook."""
+    path = os.path.abspath(path or default_store_path(data_file))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ResultStore(path)
+            _stores[path] = store
+        return store
+
+
+def main():
+    args = sys.argv[1:]
+    cmd = args[0] if args else "stats"
+    if len(args) > 1:
+        store = open_result_store(path=args[1])
+    else:
+        try:
+            from .generate_quote import find_qtool_data_file  # type: ignore
+        except ImportError:
+            from Quotations.generate_quote import find_qtool_data_file  # type: ignore
+        store = open_result_store(find_qtool_data_file())
+    if cmd == "purge":
+        print(f"Expired rows removed: {store.purge()}")
+    print(f"Result store: {store.path} ({'persistent' if store.persistent else 'memory only'})")
+    print(f"{store.count():>8}  rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Local HTTP quoting service that keeps the reference data and indexes warm.
+
+    python -m Quotations.service [--host 127.0.0.1] [--port 8765] [--workers N]
+
+The process loads QUOTATION TOOL DATA once at startup and runs a one-row warm-up quote to
+build the derived indexes (ports, cities, lookups, ...). Later requests reuse them and see
+a reload only when the workbook changes on disk (load_reference_data stamps).
+
+    GET  /health        status, data file and reference-data version
+    POST /quote         XLSX template (body) or JSON rows -> XLSX workbook or JSON quote rows
+    POST /quote/route   one JSON row (a single lane) -> JSON quote row
+
+JSON input is {"rows": [{...}, ...]} or a bare list; keys are template headers
+("Origin Country code", ...) or the standard names ("origin_country_code", ...). The output
+format follows ?format=json|xlsx, then the Accept header, then the input type. At most
+--workers quotes are computed at once; a request that cannot start within
+QUEUE_TIMEOUT_S gets 503.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+try:
+    from .generate_quote import DEFAULT_INCOTERM, build_output, find_qtool_data_file
+    from .qtool_loader import load_input_template, normalize_input_frame
+    from .reference_data import load_reference_data
+except ImportError:
+    from Quotations.generate_quote import DEFAULT_INCOTERM, build_output, find_qtool_data_file  # type: ignore
+    from Quotations.qtool_loader import load_input_template, normalize_input_frame  # type: ignore
+    from Quotations.reference_data import load_reference_data  # type: ignore
+
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+JSON_MIME = "application/json"
+MAX_BODY_BYTES = 50 * 1024 * 1024
+QUEUE_TIMEOUT_S = 30.0
+DEFAULT_PORT = 8765
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class QuoteService:
+    """build_output behind a bounded number of concurrent quotes."""
+
+    def __init__(self, workers: int = 2, queue_timeout: float = QUEUE_TIMEOUT_S):
+        self.workers = max(1, workers)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def reference(self):
+        data_file = find_qtool_data_file()
+        if not data_file:
+            raise FileNotFoundError("QUOTATION TOOL DATA file not found in QTool directory")
+        return load_reference_data(data_file)
+
+    def warm(self) -> float:
+        """Load the reference data and quote one synthetic lane so every index is built. Returns seconds."""
+        t0 = time.perf_counter()
+        ref = self.reference()
+        hp = ref.horse_puerto
+        if not hp.empty and "Plant" in hp.columns:
+            first = hp.iloc[0]
+            cc = str(first.get("Country Code", "") or "")
+            self.quote_rows([{
+                "pn": "WARMUP", "incoterm": DEFAULT_INCOTERM, "origin_country_code": cc,
+                "origin_city": str(first.get("Plant City", "") or ""),
+                "dest_plant": str(first["Plant"]), "dest_country_code": cc,
+            }])
+        return time.perf_counter() - t0
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceBusy(f"all {self.workers} quote workers busy")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._slots.release()
+
+    def quote_rows(self, rows: list[dict]) -> pd.DataFrame:
+        """Quote rows given as dicts (template headers or standard names)."""
+        df = normalize_input_frame(pd.DataFrame(rows))
+        if df.empty:
+            raise ValueError("no quotable rows in request")
+        return self._run(build_output, df, None)
+
+    def quote_workbook(self, rows: list[dict] | None = None, xlsx: bytes | None = None) -> tuple[bytes, pd.DataFrame]:
+        """Quote workbook bytes for JSON rows or an uploaded template (whose sheets are kept)."""
+        out = BytesIO()
+        if xlsx is None:
+            df = normalize_input_frame(pd.DataFrame(rows or []))
+            quote = self._run(build_output, df, out)
+            return out.getvalue(), quote
+        df = load_input_template(BytesIO(xlsx), sheet="Input")
+        quote = self._run(build_output, df, out, source_workbook_path=BytesIO(xlsx))
+        return out.getvalue(), quote
+
+
+def _records_json(df: pd.DataFrame) -> str:
+    return df.to_json(orient="records", force_ascii=False, date_format="iso")
+
+
+def _json_rows(payload) -> list[dict]:
+    if isinstance(payload, dict):
+        payload = payload.get("rows", payload.get("row", payload))
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not all(isinstance(r, dict) for r in payload):
+        raise ValueError("expected {'rows': [{...}, ...]}, a list of rows or a single row object")
+    return payload
+
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    service: QuoteService = None  # set by make_server()
+    server_version = "QToolQuote/1.0"
+
+    def _send(self, status: int, body: bytes, content_type: str, elapsed: float | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if elapsed is not None:
+            self.send_header("X-Quote-Ms", f"{elapsed * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, obj, elapsed: float | None = None):
+        body = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, default=str)
+        self._send(status, body.encode("utf-8"), f"{JSON_MIME}; charset=utf-8", elapsed)
+
+    def _wants(self, query: dict, default: str) -> str:
+        fmt = (query.get("format") or [""])[0].lower()
+        if fmt in ("json", "xlsx"):
+            return fmt
+        accept = self.headers.get("Accept", "")
+        if XLSX_MIME in accept:
+            return "xlsx"
+        if JSON_MIME in accept:
+            return "json"
+        return default
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            return self._send_json(404, {"error": "not found"})
+        try:
+            ref = self.service.reference()
+            self._send_json(200, {"status": "ok", "data_file": ref.data_file, "version": repr(ref.version),
+                                  "workers": self.service.workers})
+        except Exception as e:
+            self._send_json(503, {"status": "error", "error": str(e)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/quote", "/quote/route"):
+            return self._send_json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send_json(413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"})
+        body = self.rfile.read(length)
+        is_json = JSON_MIME in self.headers.get("Content-Type", "") or body[:1] in (b"{", b"[")
+        t0 = time.perf_counter()
+        try:
+            if url.path == "/quote/route":
+                rows = _json_rows(json.loads(body or b"{}"))
+                if len(rows) != 1:
+                    raise ValueError("/quote/route takes exactly one row")
+                quote = self.service.quote_rows(rows)
+                lane = quote.iloc[0].to_json(force_ascii=False, date_format="iso")
+                return self._send_json(200, lane, time.perf_counter() - t0)
+            if is_json:
+                rows = _json_rows(json.loads(body))
+                if self._wants(parse_qs(url.query), "json") == "json":
+                    return self._send_json(200, _records_json(self.service.quote_rows(rows)), time.perf_counter() - t0)
+                data, _ = self.service.quote_workbook(rows=rows)
+            else:
+                data, quote = self.service.quote_workbook(xlsx=body)
+                if self._wants(parse_qs(url.query), "xlsx") == "json":
+                    return self._send_json(200, _records_json(quote), time.perf_counter() - t0)
+            self._send(200, data, XLSX_MIME, time.perf_counter() - t0)
+        except ServiceBusy as e:
+            self._send_json(503, {"error": str(e)})
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+def make_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = 2, warm: bool = True) -> ThreadingHTTPServer:
+    service = QuoteService(workers=workers)
+    if warm:
+        try:
+            print(f"Reference data warm in {service.warm():.1f}s", file=sys.stderr)
+        except Exception as e:
+            print(f"WARNING: warm-up failed ({e}); data loads on the first request", file=sys.stderr)
+    handler = type("BoundQuoteHandler", (QuoteHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local HTTP quoting service")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                    help=f"quotes computed at the same time (others wait up to {QUEUE_TIMEOUT_S:.0f}s, then 503)")
+    args = ap.parse_args()
+    server = make_server(args.host, args.port, args.workers)
+    print(f"Serving quotes on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Column widths and cell formats shared by the Excel exporters.
+
+The Quote sheet (generate_quote) and the VTT timelines (VTT2, ALL_VTT) used to format
+after writing: scan every written cell to size the columns and set fill/font/border/
+number_format attribute by attribute on each cell. Here widths come from the in-memory
+DataFrame (vectorized text lengths) and each repeated format is registered once per
+workbook, as a named style or as a shared style array for write-only sheets, so a cell
+gets its whole format in a single assignment.
+"""
+from copy import copy
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+
+def max_text_length(values: pd.Series) -> int:
+    """Longest str() of the non-None values (0 when there are none). NaN counts as 'nan'."""
+    if values.empty:
+        return 0
+    if values.dtype == object:
+        values = values[values.values != None]  # noqa: E711 (elementwise on object arrays)
+        if values.empty:
+            return 0
+    return int(values.astype(str).str.len().max())
+
+
+def column_widths(df: pd.DataFrame, columns, min_width: float, max_width: float, pad: int = 2,
+                  fixed_lengths: dict[int, int] | None = None) -> dict[int, float]:
+    """Widths for the 1-based column positions in columns, header included.
+
+    width = clamp(longest text + pad, min_width, max_width). fixed_lengths overrides the
+    data length of a column (e.g. formula columns, whose written text is not in df).
+    Positions beyond the frame get min_width.
+    """
+    fixed_lengths = fixed_lengths or {}
+    headers = list(df.columns)
+    widths = {}
+    for col_idx in columns:
+        longest = 0
+        if col_idx <= len(headers):
+            header = headers[col_idx - 1]
+            if header is not None:
+                longest = len(str(header))
+            if col_idx in fixed_lengths:
+                longest = max(longest, fixed_lengths[col_idx])
+            else:
+                longest = max(longest, max_text_length(df.iloc[:, col_idx - 1]))
+        widths[col_idx] = max(min_width, min(longest + pad, max_width))
+    return widths
+
+
+def set_column_widths(ws, widths: dict) -> None:
+    """Apply {column (1-based position or letter): width}; on write-only sheets call before the first append."""
+    for col, width in widths.items():
+        letter = get_column_letter(col) if isinstance(col, (int, np.integer)) else col
+        ws.column_dimensions[letter].width = width
+
+
+def register_named_styles(wb, specs: dict[str, dict]) -> None:
+    """Add one NamedStyle per {name: {font, fill, border, alignment, number_format}} to wb.
+
+    Names already registered are kept (a workbook building many sheets registers once).
+    A spec without font gets the workbook default font, like an unformatted cell.
+    """
+    existing = set(wb.named_styles)
+    for name, spec in specs.items():
+        if name in existing:
+            continue
+        attrs = dict(spec)
+        attrs.setdefault("font", copy(DEFAULT_FONT))
+        wb.add_named_style(NamedStyle(name=name, **attrs))
+
+
+def shared_style(ws, **attrs):
+    """Style array with the given cell attributes (fill, font, number_format, ...), for styled_cell()."""
+    proto = WriteOnlyCell(ws)
+    for attr, value in attrs.items():
+        setattr(proto, attr, value)
+    return proto._style
+
+
+def styled_cell(ws, row: int, column: int, value, style) -> Cell:
+    """Cell carrying a shared_style(); can be appended to write-only and regular worksheets."""
+    return Cell(ws, row=row, column=column, value=value, style_array=style)
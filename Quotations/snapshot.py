@@ -0,0 +1,320 @@
+"""Binary sidecar snapshots of the Excel reference workbooks.
+
+Parsing XLSX through openpyxl is the slowest thing pandas reads. read_excel() here is a
+drop-in replacement for pd.read_excel that stores every parsed sheet as Parquet under a
+versioned cache directory, keyed by the source file and the call options. Object columns
+that are not all str, and non-string labels, are stored as tagged text decoded from the
+manifest, so sheets read back exactly (nothing is pickled). While the source workbook is
+unchanged (same size and mtime, or same SHA-256 after a touch/copy) later reads come from
+the sidecar.
+
+Compile all bundled workbooks up front with:
+    python -m Quotations.snapshot [workbook.xlsx ...]
+"""
+import glob
+import datetime
+import hashlib
+import json
+import os
+import sys
+import threading
+import warnings
+
+import pandas as pd
+
+try:
+    import pyarrow  # type: ignore  # noqa: F401
+except Exception:  # pragma: no cover
+    pyarrow = None
+
+
+SNAPSHOT_VERSION = 2
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.environ.get("QTOOL_SNAPSHOT_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "_snapshot")
+
+# Workbooks compiled by the CLI when no explicit paths are given
+DEFAULT_SOURCES = [
+    os.path.join(_REPO_DIR, "Quotations", "QUOTATION TOOL DATA.xlsx"),
+    os.path.join(_REPO_DIR, "VTT Tool", "VTT DATA.xlsx"),
+    os.path.join(_REPO_DIR, "Packaging", "Base_EMB.xlsx"),
+    *sorted(glob.glob(os.path.join(_REPO_DIR, "Quotations", "Dataframe", "*.xlsx"))),
+]
+
+_lock = threading.Lock()
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_dir(path: str) -> str:
+    abspath = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    safe = "".join(ch if ch.isalnum() else "_" for ch in stem)
+    tag = hashlib.sha1(abspath.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(SNAPSHOT_DIR, f"v{SNAPSHOT_VERSION}", f"{safe}-{tag}")
+
+
+def _variant_key(sheet_name, dtype) -> str:
+    if sheet_name is None:
+        sheet = "*"
+    elif isinstance(sheet_name, int):
+        sheet = f"#{sheet_name}"
+    else:
+        sheet = str(sheet_name)
+    dt = "" if dtype is None else getattr(dtype, "__name__", str(dtype))
+    return f"{sheet}|{dt}"
+
+
+def _read_manifest(sdir: str) -> dict | None:
+    try:
+        with open(os.path.join(sdir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _write_json_atomic(path: str, payload: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _fresh_manifest(path: str) -> dict:
+    """Return the manifest for path, validated against the current file (stale variants dropped)."""
+    sdir = _source_dir(path)
+    st = os.stat(path)
+    man = _read_manifest(sdir)
+    if man and man.get("version") == SNAPSHOT_VERSION:
+        if man.get("size") == st.st_size and man.get("mtime_ns") == st.st_mtime_ns:
+            return man
+        # Touched or copied: trust the content hash before throwing the snapshot away
+        digest = _sha256(path)
+        if man.get("sha256") == digest:
+            man.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            try:
+                _write_json_atomic(os.path.join(sdir, "manifest.json"), man)
+            except OSError:
+                pass
+            return man
+    else:
+        digest = _sha256(path)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "source": os.path.abspath(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": digest,
+        "variants": {},
+    }
+
+
+# Cell types a mixed object column may hold after read_excel, tagged so they read back exactly
+def _encode_cell(v) -> str:
+    if v is None:
+        return "n"
+    if v is pd.NaT:
+        return "N"
+    if isinstance(v, str):
+        return "s" + v
+    if isinstance(v, bool):
+        return "b" + ("1" if v else "0")
+    if isinstance(v, int):
+        return "i" + str(v)
+    if isinstance(v, float):
+        return "f" + repr(float(v))
+    if isinstance(v, pd.Timestamp):
+        return "T" + v.isoformat()
+    if isinstance(v, datetime.datetime):
+        return "D" + v.isoformat()
+    if isinstance(v, datetime.date):
+        return "d" + v.isoformat()
+    if isinstance(v, datetime.time):
+        return "h" + v.isoformat()
+    raise TypeError(f"unsupported cell type {type(v).__name__}")
+
+
+_DECODERS = {
+    "n": lambda t: None,
+    "N": lambda t: pd.NaT,
+    "s": str,
+    "b": lambda t: t == "1",
+    "i": int,
+    "f": float,
+    "T": pd.Timestamp,
+    "D": datetime.datetime.fromisoformat,
+    "d": datetime.date.fromisoformat,
+    "h": datetime.time.fromisoformat,
+}
+
+
+def _decode_cell(text: str):
+    return _DECODERS[text[0]](text[1:])
+
+
+def _encode_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, dict | None]:
+    """Arrow-friendly df: object columns that are not all str (mixed types, NaN) become tagged text and
+    labels positional strings, with the metadata to decode them. df itself when nothing needs it."""
+    encoded = [i for i in range(df.shape[1])
+               if df.dtypes.iloc[i] == object and not all(isinstance(v, str) for v in df.iloc[:, i])]
+    if not encoded and all(isinstance(c, str) for c in df.columns) and df.columns.is_unique:
+        return df, None
+    out = df.copy()
+    out.columns = [str(i) for i in range(df.shape[1])]
+    for i in encoded:
+        out[str(i)] = [_encode_cell(v) for v in df.iloc[:, i]]
+    return out, {"columns": [_encode_cell(c) for c in df.columns], "encoded": encoded}
+
+
+def _decode_frame(df: pd.DataFrame, meta: dict) -> pd.DataFrame:
+    for i in meta.get("encoded", ()):
+        df[str(i)] = pd.Series([_decode_cell(v) for v in df[str(i)]], index=df.index, dtype=object)
+    df.columns = [_decode_cell(c) for c in meta["columns"]]
+    return df
+
+
+def _same_frame(back: pd.DataFrame, df: pd.DataFrame) -> bool:
+    return back.equals(df) and list(back.dtypes) == list(df.dtypes) and list(back.columns) == list(df.columns)
+
+
+def _write_frame(df: pd.DataFrame, base: str) -> tuple[str, dict | None] | None:
+    """Write df next to base as Parquet (see _encode_frame) when it round-trips exactly.
+    Returns (file name, decode metadata) or None if it cannot."""
+    if pyarrow is None:
+        return None
+    target = base + ".parquet"
+    try:
+        frame, meta = _encode_frame(df)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            frame.to_parquet(target, index=True)
+        if _same_frame(_read_frame(os.path.dirname(target), os.path.basename(target), meta), df):
+            return os.path.basename(target), meta
+    except Exception:
+        pass
+    try:
+        os.remove(target)
+    except OSError:
+        pass
+    return None
+
+
+def _read_frame(sdir: str, fname: str, meta: dict | None = None) -> pd.DataFrame:
+    # Only Parquet: a snapshot dir may be shared, never unpickle files from it
+    if not fname.endswith(".parquet"):
+        raise ValueError(f"unsupported snapshot file: {fname}")
+    df = pd.read_parquet(os.path.join(sdir, fname))
+    return _decode_frame(df, meta) if meta else df
+
+
+def _store(path: str, man: dict, key: str, result) -> None:
+    sdir = _source_dir(path)
+    os.makedirs(sdir, exist_ok=True)
+    frames = result if isinstance(result, dict) else {None: result}
+    prefix = f"{man['sha256'][:12]}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+    entries = []
+    for i, (name, df) in enumerate(frames.items()):
+        written = _write_frame(df, os.path.join(sdir, f"{prefix}_{i}"))
+        if written is None:
+            # Not storable exactly: this variant keeps being parsed from the workbook
+            for _, fname, _ in entries:
+                try:
+                    os.remove(os.path.join(sdir, fname))
+                except OSError:
+                    pass
+            return
+        entries.append([name, *written])
+    man["variants"][key] = {"multi": isinstance(result, dict), "sheets": entries}
+    _write_json_atomic(os.path.join(sdir, "manifest.json"), man)
+    # Drop files left behind by previous versions of the workbook
+    keep = {fname for v in man["variants"].values() for _, fname, _ in v["sheets"]}
+    for fname in os.listdir(sdir):
+        if fname.endswith(".parquet") and fname not in keep:
+            try:
+                os.remove(os.path.join(sdir, fname))
+            except OSError:
+                pass
+
+
+def _load_variant(path: str, man: dict, key: str):
+    entry = man["variants"].get(key)
+    if not entry:
+        return None
+    sdir = _source_dir(path)
+    frames = {name: _read_frame(sdir, fname, meta) for name, fname, meta in entry["sheets"]}
+    if entry.get("multi"):
+        return frames
+    return next(iter(frames.values()))
+
+
+def read_excel(path: str, sheet_name=0, dtype=None):
+    """pd.read_excel(path, sheet_name=..., dtype=...) served from the sidecar snapshot when fresh.
+
+    Falls back to parsing the workbook (and refreshing the snapshot) when the sidecar is
+    missing or stale. Snapshot I/O errors never hide the workbook: the Excel file stays the
+    source of truth.
+    """
+    key = _variant_key(sheet_name, dtype)
+    try:
+        with _lock:
+            man = _fresh_manifest(path)
+            cached = _load_variant(path, man, key)
+        if cached is not None:
+            return cached
+    except FileNotFoundError:
+        raise
+    except Exception:
+        man = None
+    result = pd.read_excel(path, sheet_name=sheet_name, dtype=dtype)
+    if man is not None:
+        try:
+            with _lock:
+                # Re-read so variants stored meanwhile (other threads/processes) are kept
+                current = _fresh_manifest(path)
+                if current["sha256"] == man["sha256"]:
+                    _store(path, current, key, result)
+        except Exception:
+            pass
+    return result
+
+
+def is_fresh(path: str, sheet_name=None, dtype=None) -> bool:
+    """True when a snapshot for this workbook/options exists and matches the source content."""
+    try:
+        with _lock:
+            man = _fresh_manifest(path)
+        return _variant_key(sheet_name, dtype) in man["variants"]
+    except Exception:
+        return False
+
+
+def compile_snapshots(paths: list[str] | None = None) -> dict[str, str]:
+    """Parse every sheet of each workbook into the snapshot dir. Returns {path: status}."""
+    report = {}
+    for path in (paths or DEFAULT_SOURCES):
+        if not os.path.exists(path):
+            report[path] = "missing"
+            continue
+        try:
+            was_fresh = is_fresh(path)
+            read_excel(path, sheet_name=None)
+            report[path] = "fresh" if was_fresh else "compiled"
+        except Exception as e:
+            report[path] = f"error: {e}"
+    return report
+
+
+def main():
+    report = compile_snapshots(sys.argv[1:] or None)
+    for path, status in report.items():
+        print(f"{status:>10}  {path}")
+    print(f"Snapshot dir: {os.path.join(SNAPSHOT_DIR, f'v{SNAPSHOT_VERSION}')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 from datetime import datetime, timedelta
 from io import BytesIO
 
@@ -12,6 +13,12 @@ from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.worksheet.table import Table, TableStyleInfo
 
+try:
+    from Quotations.sheet_format import register_named_styles
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from Quotations.sheet_format import register_named_styles  # type: ignore
+
 
 TIME_LABELS = [
     "1. Day Customer Order",
@@ -506,6 +513,38 @@ def _hex_to_fill(hex_color):
     return PatternFill(fill_type='solid', start_color=value, end_color=value)
 
 
+def _timeline_named_styles():
+    """Formats of the timeline grid, registered once per workbook (one assignment per cell)."""
+    bold = Font(bold=True)
+    border = Border(
+        left=Side(style='thin', color='DDDDDD'),
+        right=Side(style='thin', color='DDDDDD'),
+        top=Side(style='thin', color='DDDDDD'),
+        bottom=Side(style='thin', color='DDDDDD'),
+    )
+    center = Alignment(horizontal='center')
+    left = Alignment(horizontal='left')
+    date_alignment = Alignment(horizontal='center', vertical='bottom', textRotation=90)
+    return {
+        'vtt_week': dict(fill=_hex_to_fill('#fffbe6'), font=bold, border=border, alignment=center),
+        'vtt_header': dict(fill=_hex_to_fill('#f5f5f5'), font=bold, border=border, alignment=center),
+        'vtt_header_left': dict(fill=_hex_to_fill('#f5f5f5'), font=bold, border=border, alignment=left),
+        'vtt_date': dict(fill=_hex_to_fill('#e3eafc'), border=border, alignment=date_alignment),
+        'vtt_date_weekend': dict(fill=_hex_to_fill('#ffd6d6'), border=border, alignment=date_alignment),
+        'vtt_label': dict(font=bold, border=border, alignment=left),
+        'vtt_center': dict(border=border, alignment=center),
+        'vtt_cell': dict(border=border),
+        'vtt_cell_weekend': dict(fill=_hex_to_fill('#ffd6d6'), border=border),
+        'vtt_cell_paint': dict(fill=_hex_to_fill('#90ee90'), border=border),
+        'vtt_cell_transit': dict(fill=_hex_to_fill('#4a90e2'), border=border),
+        'vtt_cell_light': dict(fill=_hex_to_fill('#87ceeb'), border=border),
+    }
+
+
+# Painted segment colour -> named style of the grid cell
+_SEGMENT_STYLES = {'#4a90e2': 'vtt_cell_transit', '#87ceeb': 'vtt_cell_light'}
+
+
 def _compute_week_spans(days):
     spans = []
     current_week = None
@@ -551,6 +590,7 @@ def _segment_bounds_by_fill(display_index, row, df_vtt, fill):
 
 def _write_dashboard_sheet(ws, row, df_vtt, selected_pol, selected_pod, time_labels, headers, timeline_days):
     ws.sheet_view.showGridLines = False
+    register_named_styles(ws.parent, _timeline_named_styles())
 
     bold = Font(bold=True)
     section_title_font = Font(bold=True, size=14)
@@ -560,13 +600,7 @@ def _write_dashboard_sheet(ws, row, df_vtt, selected_pol, selected_pod, time_lab
         top=Side(style='thin', color='DDDDDD'),
         bottom=Side(style='thin', color='DDDDDD'),
     )
-    hfill = _hex_to_fill('#f5f5f5')
-    weekfill = _hex_to_fill('#fffbe6')
-    weekendfill = _hex_to_fill('#ffd6d6')
-    weekdayfill = _hex_to_fill('#e3eafc')
-    paintfill = _hex_to_fill('#90ee90')
-    darkbluefill = _hex_to_fill('#4a90e2')
-    lightbluefill = _hex_to_fill('#87ceeb')
+    weekend_days = [day.weekday() in (5, 6) for day in timeline_days]
 
     row_cursor = 1
     ws.cell(row=row_cursor, column=1, value='POL:').font = bold
@@ -597,70 +631,40 @@ def _write_dashboard_sheet(ws, row, df_vtt, selected_pol, selected_pod, time_lab
     start_col = 5
     for week, span in _compute_week_spans(timeline_days):
         ws.merge_cells(start_row=row_cursor, start_column=start_col, end_row=row_cursor, end_column=start_col + span - 1)
-        cell = ws.cell(row=row_cursor, column=start_col, value=f'W{week}')
-        cell.fill = weekfill
-        cell.font = bold
-        cell.alignment = Alignment(horizontal='center')
-        for current_col in range(start_col, start_col + span):
-            ws.cell(row=row_cursor, column=current_col).border = border
+        ws.cell(row=row_cursor, column=start_col, value=f'W{week}').style = 'vtt_week'
+        for current_col in range(start_col + 1, start_col + span):
+            ws.cell(row=row_cursor, column=current_col).style = 'vtt_cell'
         start_col += span
     row_cursor += 1
 
     for column_index, header in enumerate(headers, start=1):
-        cell = ws.cell(row=row_cursor, column=column_index, value=header)
-        cell.fill = hfill
-        cell.font = bold
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center' if column_index > 1 else 'left')
+        ws.cell(row=row_cursor, column=column_index, value=header).style = 'vtt_header' if column_index > 1 else 'vtt_header_left'
     for offset, day in enumerate(timeline_days):
-        column_index = 5 + offset
-        cell = ws.cell(row=row_cursor, column=column_index, value=day.strftime('%d-%b'))
-        cell.fill = weekendfill if day.weekday() in (5, 6) else weekdayfill
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center', vertical='bottom', textRotation=90)
+        cell = ws.cell(row=row_cursor, column=5 + offset, value=day.strftime('%d-%b'))
+        cell.style = 'vtt_date_weekend' if weekend_days[offset] else 'vtt_date'
     row_cursor += 1
 
     for step_index, label in enumerate(time_labels):
         current_row = row_cursor + step_index
         ws.row_dimensions[current_row].height = 10.5
 
-        step_cell = ws.cell(row=current_row, column=1, value=label)
-        step_cell.fill = hfill
-        step_cell.font = bold
-        step_cell.border = border
-        step_cell.alignment = Alignment(horizontal='left')
-
-        day_cell = ws.cell(row=current_row, column=2, value=_ui_timeline_day_value(step_index, row, df_vtt))
-        day_cell.border = border
-        day_cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=current_row, column=1, value=label).style = 'vtt_header_left'
+        ws.cell(row=current_row, column=2, value=_ui_timeline_day_value(step_index, row, df_vtt)).style = 'vtt_center'
 
         day_plus = _ui_timeline_day_plus(step_index, row, df_vtt)
-        day_plus_cell = ws.cell(row=current_row, column=3, value=str(day_plus) if day_plus != 0 else '0')
-        day_plus_cell.border = border
-        day_plus_cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=current_row, column=3, value=str(day_plus) if day_plus != 0 else '0').style = 'vtt_center'
 
         final_day = _ui_timeline_final_day(step_index, row, df_vtt)
-        final_day_cell = ws.cell(row=current_row, column=4, value=str(final_day) if final_day else '-')
-        final_day_cell.border = border
-        final_day_cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=current_row, column=4, value=str(final_day) if final_day else '-').style = 'vtt_center'
 
         paint_segments = _ui_timeline_paint_segments(step_index, row, df_vtt)
-        for day_offset, day in enumerate(timeline_days):
-            column_index = 5 + day_offset
-            cell = ws.cell(row=current_row, column=column_index, value='')
-            cell.border = border
-            if day.weekday() in (5, 6):
-                cell.fill = weekendfill
+        for day_offset in range(len(timeline_days)):
+            style = 'vtt_cell_weekend' if weekend_days[day_offset] else 'vtt_cell'
             for segment in paint_segments:
                 if segment['start'] <= (day_offset + 1) <= segment['end']:
-                    fill = segment['fill']
-                    if fill == '#4a90e2':
-                        cell.fill = darkbluefill
-                    elif fill == '#87ceeb':
-                        cell.fill = lightbluefill
-                    else:
-                        cell.fill = paintfill
+                    style = _SEGMENT_STYLES.get(segment['fill'], 'vtt_cell_paint')
                     break
+            ws.cell(row=current_row, column=5 + day_offset, value='').style = style
 
     ws.column_dimensions['A'].width = 36
     ws.column_dimensions['B'].width = 10
@@ -677,13 +681,9 @@ def _write_dashboard_sheet(ws, row, df_vtt, selected_pol, selected_pod, time_lab
     current_col = summary_start_col
     for week, span in _compute_week_spans(timeline_days):
         ws.merge_cells(start_row=summary_row, start_column=current_col, end_row=summary_row, end_column=current_col + span - 1)
-        cell = ws.cell(row=summary_row, column=current_col, value=f'W{week}')
-        cell.fill = weekfill
-        cell.font = bold
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center')
-        for merged_col in range(current_col, current_col + span):
-            ws.cell(row=summary_row, column=merged_col).border = border
+        ws.cell(row=summary_row, column=current_col, value=f'W{week}').style = 'vtt_week'
+        for merged_col in range(current_col + 1, current_col + span):
+            ws.cell(row=summary_row, column=merged_col).style = 'vtt_cell'
         current_col += span
     summary_row += 1
 
@@ -701,23 +701,17 @@ def _write_dashboard_sheet(ws, row, df_vtt, selected_pol, selected_pod, time_lab
             summary_row += 1
             continue
 
-        label_cell = ws.cell(row=summary_row, column=1, value=label)
-        label_cell.font = bold
-        label_cell.border = border
-        label_cell.alignment = Alignment(horizontal='left')
-
-        value_cell = ws.cell(row=summary_row, column=2, value=str(value) if value and value > 0 else '-')
-        value_cell.border = border
-        value_cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=summary_row, column=1, value=label).style = 'vtt_label'
+        ws.cell(row=summary_row, column=2, value=str(value) if value and value > 0 else '-').style = 'vtt_center'
 
-        for day_offset, _day in enumerate(timeline_days):
-            column_index = summary_start_col + day_offset
-            cell = ws.cell(row=summary_row, column=column_index, value='')
-            cell.border = border
+        bar_style = 'vtt_cell_transit' if label == 'POL>POD' else 'vtt_cell_paint'
+        for day_offset in range(len(timeline_days)):
+            style = 'vtt_cell'
             if value and value > 0 and start_day:
                 end_day = start_day + value - 1
                 if start_day <= (day_offset + 1) <= end_day:
-                    cell.fill = darkbluefill if label == 'POL>POD' else paintfill
+                    style = bar_style
+            ws.cell(row=summary_row, column=summary_start_col + day_offset, value='').style = style
         summary_row += 1
 
     safety_label = ws.cell(row=summary_row, column=1, value='Customer Safety STOCK')
@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
@@ -21,6 +22,12 @@ try:
 except Exception:
     matplotlib_font_manager = None
 
+try:
+    from Quotations.sheet_format import register_named_styles
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from Quotations.sheet_format import register_named_styles  # type: ignore
+
 
 def render_box(label, value):
     return f"""
@@ -2329,6 +2336,33 @@ def _hex_to_fill(hex_color):
         h = 'FF' + h.upper()
     return PatternFill(fill_type='solid', start_color=h, end_color=h)
 
+
+def _timeline_named_styles():
+    """Formats of the timeline grid, registered once per workbook (one assignment per cell)."""
+    bold = Font(bold=True)
+    border = Border(left=Side(style='thin', color='DDDDDD'), right=Side(style='thin', color='DDDDDD'), top=Side(style='thin', color='DDDDDD'), bottom=Side(style='thin', color='DDDDDD'))
+    center = Alignment(horizontal='center')
+    left = Alignment(horizontal='left')
+    date_alignment = Alignment(horizontal='center', vertical='bottom', textRotation=90)
+    return {
+        'vtt_week': dict(fill=_hex_to_fill('#fffbe6'), font=bold, border=border, alignment=center),
+        'vtt_header': dict(fill=_hex_to_fill('#f5f5f5'), font=bold, border=border, alignment=center),
+        'vtt_header_left': dict(fill=_hex_to_fill('#f5f5f5'), font=bold, border=border, alignment=left),
+        'vtt_date': dict(fill=_hex_to_fill('#e3eafc'), border=border, alignment=date_alignment),
+        'vtt_date_weekend': dict(fill=_hex_to_fill('#ffd6d6'), border=border, alignment=date_alignment),
+        'vtt_label': dict(font=bold, border=border, alignment=left),
+        'vtt_center': dict(border=border, alignment=center),
+        'vtt_cell': dict(border=border),
+        'vtt_cell_weekend': dict(fill=_hex_to_fill('#ffd6d6'), border=border),
+        'vtt_cell_paint': dict(fill=_hex_to_fill('#90ee90'), border=border),
+        'vtt_cell_transit': dict(fill=_hex_to_fill('#4a90e2'), border=border),
+        'vtt_cell_light': dict(fill=_hex_to_fill('#87ceeb'), border=border),
+    }
+
+
+# Painted segment colour -> named style of the grid cell
+_SEGMENT_STYLES = {'#4a90e2': 'vtt_cell_transit', '#87ceeb': 'vtt_cell_light'}
+
 def _compute_week_spans(days):
     spans = []
 
@@ -2948,16 +2982,11 @@ def build_excel_workbook(row, df_vtt, selected_pol, selected_pod, time_labels, h
     ws.title = 'Timeline'
     ws.sheet_view.showGridLines = False
 
-    # styles
+    # styles (Transit Duration en azul #4a90e2, como en la vista HTML)
+    register_named_styles(wb, _timeline_named_styles())
     bold = Font(bold=True)
-    hfill = _hex_to_fill('#f5f5f5')
-    weekfill = _hex_to_fill('#fffbe6')
-    weekendfill = _hex_to_fill('#ffd6d6')
-    weekdayfill = _hex_to_fill('#e3eafc')
-    paintfill = _hex_to_fill('#90ee90')
-    # Azul más claro para Transit Duration (ETD>ETA) en Excel para que coincida con la vista HTML
-    darkbluefill = _hex_to_fill('#4a90e2')
     border = Border(left=Side(style='thin', color='DDDDDD'), right=Side(style='thin', color='DDDDDD'), top=Side(style='thin', color='DDDDDD'), bottom=Side(style='thin', color='DDDDDD'))
+    weekend_days = [d.weekday() in (5, 6) for d in timeline_days]
 
     r = 1
     ws.cell(row=r, column=1, value='POL:').font = bold; ws.cell(row=r, column=2, value=selected_pol)
@@ -3000,30 +3029,19 @@ def build_excel_workbook(row, df_vtt, selected_pol, selected_pod, time_labels, h
     c = start_col
     for week, span in spans:
         ws.merge_cells(start_row=r, start_column=c, end_row=r, end_column=c+span-1)
-        cell = ws.cell(row=r, column=c, value=f'W{week}')
-        cell.fill = weekfill
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center')
+        ws.cell(row=r, column=c, value=f'W{week}').style = 'vtt_week'
         # borders
-        for cc in range(c, c+span):
-            ws.cell(row=r, column=cc).border = border
+        for cc in range(c+1, c+span):
+            ws.cell(row=r, column=cc).style = 'vtt_cell'
         c += span
     r += 1
 
     # Header row (Steps, Day, Day+, Final Day, then dates)
     for ci, h in enumerate(headers, start=1):
-        cell = ws.cell(row=r, column=ci, value=h)
-        cell.fill = hfill
-        cell.font = bold
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center') if ci > 1 else Alignment(horizontal='left')
+        ws.cell(row=r, column=ci, value=h).style = 'vtt_header' if ci > 1 else 'vtt_header_left'
     for idx, d in enumerate(timeline_days):
-        ci = start_col + idx
-        cell = ws.cell(row=r, column=ci, value=d.strftime('%d-%b'))
-        cell.fill = weekendfill if d.weekday() in (5,6) else weekdayfill
-        cell.border = border
-        # Rotate text vertically (top-to-bottom)
-        cell.alignment = Alignment(horizontal='center', vertical='bottom', textRotation=90)
+        # Rotated date labels (top-to-bottom)
+        ws.cell(row=r, column=start_col + idx, value=d.strftime('%d-%b')).style = 'vtt_date_weekend' if weekend_days[idx] else 'vtt_date'
     r += 1
 
     # Row content
@@ -3033,45 +3051,29 @@ def build_excel_workbook(row, df_vtt, selected_pol, selected_pod, time_labels, h
             ws.row_dimensions[r+i].height = 10.5
         except Exception:
             pass
-        ws.cell(row=r+i, column=1, value=label).fill = hfill
-        ws.cell(row=r+i, column=1).font = bold
-        ws.cell(row=r+i, column=1).border = border
-        ws.cell(row=r+i, column=1).alignment = Alignment(horizontal='left')
+        ws.cell(row=r+i, column=1, value=label).style = 'vtt_header_left'
 
         # Day
         day_val = _ui_timeline_day_value(i, row, df_vtt)
-        ws.cell(row=r+i, column=2, value=day_val).border = border
-        ws.cell(row=r+i, column=2).alignment = Alignment(horizontal='center')
+        ws.cell(row=r+i, column=2, value=day_val).style = 'vtt_center'
 
         # Day+
         day_plus = _ui_timeline_day_plus(i, row, df_vtt)
-        ws.cell(row=r+i, column=3, value=str(day_plus) if day_plus != 0 else "0").border = border
-        ws.cell(row=r+i, column=3).alignment = Alignment(horizontal='center')
+        ws.cell(row=r+i, column=3, value=str(day_plus) if day_plus != 0 else "0").style = 'vtt_center'
 
         # Final Day
         fday = _ui_timeline_final_day(i, row, df_vtt)
-        ws.cell(row=r+i, column=4, value=str(fday) if fday != 0 else "-").border = border
-        ws.cell(row=r+i, column=4).alignment = Alignment(horizontal='center')
+        ws.cell(row=r+i, column=4, value=str(fday) if fday != 0 else "-").style = 'vtt_center'
 
-        # Paint date cells
+        # Paint date cells (weekend shading unless a segment covers the day)
         paint_segments = _ui_timeline_paint_segments(i, row, df_vtt)
-        for idx, d in enumerate(timeline_days, start=0):
-            ci = start_col + idx
-            cell = ws.cell(row=r+i, column=ci, value="")
-            cell.border = border
-            # weekend shading
-            if d.weekday() in (5,6):
-                cell.fill = weekendfill
+        for idx in range(len(timeline_days)):
+            style = 'vtt_cell_weekend' if weekend_days[idx] else 'vtt_cell'
             for segment in paint_segments:
                 if segment['start'] <= (idx + 1) <= segment['end']:
-                    fill = segment['fill']
-                    if fill == '#4a90e2':
-                        cell.fill = darkbluefill
-                    elif fill == '#87ceeb':
-                        cell.fill = _hex_to_fill('#87ceeb')
-                    else:
-                        cell.fill = paintfill
+                    style = _SEGMENT_STYLES.get(segment['fill'], 'vtt_cell_paint')
                     break
+            ws.cell(row=r+i, column=start_col + idx, value="").style = style
 
     # Column widths
     ws.column_dimensions['A'].width = 36
@@ -3095,13 +3097,9 @@ def build_excel_workbook(row, df_vtt, selected_pol, selected_pod, time_labels, h
     c = summary_start_col
     for week, span in spans:
         ws.merge_cells(start_row=rr, start_column=c, end_row=rr, end_column=c + span - 1)
-        week_cell = ws.cell(row=rr, column=c, value=f'W{week}')
-        week_cell.fill = weekfill
-        week_cell.font = Font(bold=True)
-        week_cell.border = border
-        week_cell.alignment = Alignment(horizontal='center')
-        for cc in range(c, c + span):
-            ws.cell(row=rr, column=cc).border = border
+        ws.cell(row=rr, column=c, value=f'W{week}').style = 'vtt_week'
+        for cc in range(c + 1, c + span):
+            ws.cell(row=rr, column=cc).style = 'vtt_cell'
         c += span
     rr += 1
 
@@ -3119,25 +3117,21 @@ def build_excel_workbook(row, df_vtt, selected_pol, selected_pod, time_labels, h
             rr += 1
             continue
 
-        ws.cell(row=rr, column=1, value=label_txt).font = bold
-        ws.cell(row=rr, column=1).border = border
-        ws.cell(row=rr, column=1).alignment = Alignment(horizontal='left')
+        ws.cell(row=rr, column=1, value=label_txt).style = 'vtt_label'
 
         display_val = str(val) if val and val > 0 else "-"
-        ws.cell(row=rr, column=2, value=display_val).border = border
-        ws.cell(row=rr, column=2).alignment = Alignment(horizontal='center')
+        ws.cell(row=rr, column=2, value=display_val).style = 'vtt_center'
 
         # Pintar mini-Gantt en las columnas de días usando mismo eje temporal
-        for idx, d in enumerate(timeline_days, start=0):
-            ci = summary_start_col + idx
-            cell = ws.cell(row=rr, column=ci, value="")
-            cell.border = border
+        # Azul claro para POL>POD, verde para el resto
+        bar_style = 'vtt_cell_transit' if label_txt == "POL>POD" else 'vtt_cell_paint'
+        for idx in range(len(timeline_days)):
+            style = 'vtt_cell'
             if val and val > 0 and start_day:
                 end_day = start_day + val - 1
-                day_index = idx + 1
-                if start_day <= day_index <= end_day:
-                    # Azul claro para POL>POD, verde para el resto
-                    cell.fill = darkbluefill if label_txt == "POL>POD" else paintfill
+                if start_day <= idx + 1 <= end_day:
+                    style = bar_style
+            ws.cell(row=rr, column=summary_start_col + idx, value="").style = style
         rr += 1
 
     # Customer Safety STOCK debajo del resumen
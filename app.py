@@ -3,16 +3,16 @@ import streamlit as st
 import importlib.util
 import sys
 import os
-import re
 import tempfile
-import urllib.request
 from datetime import datetime
+from io import BytesIO
 
 import pandas as pd
 
 from Quotations.qtool_loader import load_input_template
 from Quotations import generate_quote as gq
 from Quotations.generate_quote import build_output
+from Quotations.remote_data import DEFAULT_REFRESH_S, remote_workbook
 
 st.set_page_config(page_title="Transport Engineering Tools", layout="wide")
 
@@ -77,10 +77,10 @@ elif menu == "MyQuotes":
         return str(os.environ.get(name, "")).strip()
 
     def ensure_qtool_data(runtime_dir: str) -> tuple[bool, str, str | None]:
-        """Ensure QUOTATION TOOL DATA.xlsx exists in runtime_dir.
+        """Locate QUOTATION TOOL DATA.xlsx (SharePoint copies are kept in runtime_dir).
         Priority:
         1) Repository-bundled file: Quotations/QUOTATION TOOL DATA.xlsx
-        2) SharePoint URL from secrets/env
+        2) SharePoint URL from secrets/env (refreshed every QTOOL_DATA_REFRESH_S seconds)
         3) Existing local file in generate_quote.QTOOL_DIR
         """
         os.makedirs(runtime_dir, exist_ok=True)
@@ -95,19 +95,17 @@ elif menu == "MyQuotes":
         sp_url = _secret_or_env("QTOOL_DATA_SHAREPOINT_URL")
         sp_token = _secret_or_env("QTOOL_DATA_BEARER_TOKEN")
         if sp_url:
+            # Streamed to disk, revalidated in the background (ETag / Last-Modified), swapped atomically
+            sync = remote_workbook(sp_url, dst, token=sp_token or None)
+            result = sync.ensure()
+            if result.status == "error":
+                return False, f"Could not download QUOTATION TOOL DATA from SharePoint: {result.error}", None
             try:
-                if not os.path.exists(dst):
-                    headers = {"User-Agent": "QFLOW/1.0"}
-                    if sp_token:
-                        headers["Authorization"] = f"Bearer {sp_token}"
-                    req = urllib.request.Request(sp_url, headers=headers)
-                    with urllib.request.urlopen(req, timeout=90) as r:
-                        content = r.read()
-                    with open(dst, "wb") as f:
-                        f.write(content)
-                return True, "Database loaded from SharePoint.", dst
-            except Exception as e:
-                return False, f"Could not download QUOTATION TOOL DATA from SharePoint: {e}", None
+                refresh_s = float(_secret_or_env("QTOOL_DATA_REFRESH_S") or DEFAULT_REFRESH_S)
+            except ValueError:
+                refresh_s = DEFAULT_REFRESH_S
+            sync.start(interval_s=refresh_s)
+            return True, "Database loaded from SharePoint.", dst
 
         # 3) Local fallback (desktop execution)
         local_qtool_dir = getattr(gq, "QTOOL_DIR", "")
@@ -120,30 +118,12 @@ elif menu == "MyQuotes":
             "QTOOL_DATA_SHAREPOINT_URL in Streamlit secrets (and optionally QTOOL_DATA_BEARER_TOKEN if authentication is required)."
         ), None
 
-    def next_qflow_output_path(directory: str) -> str:
-        """Build next output file path: Horse_TPTQuotation_YYYYMMDD_N.xlsx."""
-        os.makedirs(directory, exist_ok=True)
+    def next_qflow_output_name() -> str:
+        """Build next download name: Horse_TPTQuotation_YYYYMMDD_N.xlsx (N counts this session's downloads)."""
         date_tag = datetime.now().strftime("%Y%m%d")
-        pattern_new = re.compile(rf"^Horse_TPTQuotation_{date_tag}_(\d+)\.xlsx$", re.IGNORECASE)
-        # Backward compatibility: keep correlativo based on old naming if files already exist.
-        pattern_old = re.compile(rf"^Horse_Quotation_{date_tag}_descarga_(\d+)\.xlsx$", re.IGNORECASE)
-        max_n = 0
-        try:
-            for name in os.listdir(directory):
-                m_new = pattern_new.match(name)
-                m_old = pattern_old.match(name)
-                m = m_new or m_old
-                if m is not None:
-                    try:
-                        n = int(m.group(1))
-                        if n > max_n:
-                            max_n = n
-                    except Exception:
-                        pass
-        except FileNotFoundError:
-            pass
-        next_n = max_n + 1
-        return os.path.join(directory, f"Horse_TPTQuotation_{date_tag}_{next_n}.xlsx")
+        counters = st.session_state.setdefault("qflow_output_counter", {})
+        counters[date_tag] = counters.get(date_tag, 0) + 1
+        return f"Horse_TPTQuotation_{date_tag}_{counters[date_tag]}.xlsx"
 
     uploaded = st.file_uploader(
         "Select Quotation Template _INPUT (.xlsx)",
@@ -164,23 +144,16 @@ elif menu == "MyQuotes":
                     st.error(db_msg)
                     st.stop()
 
-                # Point generator to a writable runtime directory where QTOOL data exists.
+                # Point generator to the runtime directory and reference the database in place (no copy).
                 gq.QTOOL_DIR = runtime_qtool_dir
+                gq.QTOOL_DATA_FILE = db_path
 
-                # If local fallback was used from a different folder, copy once to runtime dir.
-                if db_path and os.path.abspath(db_path) != os.path.abspath(os.path.join(runtime_qtool_dir, "QUOTATION TOOL DATA.xlsx")):
-                    with open(db_path, "rb") as srcf:
-                        with open(os.path.join(runtime_qtool_dir, "QUOTATION TOOL DATA.xlsx"), "wb") as dstf:
-                            dstf.write(srcf.read())
-
-                # Save uploaded file to a temporary path so existing loader can consume it.
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_in:
-                    tmp_in.write(uploaded.getbuffer())
-                    in_path = tmp_in.name
-
-                input_df = load_input_template(in_path, sheet="Input")
-                out_path = next_qflow_output_path(runtime_qtool_dir)
-                preview_df = build_output(input_df, out_path, source_workbook_path=in_path)
+                # The upload stays in memory: loader and writer read the same bytes, the result is built in a buffer.
+                in_bytes = uploaded.getvalue()
+                input_df = load_input_template(BytesIO(in_bytes), sheet="Input")
+                out_buffer = BytesIO()
+                out_name = next_qflow_output_name()
+                preview_df = build_output(input_df, out_buffer, source_workbook_path=BytesIO(in_bytes))
 
                 preview_cols = [
                     "Supplier/Plant",
@@ -197,22 +170,13 @@ elif menu == "MyQuotes":
                 st.subheader("Quotation Preview")
                 st.dataframe(preview_df, use_container_width=True, hide_index=True)
 
-                with open(out_path, "rb") as f:
-                    out_bytes = f.read()
-
-                st.success(f"File generated: {os.path.basename(out_path)}")
+                st.success(f"File generated: {out_name}")
                 st.caption(db_msg)
                 st.download_button(
                     label="Download Horse_TPTQuotation",
-                    data=out_bytes,
-                    file_name=os.path.basename(out_path),
+                    data=out_buffer.getvalue(),
+                    file_name=out_name,
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 )
             except Exception as e:
                 st.error(f"Error while generating file: {e}")
-            finally:
-                try:
-                    if "in_path" in locals() and os.path.exists(in_path):
-                        os.remove(in_path)
-                except Exception:
-                    pass
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""Scaling benchmark of the MyQuotes pipeline (load_input_template + build_output).
+
+Each size runs in its own process so peak RSS is per size. A run generates (or reuses) a
+synthetic template under benchmarks/_data, times load_input_template, then build_output
+with per-stage timings (profiling.collect_stage_timings), against a throw-away geocode
+store so every size starts from the same cold geocode cache.
+
+    python -m benchmarks.run                                  # default sizes, print table
+    python -m benchmarks.run --rows 10 1000 50000 --save-baseline
+    python -m benchmarks.run --compare                        # exit 1 on regression
+
+Stages: load, reference, packaging, flow_rules, packing, routes (routes.geocode,
+routes.ports), rates, eur_per_km, distances, assemble, xlsx_write.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource  # type: ignore
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil  # type: ignore
+except Exception:  # pragma: no cover
+    psutil = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "_data")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_SIZES = [10, 100, 1000, 10000, 50000]
+DEFAULT_SEED = 7
+
+# A stage regresses when it is TOLERANCE slower than the baseline AND at least MIN_DELTA_S slower
+TOLERANCE = 0.25
+MIN_DELTA_S = 0.05
+RSS_TOLERANCE = 0.20
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MB (None when the platform can't tell)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    return None
+
+
+def run_one(rows: int, seed: int = DEFAULT_SEED, warm: bool = True) -> dict:
+    """Benchmark one size in the current process. Returns the result record."""
+    from Quotations.generate_quote import build_output
+    from Quotations.profiling import collect_stage_timings
+    from Quotations.qtool_loader import load_input_template
+
+    from benchmarks.synthetic_rfq import write_rfq_template
+
+    template = os.path.join(DATA_DIR, f"rfq_{rows}_s{seed}.xlsx")
+    if not os.path.exists(template):
+        write_rfq_template(template, rows, seed=seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if warm:
+            # Steady state of the app: reference data and pgeocode already in memory
+            build_output(load_input_template(template, sheet="Input").head(10), os.path.join(tmp, "warm.xlsx"))
+        t0 = time.perf_counter()
+        df = load_input_template(template, sheet="Input")
+        load_s = time.perf_counter() - t0
+        with collect_stage_timings() as timings:
+            t1 = time.perf_counter()
+            build_output(df, os.path.join(tmp, "out.xlsx"))
+            build_s = time.perf_counter() - t1
+
+    stages = {"load": load_s, **timings.seconds}
+    return {
+        "rows": rows,
+        "seed": seed,
+        "total_s": round(load_s + build_s, 4),
+        "stages": {k: round(v, 4) for k, v in stages.items()},
+        "rows_per_s": round(rows / (load_s + build_s), 1) if rows else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_isolated(rows: int, seed: int, warm: bool) -> dict:
+    env = dict(os.environ)
+    env["QTOOL_GEOCODE_DB"] = os.path.join(tempfile.mkdtemp(prefix="qtool_bench_"), "geocode.sqlite")
+    cmd = [sys.executable, "-m", "benchmarks.run", "--worker", str(rows), "--seed", str(seed)]
+    if not warm:
+        cmd.append("--cold")
+    repo = os.path.dirname(BENCH_DIR)
+    proc = subprocess.run(cmd, cwd=repo, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark worker failed for {rows} rows:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_suite(sizes: list[int], seed: int = DEFAULT_SEED, warm: bool = True) -> dict:
+    results = {}
+    for rows in sizes:
+        results[str(rows)] = _run_isolated(rows, seed, warm)
+        print(_format_result(results[str(rows)]), file=sys.stderr)
+    return {
+        "generated": datetime.now().isoformat(sep=" ", timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "warm": warm,
+        "results": results,
+    }
+
+
+def _format_result(r: dict) -> str:
+    stages = "  ".join(f"{k}={v:.3f}" for k, v in r["stages"].items())
+    rss = f"{r['peak_rss_mb']:.0f} MB" if r.get("peak_rss_mb") is not None else "n/a"
+    return f"{r['rows']:>7} rows  total={r['total_s']:.3f}s  peak_rss={rss}\n          {stages}"
+
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[str]:
+    """Human-readable regressions of report against baseline (empty when none)."""
+    problems = []
+    for size, cur in report["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        pairs = [("total", cur["total_s"], base["total_s"])]
+        pairs += [(k, v, base["stages"][k]) for k, v in cur["stages"].items() if k in base["stages"]]
+        for name, now, before in pairs:
+            if now > before * (1 + tolerance) and now - before >= MIN_DELTA_S:
+                problems.append(f"{size} rows: {name} {before:.3f}s -> {now:.3f}s (+{(now / before - 1) * 100:.0f}%)")
+        if cur.get("peak_rss_mb") and base.get("peak_rss_mb"):
+            if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + RSS_TOLERANCE):
+                problems.append(f"{size} rows: peak RSS {base['peak_rss_mb']:.0f} MB -> {cur['peak_rss_mb']:.0f} MB")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark load_input_template + build_output")
+    ap.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    ap.add_argument("--cold", action="store_true", help="include reference-data loading in the measured run")
+    ap.add_argument("--out", help="write the JSON report here")
+    ap.add_argument("--save-baseline", action="store_true", help=f"write the report to {BASELINE_FILE}")
+    ap.add_argument("--compare", action="store_true", help="compare with the baseline, exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    ap.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_one(args.worker, seed=args.seed, warm=not args.cold)))
+        return
+
+    report = run_suite(args.rows, seed=args.seed, warm=not args.cold)
+    payload = json.dumps(report, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload)
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            f.write(payload)
+        print(f"Baseline saved: {BASELINE_FILE}")
+    if args.compare:
+        if not os.path.exists(BASELINE_FILE):
+            sys.exit(f"No baseline at {BASELINE_FILE} (run with --save-baseline first)")
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), tolerance=args.tolerance)
+        for p in problems:
+            print(f"REGRESSION  {p}")
+        if problems:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Synthetic 'Quotation Template _INPUT' workbooks built from the bundled reference data.
+
+Lanes come from MAIN PORTS (overseas, POL/POD country prefixes) and COSTPERKM (road pairs),
+destinations are HORSE-PUERTO plants of the destination country, supplier locations are
+drawn from the plant/ZIP tables of the origin country (blank when the country has none),
+and PN / packaging code pairs are sampled from PACKAGING. A small share of rows carries the
+usual template noise: blank or unknown packaging codes, unknown PNs, missing ZIP codes.
+
+    python -m benchmarks.synthetic_rfq 5000 [out.xlsx] [--seed 7]
+"""
+import argparse
+import os
+import random
+
+import pandas as pd
+
+from Quotations.generate_quote import find_qtool_data_file
+from Quotations.qtool_loader import STD_COLS
+from Quotations.reference_data import load_reference_data
+
+# Incoterm mix seen in real RFQs (weights)
+INCOTERM_MIX = {
+    "FCA": 35, "EXW": 20, "FOB": 15, "DAP": 10, "CIF": 5, "CFR": 5, "DDP": 5, "CPT": 3, "CIP": 2,
+}
+OVERSEAS_SHARE = 0.6
+BLANK_PACKAGING_SHARE = 0.05
+UNKNOWN_PACKAGING_SHARE = 0.02
+UNKNOWN_PN_SHARE = 0.02
+MISSING_ZIP_SHARE = 0.10
+SUPPLIERS_PER_COUNTRY = 12
+
+_COUNTRY_NAMES = {
+    "BR": "Brazil", "CL": "Chile", "CN": "China", "CZ": "Czech Republic", "DE": "Germany", "ES": "Spain",
+    "FR": "France", "IN": "India", "IT": "Italy", "MA": "Morocco", "MX": "Mexico", "PL": "Poland",
+    "PT": "Portugal", "RO": "Romania", "SK": "Slovakia", "TR": "Turkey", "US": "United States",
+    "JP": "Japan", "KR": "South Korea", "NL": "Netherlands", "SI": "Slovenia", "HU": "Hungary",
+    "BE": "Belgium", "GB": "United Kingdom", "UK": "United Kingdom", "AR": "Argentina", "TH": "Thailand",
+    "VN": "Vietnam", "BG": "Bulgaria", "CH": "Switzerland", "LT": "Lithuania", "SE": "Sweden",
+}
+
+
+def _cell(v) -> str:
+    if v is None or (isinstance(v, float) and pd.isna(v)):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+class _Catalogue:
+    """Lanes, plants, supplier locations and packaging rows taken from one ReferenceData."""
+
+    def __init__(self, ref):
+        hp = ref.horse_puerto.drop_duplicates("Plant")
+        blank = pd.Series([""] * len(hp), index=hp.index)
+        self.plants: dict[str, list[tuple]] = {}
+        for plant, cc, country, city, zip_code in zip(
+            hp["Plant"], hp.get("Country Code", blank), hp.get("Country", blank),
+            hp.get("Plant City", blank), hp.get("Plant ZIP Code", blank),
+        ):
+            cc = _cell(cc).upper()
+            self.plants.setdefault(cc, []).append((_cell(plant), cc, _cell(country), _cell(city), _cell(zip_code)))
+        self.country_names = dict(_COUNTRY_NAMES)
+        for plants in self.plants.values():
+            for _, cc, name, _, _ in plants:
+                self.country_names.setdefault(cc, name)
+
+        self.locations: dict[str, list[tuple[str, str]]] = {}
+        for plants in self.plants.values():
+            for _, cc, _, city, zip_code in plants:
+                self.locations.setdefault(cc, []).append((city, zip_code))
+        zc = ref.zip_coords
+        if zc is not None and {"Country Code", "ZIP"} <= set(zc.columns):
+            cities = zc["City"] if "City" in zc.columns else pd.Series([""] * len(zc))
+            for cc, z, city in zip(zc["Country Code"], zc["ZIP"], cities):
+                self.locations.setdefault(_cell(cc).upper(), []).append((_cell(city).title(), _cell(z)))
+
+        self.overseas: list[tuple[str, str]] = []
+        mp = ref.main_ports
+        if {"POL", "POD"} <= set(mp.columns):
+            for pol, pod in zip(mp["POL"].astype(str), mp["POD"].astype(str)):
+                oc, dc = pol.strip().upper()[:2], pod.strip().upper()[:2]
+                if dc in self.plants:
+                    self.overseas.append((oc, dc))
+        self.road: list[tuple[str, str]] = []
+        cpkm = ref.cost_per_km
+        if {"Country of origin", "Destination Country"} <= set(cpkm.columns):
+            for oc, dc in zip(cpkm["Country of origin"], cpkm["Destination Country"]):
+                oc, dc = _cell(oc).upper(), _cell(dc).upper()
+                if dc in self.plants:
+                    self.road.append((oc, dc))
+        if not (self.overseas or self.road):
+            raise ValueError("Reference data has no lanes ending at a HORSE-PUERTO plant")
+
+        pk = ref.packaging
+        if {"Reference", "Packaging Code"} <= set(pk.columns):
+            self.packaging = list(zip(pk["Reference"].map(_cell), pk["Packaging Code"].map(_cell)))
+        else:
+            self.packaging = [("", "")]
+
+
+def generate_rfq(n_rows: int, seed: int = 7, ref=None) -> pd.DataFrame:
+    """DataFrame with the template headers (Input sheet) and n_rows synthetic RFQ lines."""
+    if ref is None:
+        ref = load_reference_data(find_qtool_data_file())
+    cat = _Catalogue(ref)
+    rnd = random.Random(seed)
+    incoterms, weights = zip(*INCOTERM_MIX.items())
+    rows = []
+    for i in range(n_rows):
+        lanes = cat.overseas if (cat.overseas and (not cat.road or rnd.random() < OVERSEAS_SHARE)) else cat.road
+        oc, dc = rnd.choice(lanes)
+        plant, _, dest_country, dest_city, dest_zip = rnd.choice(cat.plants[dc])
+        supplier_n = rnd.randrange(SUPPLIERS_PER_COUNTRY)
+        origin_city, origin_zip = "", ""
+        if cat.locations.get(oc):
+            origin_city, origin_zip = cat.locations[oc][supplier_n % len(cat.locations[oc])]
+        if rnd.random() < MISSING_ZIP_SHARE:
+            origin_zip = ""
+        pn, code = rnd.choice(cat.packaging)
+        u = rnd.random()
+        if u < BLANK_PACKAGING_SHARE:
+            code = ""
+        elif u < BLANK_PACKAGING_SHARE + UNKNOWN_PACKAGING_SHARE:
+            code = f"BAC-X-{rnd.randrange(10000):04d}"
+        if rnd.random() < UNKNOWN_PN_SHARE:
+            pn = f"SYN{i:07d}R"
+        annual = rnd.randrange(500, 200000)
+        rows.append({
+            "pn": pn,
+            "designation": f"SYNTHETIC PART {i}",
+            "supplier_plant": f"SUPPLIER {oc}-{supplier_n:02d}",
+            "incoterm": rnd.choices(incoterms, weights)[0],
+            "origin_country_code": oc,
+            "origin_country": cat.country_names.get(oc, oc),
+            "origin_city": origin_city,
+            "origin_zip": origin_zip,
+            "dest_plant": plant,
+            "dest_country_code": dc,
+            "dest_country": dest_country,
+            "dest_city": dest_city,
+            "dest_zip": dest_zip,
+            "annual_needs": annual,
+            "daily_need": round(annual / 220, 1),
+            "unit_cost_eur": round(rnd.uniform(0.2, 80.0), 2),
+            "packaging_code": code,
+        })
+    headers = {v: k for k, v in STD_COLS.items()}
+    return pd.DataFrame(rows).rename(columns=headers)[list(STD_COLS)]
+
+
+def write_rfq_template(path: str, n_rows: int, seed: int = 7, ref=None) -> str:
+    """Write a synthetic template workbook (sheet 'Input') and return its path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    generate_rfq(n_rows, seed=seed, ref=ref).to_excel(path, sheet_name="Input", index=False)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write a synthetic Quotation Template _INPUT workbook")
+    ap.add_argument("rows", type=int)
+    ap.add_argument("out", nargs="?")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    out = args.out or os.path.join(os.path.dirname(__file__), "_data", f"rfq_{args.rows}_s{args.seed}.xlsx")
+    print(write_rfq_template(out, args.rows, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()